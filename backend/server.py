@@ -1,4 +1,4 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, Request, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
@@ -6,19 +6,36 @@ from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, PrivateAttr
+from typing import Callable, Dict, Iterable, List, Literal, Optional, Tuple, TypeVar, Union
 import uuid
-from datetime import datetime, timedelta
+import time
+from datetime import datetime, timedelta, timezone
 import qrcode
+from PIL import ExifTags, Image, ImageOps, features
 import io
 import base64
 import jwt
 from passlib.context import CryptContext
 import json
+import hashlib
+import ipaddress
 import zipfile
+import shutil
+import tarfile
 import tempfile
-from fastapi.responses import StreamingResponse
+import mimetypes
+from fastapi.responses import StreamingResponse, Response
+from fastapi.concurrency import run_in_threadpool
+import asyncio
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import numpy as np
+from starlette.responses import JSONResponse
+from bson import Binary
+from pymongo import CursorType, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, CollectionInvalid, DuplicateKeyError, OperationFailure
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -32,9 +49,68 @@ db = client[os.environ['DB_NAME']]
 SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_HOURS = 24
+BULK_USER_LIMIT = 1000
+# bcrypt releases the GIL, so bulk provisioning hashes passwords on several threads
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 1)))
+DOWNLOAD_LINK_EXPIRE_MINUTES = 10
+
+# Photos are stored base64-encoded in a single MongoDB document, which may be at most 16 MB
+MAX_DOCUMENT_BYTES = 16 * 1024 * 1024
+PHOTO_DOCUMENT_OVERHEAD = 64 * 1024  # Metadata, placeholder and BSON framing
+MAX_PHOTO_BYTES = (MAX_DOCUMENT_BYTES - PHOTO_DOCUMENT_OVERHEAD) // 4 * 3
+
+# Photos loaded from MongoDB at a time while streaming a ZIP export
+ZIP_STREAM_BATCH_SIZE = 20
+
+# Photos per bulk delete request
+BULK_DELETE_LIMIT = 1000
+
+# Image downscaling limits for sessions
+MIN_IMAGE_DIMENSION = 256
+MAX_IMAGE_DIMENSION = 10000
+MIN_IMAGE_QUALITY = 30
+DEFAULT_IMAGE_QUALITY = 85
+
+# Web-optimized derivatives served to galleries instead of the original, best first.
+# AVIF is only produced when the Pillow build can encode it.
+DERIVATIVE_MAX_DIMENSION = int(os.environ.get('DERIVATIVE_MAX_DIMENSION', '2048'))
+DERIVATIVE_CONCURRENCY = int(os.environ.get('DERIVATIVE_CONCURRENCY', '2'))
+DERIVATIVE_FORMATS = [
+    (fmt, content_type, options)
+    for fmt, content_type, options in [
+        ("AVIF", "image/avif", {"quality": 55}),
+        ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    ]
+    if features.check(fmt.lower())
+]
+
+# Contact sheets; tiles are decoded in a dedicated thread pool (Pillow releases the GIL while decoding)
+CONTACT_SHEET_MAX_PHOTOS = int(os.environ.get('CONTACT_SHEET_MAX_PHOTOS', '300'))
+CONTACT_SHEET_WORKERS = int(os.environ.get('CONTACT_SHEET_WORKERS', '4'))
+CONTACT_SHEET_CACHE_BYTES = int(os.environ.get('CONTACT_SHEET_CACHE_MB', '64')) * 1024 * 1024
+CONTACT_SHEET_MARGIN = 4
+# Decoded tiles are held in memory while a sheet renders; larger tiles mean fewer photos
+CONTACT_SHEET_MAX_PIXELS = int(float(os.environ.get('CONTACT_SHEET_MAX_MEGAPIXELS', '24')) * 1_000_000)
+CONTACT_SHEET_MAX_WIDTH = 8192
+CONTACT_SHEET_CONCURRENCY = 2  # Sheets rendered at once per worker
+CONTACT_SHEET_FORMATS = {"jpeg": ("JPEG", "image/jpeg"), "png": ("PNG", "image/png"), "pdf": ("PDF", "application/pdf")}
+
+# Low-quality placeholder previews; about 100 bytes as WebP
+PLACEHOLDER_SIZE = 12
+PLACEHOLDER_FORMAT = ("WEBP", "image/webp") if features.check("webp") else ("PNG", "image/png")
+
+# EXIF tags removed when a session strips private metadata, besides the GPS block
+EXIF_PRIVATE_TAGS = [
+    ExifTags.Base.MakerNote,
+    ExifTags.Base.CameraOwnerName,
+    ExifTags.Base.BodySerialNumber,
+    ExifTags.Base.LensSerialNumber,
+    ExifTags.Base.ImageUniqueID,
+]
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
+password_hash_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -51,6 +127,14 @@ class User(BaseModel):
     allowed_sessions: List[str] = []  # Empty list means access to all sessions
     created_at: datetime = Field(default_factory=datetime.utcnow)
     created_by: str = ""  # ID of user who created this user
+    version: int = 0  # Incremented whenever access rights change
+    _access: Optional["SessionAccess"] = PrivateAttr(default=None)
+
+    @property
+    def access(self) -> "SessionAccess":
+        if self._access is None:
+            self._access = session_access_for(self)
+        return self._access
 
 class UserCreate(BaseModel):
     username: str
@@ -64,6 +148,13 @@ class UserUpdate(BaseModel):
     is_superadmin: Optional[bool] = None
     allowed_sessions: Optional[List[str]] = None
 
+class UserProvision(BaseModel):
+    """One entry of a bulk provisioning request; users are matched by username"""
+    username: str
+    password: Optional[str] = None  # Required for new users
+    is_superadmin: Optional[bool] = None
+    allowed_sessions: Optional[List[str]] = None
+
 class UserLogin(BaseModel):
     username: str
     password: str
@@ -75,19 +166,83 @@ class Session(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     created_by: str  # user id
     is_active: bool = True
+    # Optional upload downscaling: longest edge in pixels and JPEG quality
+    max_image_dimension: Optional[int] = None
+    image_quality: Optional[int] = None
+    # Remove GPS position and device serial numbers from uploaded photos
+    strip_metadata: bool = False
+    # Maintained with $inc on upload and delete; reconciled periodically
+    photo_count: int = 0
+    total_bytes: int = 0
+    last_upload_at: Optional[datetime] = None
+    # Optional upload quotas; None means unlimited
+    max_photos: Optional[int] = None
+    max_total_bytes: Optional[int] = None
+    max_file_size: Optional[int] = None
+    deactivated_at: Optional[datetime] = None
+    # Photo retention in days; None uses the global setting, 0 keeps photos forever
+    purge_after_deactivation_days: Optional[int] = None
+    purge_after_last_upload_days: Optional[int] = None
 
 class SessionCreate(BaseModel):
     name: str
     description: Optional[str] = None
+    max_image_dimension: Optional[int] = Field(None, ge=MIN_IMAGE_DIMENSION, le=MAX_IMAGE_DIMENSION)
+    image_quality: Optional[int] = Field(None, ge=MIN_IMAGE_QUALITY, le=100)
+    strip_metadata: bool = False
+    max_photos: Optional[int] = Field(None, ge=1)
+    max_total_bytes: Optional[int] = Field(None, ge=1)
+    max_file_size: Optional[int] = Field(None, ge=1)
+    purge_after_deactivation_days: Optional[int] = Field(None, ge=0)
+    purge_after_last_upload_days: Optional[int] = Field(None, ge=0)
+
+class SessionUpdate(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+    max_image_dimension: Optional[int] = Field(None, ge=MIN_IMAGE_DIMENSION, le=MAX_IMAGE_DIMENSION)
+    image_quality: Optional[int] = Field(None, ge=MIN_IMAGE_QUALITY, le=100)
+    strip_metadata: Optional[bool] = None
+    max_photos: Optional[int] = Field(None, ge=1)
+    max_total_bytes: Optional[int] = Field(None, ge=1)
+    max_file_size: Optional[int] = Field(None, ge=1)
+    purge_after_deactivation_days: Optional[int] = Field(None, ge=0)
+    purge_after_last_upload_days: Optional[int] = Field(None, ge=0)
 
 class Photo(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     session_id: str
     filename: str
     content_type: str
-    image_data: str  # base64 encoded
+    image_data: Optional[str] = None  # base64 encoded; unset once the photo is in cold storage
     uploaded_at: datetime = Field(default_factory=datetime.utcnow)
     file_size: int
+    # Read from EXIF at ingest; taken_at falls back to uploaded_at so it always sorts
+    taken_at: Optional[datetime] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    camera_make: Optional[str] = None
+    camera_model: Optional[str] = None
+    phash: Optional[str] = None  # 64-bit difference hash as hex, for near-duplicate detection
+    placeholder: Optional[str] = None  # Tiny preview as a data URI, shown while the image loads
+    # Content types of stored web derivatives; None until they have been generated
+    derivatives: Optional[List[str]] = None
+    archive: Optional[str] = None  # Cold-storage archive holding the image data
+
+class PhotoListItem(BaseModel):
+    """Photo as listed in a gallery; image_data is only included on request"""
+    id: str
+    session_id: str
+    filename: str
+    content_type: str
+    image_data: Optional[str] = None
+    uploaded_at: datetime
+    file_size: int
+    taken_at: Optional[datetime] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    camera_make: Optional[str] = None
+    camera_model: Optional[str] = None
+    placeholder: Optional[str] = None
 
 class PhotoUpload(BaseModel):
     session_id: str
@@ -96,10 +251,55 @@ class PhotoUpload(BaseModel):
     image_data: str
     file_size: int
 
+class UploadCreate(BaseModel):
+    session_id: str
+    filename: str
+    content_type: str
+    file_size: int
+    chunk_size: Optional[int] = None
+
 class Token(BaseModel):
     access_token: str
     token_type: str
 
+# Session access
+T = TypeVar("T")
+SESSION_ACCESS_CACHE_USERS = 1024
+
+class SessionAccess:
+    """Sessions a user may access, precomputed once per user version"""
+    __slots__ = ("all_sessions", "session_ids")
+
+    def __init__(self, all_sessions: bool, session_ids: frozenset):
+        self.all_sessions = all_sessions
+        self.session_ids = session_ids
+
+    def allows(self, session_id: Optional[str]) -> bool:
+        return session_id is not None and (self.all_sessions or session_id in self.session_ids)
+
+    def filter(self, items: Iterable[T], session_of: Callable[[T], Optional[str]]) -> List[T]:
+        """Keep the items whose session the user may access, in one pass"""
+        if self.all_sessions:
+            return [item for item in items if session_of(item) is not None]
+        session_ids = self.session_ids
+        return [item for item in items if session_of(item) in session_ids]
+
+session_access_cache: "OrderedDict[Tuple[str, int], SessionAccess]" = OrderedDict()
+
+def session_access_for(user: User) -> SessionAccess:
+    key = (user.id, user.version)
+    access = session_access_cache.get(key)
+    if access is not None:
+        session_access_cache.move_to_end(key)
+        return access
+    # Superadmins and users without restrictions have access to all sessions
+    all_sessions = user.is_superadmin or not user.allowed_sessions
+    access = SessionAccess(all_sessions, frozenset() if all_sessions else frozenset(user.allowed_sessions))
+    session_access_cache[key] = access
+    while len(session_access_cache) > SESSION_ACCESS_CACHE_USERS:
+        session_access_cache.popitem(last=False)
+    return access
+
 # Utility functions
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -117,11 +317,24 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+async def validate_session_ids(session_ids: List[str]):
+    """Check that all sessions exist with a single query, reporting every missing ID"""
+    if not session_ids:
+        return
+    unique_ids = list(dict.fromkeys(session_ids))
+    found = await db.sessions.find({"id": {"$in": unique_ids}}, {"id": 1}).to_list(None)
+    found_ids = {session["id"] for session in found}
+    missing = [session_id for session_id in unique_ids if session_id not in found_ids]
+    if missing:
+        label = "Session" if len(missing) == 1 else "Sessions"
+        raise HTTPException(status_code=400, detail=f"{label} {', '.join(missing)} not found")
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
-        if username is None:
+        # Scoped tokens, like download links, are only valid for their own endpoint
+        if username is None or payload.get("scope") is not None:
             raise HTTPException(status_code=401, detail="Invalid token")
         user = await db.users.find_one({"username": username})
         if user is None:
@@ -137,13 +350,7 @@ async def get_current_superadmin(current_user: User = Depends(get_current_user))
 
 async def check_session_access(session_id: str, current_user: User = Depends(get_current_user)):
     """Check if user has access to a specific session"""
-    if current_user.is_superadmin:
-        return True  # Superadmins have access to all sessions
-    
-    if not current_user.allowed_sessions:
-        return True  # Empty list means access to all sessions
-    
-    if session_id not in current_user.allowed_sessions:
+    if not current_user.access.allows(session_id):
         raise HTTPException(status_code=403, detail="Access denied to this session")
     
     return True
@@ -164,20 +371,1334 @@ def generate_qr_code(data: str) -> str:
     img_str = base64.b64encode(buffer.getvalue()).decode()
     return img_str
 
-# Initialize superadmin on startup
+def exif_text(value) -> Optional[str]:
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", "ignore")
+    if not isinstance(value, str):
+        return None
+    value = value.strip("\x00 ").strip()
+    return value or None
+
+def parse_exif_datetime(value, offset=None) -> Optional[datetime]:
+    """Parse an EXIF 'YYYY:MM:DD HH:MM:SS' timestamp, converted to naive UTC when an offset is known"""
+    value = exif_text(value)
+    if not value:
+        return None
+    try:
+        taken_at = datetime.strptime(value[:19], "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
+    offset = exif_text(offset)
+    if offset:
+        try:
+            aware = datetime.strptime(f"{value[:19]} {offset}", "%Y:%m:%d %H:%M:%S %z")
+            taken_at = aware.astimezone(timezone.utc).replace(tzinfo=None)
+        except ValueError:
+            pass  # Keep the camera's local time
+    return taken_at
+
+def read_image_metadata(img: Image.Image, exif: Image.Exif) -> dict:
+    """Capture time, displayed dimensions and camera of an opened image"""
+    exif_ifd = exif.get_ifd(ExifTags.IFD.Exif)
+    orientation = exif.get(ExifTags.Base.Orientation, 1)
+    width, height = img.size
+    if orientation in (5, 6, 7, 8):
+        width, height = height, width  # Rotated by 90 degrees when displayed
+    return {
+        "taken_at": (
+            parse_exif_datetime(exif_ifd.get(ExifTags.Base.DateTimeOriginal),
+                                exif_ifd.get(ExifTags.Base.OffsetTimeOriginal))
+            or parse_exif_datetime(exif.get(ExifTags.Base.DateTime), exif_ifd.get(ExifTags.Base.OffsetTime))
+        ),
+        "orientation": orientation,
+        "width": width,
+        "height": height,
+        "camera_make": exif_text(exif.get(ExifTags.Base.Make)),
+        "camera_model": exif_text(exif.get(ExifTags.Base.Model)),
+    }
+
+def strip_private_exif(exif: Image.Exif) -> bool:
+    """Remove location and device identifiers in place; returns whether anything was removed"""
+    removed = False
+    if ExifTags.IFD.GPSInfo in exif:
+        del exif[ExifTags.IFD.GPSInfo]
+        removed = True
+    exif_ifd = exif.get_ifd(ExifTags.IFD.Exif)
+    for tag in EXIF_PRIVATE_TAGS:
+        for ifd in (exif, exif_ifd):
+            if tag in ifd:
+                del ifd[tag]
+                removed = True
+    return removed
+
+def perceptual_hash(img: Image.Image) -> str:
+    """64-bit difference hash (dHash) of an image as 16 hex digits.
+
+    Each bit says whether a pixel of a 9x8 grayscale thumbnail is brighter than
+    its right neighbour, so rescaled or re-encoded copies hash (nearly) alike.
+    """
+    img.draft("L", (64, 64))  # Lets JPEGs decode at reduced size; no-op otherwise
+    pixels = list(img.convert("L").resize((9, 8), Image.BOX).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f"{value:016x}"
+
+def placeholder_data_uri(img: Image.Image) -> str:
+    """A PLACEHOLDER_SIZE px preview of an image as a data URI, meant to be shown blurred"""
+    img.draft("RGB", (PLACEHOLDER_SIZE * 8, PLACEHOLDER_SIZE * 8))
+    preview = img.convert("RGB")
+    preview.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.BOX)
+    buffer = io.BytesIO()
+    fmt, content_type = PLACEHOLDER_FORMAT
+    preview.save(buffer, format=fmt, **({"quality": 30} if fmt == "WEBP" else {"optimize": True}))
+    return f"data:{content_type};base64,{base64.b64encode(buffer.getvalue()).decode()}"
+
+def image_fingerprints(img: Image.Image) -> dict:
+    """Placeholder and perceptual hash, both from a single reduced-size decode"""
+    return {"placeholder": placeholder_data_uri(img), "phash": perceptual_hash(img)}
+
+def prepare_image(data: bytes, max_dimension: Optional[int], quality: int,
+                  strip_metadata: bool = False) -> Tuple[Optional[bytes], dict]:
+    """Parse EXIF once and normalize an uploaded image.
+
+    The image is re-encoded as JPEG when it has to be rotated upright, is larger
+    than max_dimension or carries private tags that should be stripped. Returns
+    the new bytes (None when the original can be kept) and the photo metadata.
+    Animated images and files Pillow cannot read are kept as they are.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            # Only the header is read until the image is actually needed
+            exif = img.getexif()
+            metadata = read_image_metadata(img, exif)
+            orientation = metadata.pop("orientation")
+            if getattr(img, "is_animated", False):
+                metadata.update(image_fingerprints(img))
+                return None, metadata
+
+            resize = bool(max_dimension) and max(img.size) > max_dimension
+            rotate = orientation != 1
+            strip = strip_metadata and strip_private_exif(exif)
+            if not (resize or rotate or strip):
+                metadata.update(image_fingerprints(img))
+                return None, metadata
+
+            img = ImageOps.exif_transpose(img)
+            exif.pop(ExifTags.Base.Orientation, None)
+            if resize:
+                img.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+            if img.mode != "RGB":
+                background = Image.new("RGB", img.size, "white")
+                rgba = img.convert("RGBA")
+                background.paste(rgba, mask=rgba.split()[-1])
+                img = background
+            buffer = io.BytesIO()
+            img.save(buffer, format="JPEG", quality=quality, optimize=True,
+                     exif=exif.tobytes(), icc_profile=img.info.get("icc_profile"))
+            metadata["width"], metadata["height"] = img.size
+            metadata.update(image_fingerprints(img))
+            return buffer.getvalue(), metadata
+    except Exception as e:
+        logger.warning(f"Could not process image: {e}")
+        return None, {}
+
+def encode_derivatives(data: bytes) -> Dict[str, bytes]:
+    """Encode an image in every derivative format, keeping only results smaller than the original"""
+    derivatives = {}
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            if getattr(img, "is_animated", False):
+                return derivatives  # Derivatives would drop the animation
+            img.draft("RGB", (DERIVATIVE_MAX_DIMENSION, DERIVATIVE_MAX_DIMENSION))
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((DERIVATIVE_MAX_DIMENSION, DERIVATIVE_MAX_DIMENSION), Image.LANCZOS)
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "PA") else "RGB")
+            for fmt, content_type, options in DERIVATIVE_FORMATS:
+                buffer = io.BytesIO()
+                img.save(buffer, format=fmt, **options)
+                if buffer.tell() < len(data):
+                    derivatives[content_type] = buffer.getvalue()
+    except Exception as e:
+        logger.warning(f"Could not encode derivatives: {e}")
+    return derivatives
+
+def parse_accept(header: str) -> Dict[str, float]:
+    """Media types of an Accept header mapped to their quality values"""
+    accepted = {}
+    for part in header.split(","):
+        media_type, *params = [item.strip() for item in part.split(";")]
+        if not media_type:
+            continue
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        accepted[media_type.lower()] = quality
+    return accepted
+
+def decode_tile(image_data: Union[str, bytes], tile_size: int) -> np.ndarray:
+    """Decode a base64 image, or raw bytes from cold storage, into a square, center-cropped RGB tile"""
+    try:
+        if isinstance(image_data, str):
+            image_data = base64.b64decode(image_data)
+        with Image.open(io.BytesIO(image_data)) as img:
+            img.draft("RGB", (tile_size, tile_size))
+            img = ImageOps.exif_transpose(img).convert("RGB")
+            tile = ImageOps.fit(img, (tile_size, tile_size), Image.BILINEAR)
+            return np.asarray(tile, dtype=np.uint8)
+    except Exception as e:
+        logger.warning(f"Could not decode contact sheet tile: {e}")
+        return np.full((tile_size, tile_size, 3), 200, dtype=np.uint8)
+
+def compose_grid(tiles: List[np.ndarray], columns: int) -> Image.Image:
+    """Arrange square RGB tiles into a white-bordered grid image"""
+    size = tiles[0].shape[0]
+    rows = -(-len(tiles) // columns)
+    margin = CONTACT_SHEET_MARGIN
+    cell = size + 2 * margin
+    # Tiles are copied into a preallocated sheet, so composing needs no more than the page itself
+    grid = np.full((rows * cell + 2 * margin, columns * cell + 2 * margin, 3), 255, dtype=np.uint8)
+    for index, tile in enumerate(tiles):
+        row, column = divmod(index, columns)
+        top, left = 2 * margin + row * cell, 2 * margin + column * cell
+        grid[top:top + size, left:left + size] = tile
+    return Image.fromarray(grid)
+
+def render_contact_sheet(tiles: List[np.ndarray], columns: int, rows_per_page: int, output_format: str) -> bytes:
+    """Encode the contact sheet; PDF pages are composed one at a time, consuming tiles as they are placed"""
+    fmt, _ = CONTACT_SHEET_FORMATS[output_format]
+    buffer = io.BytesIO()
+    if fmt == "PDF":
+        per_page = columns * rows_per_page
+        pages = []
+        while tiles:
+            pages.append(compose_grid(tiles[:per_page], columns))
+            del tiles[:per_page]
+        pages[0].save(buffer, format="PDF", save_all=True, append_images=pages[1:], resolution=150)
+    elif fmt == "JPEG":
+        compose_grid(tiles, columns).save(buffer, format="JPEG", quality=DEFAULT_IMAGE_QUALITY, optimize=True)
+    else:
+        compose_grid(tiles, columns).save(buffer, format=fmt, optimize=True)
+    return buffer.getvalue()
+
+def zip_entry_name(photo: dict) -> str:
+    """File name of a photo inside an export ZIP"""
+    # Create a safe filename
+    safe_filename = photo["filename"]
+    if not safe_filename.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.bmp')):
+        # Try to determine extension from content type
+        content_type = photo.get("content_type", "")
+        if "jpeg" in content_type or "jpg" in content_type:
+            safe_filename += ".jpg"
+        elif "png" in content_type:
+            safe_filename += ".png"
+        elif "gif" in content_type:
+            safe_filename += ".gif"
+        else:
+            safe_filename += ".jpg"  # Default to jpg
+    
+    # Add timestamp to filename to avoid conflicts
+    name, ext = safe_filename.rsplit('.', 1)
+    # Name exports by capture time so they sort chronologically
+    uploaded_at = photo.get("taken_at") or photo.get("uploaded_at", "")
+    if uploaded_at:
+        # Convert datetime to string if needed
+        if hasattr(uploaded_at, 'strftime'):
+            timestamp = uploaded_at.strftime("%Y%m%d_%H%M%S")
+        else:
+            timestamp = str(uploaded_at).replace(":", "-").replace(".", "-")[:19]
+    else:
+        timestamp = "unknown"
+    return f"{name}_{timestamp}.{ext}"
+
+class ZipStreamWriter:
+    """Build a ZIP archive incrementally, handing out the bytes written so far.
+
+    The archive is written to a non-seekable sink, so zipfile uses data
+    descriptors and nothing has to be kept after it has been handed out.
+    Photos are stored uncompressed; JPEG and PNG data does not deflate.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._zip = zipfile.ZipFile(self, 'w', zipfile.ZIP_STORED)
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def _drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+    def add_photo(self, photo: dict, data: Optional[bytes] = None) -> bytes:
+        try:
+            if data is None:
+                data = base64.b64decode(photo["image_data"])
+            self._zip.writestr(zip_entry_name(photo), data)
+        except Exception as e:
+            logger.error(f"Error adding photo {photo['id']} to ZIP: {e}")
+        return self._drain()
+
+    def close(self) -> bytes:
+        self._zip.close()
+        return self._drain()
+
+# Cross-worker cache invalidation
+# Every uvicorn worker keeps its own in-process caches. Handlers registered with
+# on_invalidate() run locally and in all other workers when publish_invalidation()
+# is called; messages travel through a small capped collection that each worker tails.
+WORKER_ID = str(uuid.uuid4())
+INVALIDATION_COLLECTION_BYTES = 1024 * 1024
+invalidation_handlers: Dict[str, List[Callable[[Optional[str]], None]]] = {}
+
+def on_invalidate(topic: str):
+    """Register a handler called with the invalidated key (None means everything)"""
+    def decorator(handler: Callable[[Optional[str]], None]):
+        invalidation_handlers.setdefault(topic, []).append(handler)
+        return handler
+    return decorator
+
+def apply_invalidation(topic: str, key: Optional[str] = None):
+    for handler in invalidation_handlers.get(topic, []):
+        try:
+            handler(key)
+        except Exception as e:
+            logger.error(f"Error invalidating {topic}:{key}: {e}")
+
+async def publish_invalidation(topic: str, key: Optional[str] = None):
+    apply_invalidation(topic, key)
+    await db.cache_invalidations.insert_one({
+        "topic": topic,
+        "key": key,
+        "origin": WORKER_ID,
+        "created_at": datetime.utcnow()
+    })
+
+async def listen_for_invalidations():
+    """Tail the invalidation collection and apply messages from other workers"""
+    # ObjectIds are generated by each worker, so their order is not insertion order and
+    # cannot be used to resume. Each cursor starts at the newest message instead; if
+    # anything arrived while no cursor was open, every cache is dropped.
+    last_id = None
+    while True:
+        try:
+            latest = await db.cache_invalidations.find_one(sort=[("$natural", -1)])
+            if latest is not None and latest["_id"] != last_id:
+                for topic in invalidation_handlers:
+                    apply_invalidation(topic)
+                last_id = latest["_id"]
+            cursor = db.cache_invalidations.find({}, cursor_type=CursorType.TAILABLE_AWAIT)
+            skipping = latest is not None
+            while cursor.alive:
+                async for message in cursor:
+                    if skipping:
+                        # Tailable cursors start at the oldest message; skip to where we left off
+                        skipping = message["_id"] != latest["_id"]
+                        continue
+                    last_id = message["_id"]
+                    if message.get("origin") != WORKER_ID:
+                        apply_invalidation(message["topic"], message.get("key"))
+            # Tailable cursors die on an empty collection; retry shortly
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Cache invalidation listener error: {e}")
+            await asyncio.sleep(1)
+
+# Active session directory
+# One shared copy of all active sessions per worker, newest first; each user's view
+# is filtered from it. Anything that changes a session publishes "sessions"; photo
+# statistics change with every upload, so the copy is also reloaded after a few seconds.
+SESSION_DIRECTORY_TTL = float(os.environ.get('SESSION_DIRECTORY_TTL', '5'))
+
+class SessionDirectory:
+    def __init__(self, sessions: List[Session]):
+        self.sessions = sessions
+        self.expires_at = time.monotonic() + SESSION_DIRECTORY_TTL
+        self.position = {session.id: index for index, session in enumerate(sessions)}
+        # Derived from the content, so every worker produces the same ETags
+        digest = hashlib.sha1()
+        for session in sessions:
+            digest.update(session.json().encode())
+        self.etag = digest.hexdigest()
+
+session_directory: Optional[SessionDirectory] = None
+session_directory_generation = 0
+session_directory_lock = asyncio.Lock()
+
+@on_invalidate("sessions")
+def drop_session_directory(key: Optional[str]):
+    global session_directory, session_directory_generation
+    session_directory = None
+    session_directory_generation += 1
+
+async def get_session_directory() -> SessionDirectory:
+    global session_directory
+    async with session_directory_lock:  # Concurrent misses share one load
+        if session_directory is not None and session_directory.expires_at > time.monotonic():
+            return session_directory
+        generation = session_directory_generation
+        docs = await db.sessions.find({"is_active": True}).sort([("created_at", -1), ("id", -1)]).to_list(None)
+        directory = SessionDirectory([Session(**doc) for doc in docs])
+        if generation == session_directory_generation:
+            session_directory = directory
+        return directory
+
+# Active session lookups for guest endpoints
+# Every guest checks the session after scanning the QR code and again with each
+# upload, so lookups are cached briefly, including unknown IDs, and concurrent
+# misses for the same ID share one query.
+ACTIVE_SESSION_CACHE_TTL = float(os.environ.get('ACTIVE_SESSION_CACHE_TTL', '30'))
+ACTIVE_SESSION_NEGATIVE_TTL = float(os.environ.get('ACTIVE_SESSION_NEGATIVE_TTL', '5'))
+ACTIVE_SESSION_CACHE_SIZE = 10000
+PUBLIC_SESSION_MAX_AGE = 10  # Seconds browsers and nginx may reuse a public session check
+
+active_sessions: "OrderedDict[str, Tuple[float, Optional[dict]]]" = OrderedDict()
+active_session_loads: Dict[str, asyncio.Future] = {}
+active_session_generation = 0
+
+@on_invalidate("sessions")
+def drop_active_session(session_id: Optional[str]):
+    global active_session_generation
+    active_session_generation += 1
+    if session_id is None:
+        active_sessions.clear()
+    else:
+        active_sessions.pop(session_id, None)
+
+async def get_active_session(session_id: str) -> Optional[dict]:
+    """The active session with this ID, or None; the returned dict is shared and must not be modified"""
+    entry = active_sessions.get(session_id)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    pending = active_session_loads.get(session_id)
+    if pending is not None:
+        try:
+            return await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            if not pending.cancelled():
+                raise  # This caller was cancelled
+            return await get_active_session(session_id)  # The loading caller was; load again
+
+    future = asyncio.get_running_loop().create_future()
+    active_session_loads[session_id] = future
+    generation = active_session_generation
+    try:
+        session = await db.sessions.find_one({"id": session_id, "is_active": True}, {"_id": 0})
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # Waiters re-raise it; don't log it as unretrieved
+        raise
+    finally:
+        del active_session_loads[session_id]
+    # A session changed while loading; the result may be stale, so it is not cached
+    if generation == active_session_generation:
+        ttl = ACTIVE_SESSION_CACHE_TTL if session else ACTIVE_SESSION_NEGATIVE_TTL
+        active_sessions[session_id] = (time.monotonic() + ttl, session)
+        active_sessions.move_to_end(session_id)
+        while len(active_sessions) > ACTIVE_SESSION_CACHE_SIZE:
+            active_sessions.popitem(last=False)
+    future.set_result(session)
+    return session
+
+# Near-duplicate detection
+# Each worker keeps a BK-tree of perceptual hashes for recently queried sessions;
+# uploads and deletions invalidate the session's tree in every worker.
+DUPLICATE_MAX_DISTANCE = int(os.environ.get('DUPLICATE_MAX_DISTANCE', '6'))  # Differing bits out of 64
+DUPLICATE_INDEX_CACHE_SESSIONS = 32
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+class BKTree:
+    """Metric tree over 64-bit hashes; radius queries visit only a fraction of the nodes"""
+
+    def __init__(self):
+        self._root = None  # (hash, photo_id, {distance: child})
+        self.size = 0
+
+    def add(self, value: int, photo_id: str):
+        self.size += 1
+        if self._root is None:
+            self._root = (value, photo_id, {})
+            return
+        node = self._root
+        while True:
+            distance = hamming_distance(value, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, photo_id, {})
+                return
+            node = child
+
+    def search(self, value: int, radius: int) -> List[Tuple[str, int]]:
+        """(photo_id, distance) of every entry within radius of value"""
+        found = []
+        stack = [self._root] if self._root else []
+        while stack:
+            node_value, photo_id, children = stack.pop()
+            distance = hamming_distance(value, node_value)
+            if distance <= radius:
+                found.append((photo_id, distance))
+            # Triangle inequality: only children in [d - r, d + r] can match
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return found
+
+class DuplicateIndex:
+    """Perceptual hashes of one session's photos"""
+
+    def __init__(self, photos: List[dict]):
+        self.tree = BKTree()
+        self.photos = {}
+        for photo in photos:
+            photo["hash"] = int(photo["phash"], 16)
+            self.photos[photo["id"]] = photo
+            self.tree.add(photo["hash"], photo["id"])
+
+    def near(self, photo_id: str, radius: int) -> List[Tuple[str, int]]:
+        return [
+            (other_id, distance)
+            for other_id, distance in self.tree.search(self.photos[photo_id]["hash"], radius)
+            if other_id != photo_id
+        ]
+
+    def groups(self, radius: int) -> List[List[str]]:
+        """Clusters of photos linked by near-duplicate pairs, best photo first"""
+        parent = {photo_id: photo_id for photo_id in self.photos}
+
+        def find(photo_id):
+            while parent[photo_id] != photo_id:
+                parent[photo_id] = parent[parent[photo_id]]
+                photo_id = parent[photo_id]
+            return photo_id
+
+        for photo_id in self.photos:
+            for other_id, _ in self.near(photo_id, radius):
+                parent[find(other_id)] = find(photo_id)
+
+        clusters: Dict[str, List[str]] = {}
+        for photo_id in self.photos:
+            clusters.setdefault(find(photo_id), []).append(photo_id)
+        groups = [sorted(members, key=self.rank, reverse=True)
+                  for members in clusters.values() if len(members) > 1]
+        groups.sort(key=len, reverse=True)
+        return groups
+
+    def rank(self, photo_id: str):
+        """Preference when choosing which of several duplicates to keep"""
+        photo = self.photos[photo_id]
+        return ((photo.get("width") or 0) * (photo.get("height") or 0), photo.get("file_size") or 0)
+
+duplicate_indexes: "OrderedDict[str, DuplicateIndex]" = OrderedDict()
+
+@on_invalidate("session_photos")
+def drop_duplicate_index(session_id: Optional[str]):
+    if session_id is None:
+        duplicate_indexes.clear()
+    else:
+        duplicate_indexes.pop(session_id, None)
+
+async def get_duplicate_index(session_id: str) -> DuplicateIndex:
+    index = duplicate_indexes.get(session_id)
+    if index is not None:
+        duplicate_indexes.move_to_end(session_id)
+        return index
+    photos = await db.photos.find(
+        {"session_id": session_id, "phash": {"$ne": None}},
+        {"_id": 0, "id": 1, "phash": 1, "width": 1, "height": 1, "file_size": 1}
+    ).to_list(None)
+    index = await run_in_threadpool(DuplicateIndex, photos)
+    duplicate_indexes[session_id] = index
+    while len(duplicate_indexes) > DUPLICATE_INDEX_CACHE_SESSIONS:
+        duplicate_indexes.popitem(last=False)
+    return index
+
+async def without_near_duplicates(photo_ids: List[str], radius: int) -> List[str]:
+    """Keep the best photo of each group of near-duplicates in a selection, preserving order"""
+    docs = await db.photos.find({"id": {"$in": photo_ids}}, {"id": 1, "session_id": 1}).to_list(None)
+    session_by_photo = {doc["id"]: doc["session_id"] for doc in docs}
+    dropped = set()
+    for session_id in set(session_by_photo.values()):
+        index = await get_duplicate_index(session_id)
+        selected = [photo_id for photo_id in photo_ids
+                    if session_by_photo.get(photo_id) == session_id and photo_id in index.photos]
+        kept = set()
+        for photo_id in sorted(selected, key=index.rank, reverse=True):
+            if any(other_id in kept for other_id, _ in index.near(photo_id, radius)):
+                dropped.add(photo_id)
+            else:
+                kept.add(photo_id)
+    return [photo_id for photo_id in photo_ids if photo_id not in dropped]
+
+# Contact sheets; each worker caches rendered sheets until the session's photo set changes
+contact_sheet_pool = ThreadPoolExecutor(max_workers=CONTACT_SHEET_WORKERS, thread_name_prefix="contact-sheet")
+contact_sheet_semaphore = asyncio.Semaphore(CONTACT_SHEET_CONCURRENCY)
+contact_sheets: "OrderedDict[tuple, bytes]" = OrderedDict()
+
+@on_invalidate("session_photos")
+def drop_contact_sheets(session_id: Optional[str]):
+    for key in list(contact_sheets):
+        if session_id is None or key[0] == session_id:
+            del contact_sheets[key]
+
+def cache_contact_sheet(key: tuple, data: bytes):
+    if len(data) > CONTACT_SHEET_CACHE_BYTES // 4:
+        return  # Not worth evicting everything else for
+    contact_sheets[key] = data
+    while sum(len(sheet) for sheet in contact_sheets.values()) > CONTACT_SHEET_CACHE_BYTES:
+        contact_sheets.popitem(last=False)
+
+# Startup tasks; every worker runs these, so they must be idempotent
+async def ensure_indexes():
+    try:
+        await db.create_collection(
+            "cache_invalidations", capped=True, size=INVALIDATION_COLLECTION_BYTES
+        )
+    except CollectionInvalid:
+        pass  # Already created by another worker or an earlier start
+
+    index_specs = [
+        (db.users, "id", {"unique": True}),
+        (db.users, "username", {"unique": True}),
+        (db.sessions, "id", {"unique": True}),
+        (db.photos, "id", {"unique": True}),
+        (db.photos, [("session_id", 1), ("uploaded_at", -1), ("id", -1)], {}),
+        (db.photos, [("session_id", 1), ("taken_at", -1), ("id", -1)], {}),
+        (db.photos, "archive", {"sparse": True}),
+        (db.uploads, "id", {"unique": True}),
+        (db.uploads, "expires_at", {"expireAfterSeconds": 0}),
+        (db.upload_chunks, [("upload_id", 1), ("index", 1)], {"unique": True}),
+        (db.upload_chunks, "expires_at", {"expireAfterSeconds": 0}),
+        (db.photo_derivatives, [("photo_id", 1), ("content_type", 1)], {"unique": True}),
+        (db.download_selections, "id", {"unique": True}),
+        (db.download_selections, "expires_at", {"expireAfterSeconds": 0}),
+        (db.job_locks, "id", {"unique": True}),
+        (db.import_jobs, "id", {"unique": True}),
+        (db.import_jobs, "expires_at", {"expireAfterSeconds": 0}),
+    ]
+    for collection, keys, options in index_specs:
+        try:
+            await collection.create_index(keys, **options)
+        except OperationFailure as e:
+            logger.warning(f"Could not create index {keys} on {collection.name}: {e}")
+
+async def backfill_photo_metadata():
+    """Give photos stored before EXIF extraction a taken_at so they sort by capture time too"""
+    try:
+        result = await db.photos.update_many(
+            {"taken_at": None},
+            [{"$set": {"taken_at": "$uploaded_at"}}]
+        )
+    except Exception as e:
+        logger.error(f"Could not backfill taken_at: {e}")
+        return
+    if result.modified_count:
+        logger.info(f"Backfilled taken_at for {result.modified_count} photos")
+
+# Periodic jobs; a lease in job_locks makes sure only one worker runs each job at a time
+SESSION_STATS_RECONCILE_INTERVAL = float(os.environ.get('SESSION_STATS_RECONCILE_MINUTES', '60')) * 60
+# Longer than any upload takes from reserving its quota to storing the photo
+QUOTA_RESERVATION_GRACE = timedelta(minutes=10)
+
+# Retention; global defaults in days, empty or 0 disables. Sessions can override them.
+RETENTION_DAYS_AFTER_DEACTIVATION = int(os.environ.get('RETENTION_DAYS_AFTER_DEACTIVATION') or 0)
+RETENTION_DAYS_AFTER_LAST_UPLOAD = int(os.environ.get('RETENTION_DAYS_AFTER_LAST_UPLOAD') or 0)
+RETENTION_CHECK_INTERVAL = float(os.environ.get('RETENTION_CHECK_MINUTES', '60')) * 60
+RETENTION_DRY_RUN = os.environ.get('RETENTION_DRY_RUN', '').lower() in ('1', 'true', 'yes')
+PURGE_BATCH_SIZE = int(os.environ.get('PURGE_BATCH_SIZE', '200'))
+PURGE_BATCH_PAUSE = float(os.environ.get('PURGE_BATCH_PAUSE', '0.5'))  # Seconds between batches
+
+async def acquire_job_lease(name: str, duration: float) -> bool:
+    now = datetime.utcnow()
+    try:
+        await db.job_locks.update_one(
+            {"id": name, "$or": [{"locked_until": {"$lt": now}}, {"locked_until": None}]},
+            {"$set": {"locked_until": now + timedelta(seconds=duration), "worker": WORKER_ID}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False  # Another worker holds the lease
+    return True
+
+async def run_periodically(name: str, interval: float, job: Callable):
+    while True:
+        try:
+            if await acquire_job_lease(name, interval):
+                await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Periodic job {name} failed: {e}")
+        await asyncio.sleep(interval)
+
+async def reconcile_session_stats():
+    """Recompute photo counters from the photos collection and fix sessions that drifted.
+
+    Sessions with a recent quota reservation are skipped: the reserved photo is already
+    counted but not stored yet, and correcting the counters would erase it. Otherwise a
+    session is only corrected if its counters did not change while the photos were
+    being counted, and the next run fixes the rest.
+    """
+    busy_since = datetime.utcnow() - QUOTA_RESERVATION_GRACE
+    before = {
+        session["id"]: session
+        for session in await db.sessions.find(
+            {"$or": [{"reserved_at": None}, {"reserved_at": {"$lt": busy_since}}]},
+            {"_id": 0, "id": 1, "photo_count": 1, "total_bytes": 1, "last_upload_at": 1, "reserved_at": 1}
+        ).to_list(None)
+    }
+    actual = {
+        row["_id"]: row
+        for row in await db.photos.aggregate([
+            {"$group": {
+                "_id": "$session_id",
+                "photo_count": {"$sum": 1},
+                "total_bytes": {"$sum": "$file_size"},
+                "last_upload_at": {"$max": "$uploaded_at"},
+            }}
+        ]).to_list(None)
+    }
+    operations = []
+    for session_id, session in before.items():
+        stats = actual.get(session_id, {"photo_count": 0, "total_bytes": 0, "last_upload_at": None})
+        fields = ("photo_count", "total_bytes", "last_upload_at")
+        if all(session.get(field) == stats[field] for field in fields):
+            continue
+        operations.append(UpdateOne(
+            {"id": session_id, **{field: session.get(field) for field in ("photo_count", "total_bytes", "reserved_at")}},
+            {"$set": {field: stats[field] for field in fields}}
+        ))
+    if operations:
+        result = await db.sessions.bulk_write(operations, ordered=False)
+        logger.info(f"Reconciled photo statistics of {result.modified_count} sessions")
+
+PHOTO_DELETE_FIELDS = {"id": 1, "session_id": 1, "file_size": 1, "archive": 1}
+
+async def delete_photo_docs(docs: List[dict]) -> Dict[str, List[int]]:
+    """Delete photos with their derivatives and now unused archives, and update session counters.
+
+    Takes documents with PHOTO_DELETE_FIELDS and returns [photos, bytes] removed per session.
+    Counters of photos deleted concurrently elsewhere may drift; reconcile_session_stats repairs them.
+    """
+    photo_ids = [doc["id"] for doc in docs]
+    await db.photos.delete_many({"id": {"$in": photo_ids}})
+    await db.photo_derivatives.delete_many({"photo_id": {"$in": photo_ids}})
+    per_session: Dict[str, List[int]] = {}
+    for doc in docs:
+        counts = per_session.setdefault(doc["session_id"], [0, 0])
+        counts[0] += 1
+        counts[1] += doc.get("file_size", 0)
+    for session_id, (count, size) in per_session.items():
+        await db.sessions.update_one({"id": session_id}, {"$inc": {"photo_count": -count, "total_bytes": -size}})
+    await release_archives({doc["archive"] for doc in docs if doc.get("archive")})
+    return per_session
+
+async def purge_photos(query: dict) -> Tuple[int, int]:
+    """Delete matching photos in throttled batches; returns the number of photos and bytes removed"""
+    removed_photos = removed_bytes = 0
+    touched_sessions = set()
+    while True:
+        docs = await db.photos.find(query, PHOTO_DELETE_FIELDS).limit(PURGE_BATCH_SIZE).to_list(None)
+        if not docs:
+            break
+        per_session = await delete_photo_docs(docs)
+        touched_sessions.update(per_session)
+        removed_photos += len(docs)
+        removed_bytes += sum(size for _, size in per_session.values())
+        await asyncio.sleep(PURGE_BATCH_PAUSE)  # Leave room for foreground traffic
+    for session_id in touched_sessions:
+        await publish_invalidation("session_photos", session_id)
+    return removed_photos, removed_bytes
+
+async def hard_delete_session(session_id: str):
+    """Remove a session marked for deletion together with everything stored for it"""
+    try:
+        count, size = await purge_photos({"session_id": session_id})
+        uploads = await db.uploads.find({"session_id": session_id}, {"id": 1}).to_list(None)
+        await db.upload_chunks.delete_many({"upload_id": {"$in": [upload["id"] for upload in uploads]}})
+        await db.uploads.delete_many({"session_id": session_id})
+        # Users keep the ID in allowed_sessions: removing their last one would grant access to all sessions
+        await db.sessions.delete_one({"id": session_id, "deleting": True})
+    except Exception as e:
+        logger.error(f"Hard delete of session {session_id} failed, the purge job will retry: {e}")
+        return
+    await publish_invalidation("sessions", session_id)
+    logger.info(f"Deleted session {session_id} with {count} photos ({size} bytes)")
+
+def retention_deadline(session: dict, now: datetime) -> Optional[Tuple[datetime, str]]:
+    """When a session's photos become due for purging, and why; None if they are kept"""
+    deadlines = []
+    after_deactivation = session.get("purge_after_deactivation_days")
+    if after_deactivation is None:
+        after_deactivation = RETENTION_DAYS_AFTER_DEACTIVATION
+    if after_deactivation and not session.get("is_active", True):
+        # Without a recorded deactivation the clock starts now; the purge job stores it
+        deactivated_at = session.get("deactivated_at") or now
+        deadlines.append((deactivated_at + timedelta(days=after_deactivation),
+                          f"{after_deactivation} days after deactivation"))
+    after_last_upload = session.get("purge_after_last_upload_days")
+    if after_last_upload is None:
+        after_last_upload = RETENTION_DAYS_AFTER_LAST_UPLOAD
+    if after_last_upload and session.get("last_upload_at"):
+        deadlines.append((session["last_upload_at"] + timedelta(days=after_last_upload),
+                          f"{after_last_upload} days after the last upload"))
+    return min(deadlines) if deadlines else None
+
+async def retention_report() -> dict:
+    """Sessions whose photos are due for purging now, without deleting anything"""
+    now = datetime.utcnow()
+    sessions = await db.sessions.find(
+        {"photo_count": {"$ne": 0}},
+        {"_id": 0, "id": 1, "name": 1, "is_active": 1, "deactivated_at": 1, "last_upload_at": 1,
+         "photo_count": 1, "total_bytes": 1, "purge_after_deactivation_days": 1, "purge_after_last_upload_days": 1}
+    ).to_list(None)
+    due = []
+    for session in sessions:
+        deadline = retention_deadline(session, now)
+        if deadline and deadline[0] <= now:
+            due.append({
+                "session_id": session["id"],
+                "name": session["name"],
+                "purge_due_at": deadline[0],
+                "reason": deadline[1],
+                "photo_count": session.get("photo_count"),
+                "total_bytes": session.get("total_bytes"),
+            })
+    return {
+        "generated_at": now,
+        "sessions": due,
+        "photo_count": sum(session["photo_count"] or 0 for session in due),
+        "total_bytes": sum(session["total_bytes"] or 0 for session in due),
+    }
+
+async def purge_expired_photos():
+    # Finish hard deletes interrupted by a restart
+    for session in await db.sessions.find({"deleting": True}, {"id": 1}).to_list(None):
+        await hard_delete_session(session["id"])
+    # Sessions deactivated before deactivated_at was recorded start their clock now
+    await db.sessions.update_many(
+        {"is_active": False, "deactivated_at": None}, {"$set": {"deactivated_at": datetime.utcnow()}}
+    )
+    report = await retention_report()
+    if not report["sessions"]:
+        return
+    if RETENTION_DRY_RUN:
+        logger.info(f"Retention dry run: would purge {report['photo_count']} photos "
+                    f"({report['total_bytes']} bytes) from {len(report['sessions'])} sessions")
+        return
+    for session in report["sessions"]:
+        count, size = await purge_photos({"session_id": session["session_id"]})
+        logger.info(f"Purged {count} photos ({size} bytes) of session {session['session_id']}: {session['reason']}")
+
+# Cold storage
+# Photos of sessions without uploads for COLD_STORAGE_AFTER_DAYS are packed into
+# per-session ZIP archives in a directory or an S3 bucket, leaving stubs without
+# image_data in db.photos. Reads go through a bounded local cache of archives.
+COLD_STORAGE_URL = os.environ.get('COLD_STORAGE_URL', '')  # Directory or s3://bucket/prefix; empty disables tiering
+COLD_STORAGE_S3_ENDPOINT = os.environ.get('COLD_STORAGE_S3_ENDPOINT') or None  # For S3-compatible services
+COLD_STORAGE_AFTER_DAYS = float(os.environ.get('COLD_STORAGE_AFTER_DAYS', '30'))
+COLD_STORAGE_ARCHIVE_BYTES = int(float(os.environ.get('COLD_STORAGE_ARCHIVE_MB', '256')) * 1024 * 1024)
+COLD_STORAGE_CHECK_INTERVAL = float(os.environ.get('COLD_STORAGE_CHECK_MINUTES', '60')) * 60
+COLD_STORAGE_CACHE_DIR = Path(os.environ.get('COLD_STORAGE_CACHE_DIR', Path(tempfile.gettempdir()) / 'qr-photo-archives'))
+COLD_STORAGE_CACHE_BYTES = int(float(os.environ.get('COLD_STORAGE_CACHE_MB', '2048')) * 1024 * 1024)
+
+class LocalArchiveStore:
+    def __init__(self, root: Path):
+        self.root = root
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return self.root / key
+
+    def put(self, key: str, path: Path):
+        destination = self.root / key
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(path), destination)
+
+    def fetch(self, key: str, path: Path):
+        shutil.copyfile(self.root / key, path)
+
+    def delete(self, key: str):
+        (self.root / key).unlink(missing_ok=True)
+
+class S3ArchiveStore:
+    def __init__(self, bucket: str, prefix: str):
+        import boto3  # Only needed when archives live in S3
+        self.client = boto3.client("s3", endpoint_url=COLD_STORAGE_S3_ENDPOINT)
+        self.bucket = bucket
+        self.prefix = f"{prefix.strip('/')}/" if prefix.strip('/') else ""
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return None
+
+    def put(self, key: str, path: Path):
+        self.client.upload_file(str(path), self.bucket, self.prefix + key)
+
+    def fetch(self, key: str, path: Path):
+        self.client.download_file(self.bucket, self.prefix + key, str(path))
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+def create_archive_store(url: str) -> Optional[Union[LocalArchiveStore, S3ArchiveStore]]:
+    if not url:
+        return None
+    if url.startswith("s3://"):
+        bucket, _, prefix = url[len("s3://"):].partition("/")
+        return S3ArchiveStore(bucket, prefix)
+    return LocalArchiveStore(Path(url[len("file://"):] if url.startswith("file://") else url))
+
+archive_store = create_archive_store(COLD_STORAGE_URL)
+
+class ArchiveCache:
+    """Local copies of remote archives, dropping the least recently used beyond max_bytes.
+
+    Every worker caches into its own subdirectory, so workers never delete files another
+    worker is reading, and archives are not evicted while a reader has them open.
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.sizes: "OrderedDict[str, int]" = OrderedDict()
+        self.loading: Dict[str, asyncio.Task] = {}
+        self.readers: Dict[str, int] = {}
+        self._directory: Optional[Path] = None
+
+    @property
+    def directory(self) -> Path:
+        # Resolved on first use, after uvicorn has started the worker process
+        if self._directory is None:
+            self._directory = self.root / f"worker-{os.getpid()}"
+            shutil.rmtree(self._directory, ignore_errors=True)  # Left over by an earlier process
+        return self._directory
+
+    @asynccontextmanager
+    async def reading(self, key: str):
+        """Open an archive for reading; a cached copy is kept until the file is closed"""
+        local = archive_store.local_path(key)
+        if local is not None:
+            file = await run_in_threadpool(open, local, "rb")
+            try:
+                yield file
+            finally:
+                file.close()
+            return
+        self.readers[key] = self.readers.get(key, 0) + 1
+        try:
+            path = await self._cached(key)
+            file = await run_in_threadpool(open, path, "rb")
+            try:
+                yield file
+            finally:
+                file.close()
+        finally:
+            self.readers[key] -= 1
+            if not self.readers[key]:
+                del self.readers[key]
+            self._evict()
+
+    async def _cached(self, key: str) -> Path:
+        path = self.directory / key
+        if key in self.sizes and path.exists():
+            self.sizes.move_to_end(key)
+            return path
+        task = self.loading.get(key)
+        if task is None:
+            task = self.loading[key] = asyncio.create_task(self._fetch(key, path))
+        await asyncio.shield(task)
+        return path
+
+    async def _fetch(self, key: str, path: Path):
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            partial = path.with_name(f"{path.name}.{uuid.uuid4()}.part")
+            try:
+                await run_in_threadpool(archive_store.fetch, key, partial)
+                os.replace(partial, path)
+            finally:
+                partial.unlink(missing_ok=True)
+            self.sizes[key] = path.stat().st_size
+            self._evict()
+        finally:
+            del self.loading[key]
+
+    def _evict(self):
+        total = sum(self.sizes.values())
+        for key in list(self.sizes):
+            if total <= self.max_bytes:
+                break
+            if key in self.readers:
+                continue
+            total -= self.sizes.pop(key)
+            (self.directory / key).unlink(missing_ok=True)
+
+    def discard(self, key: str):
+        self.sizes.pop(key, None)
+        (self.directory / key).unlink(missing_ok=True)  # Open readers keep their file handle
+
+    def clear(self):
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+        self.sizes.clear()
+
+# The configured cache size is shared by all uvicorn workers
+archive_cache = ArchiveCache(
+    COLD_STORAGE_CACHE_DIR / "cache",
+    COLD_STORAGE_CACHE_BYTES // max(1, int(os.environ.get('WEB_CONCURRENCY') or os.cpu_count() or 1))
+)
+
+def read_archive_entry(file, name: str) -> bytes:
+    with zipfile.ZipFile(file) as archive:
+        return archive.read(name)
+
+async def read_archived_photo(photo: dict) -> bytes:
+    """Image bytes of a photo in cold storage"""
+    if archive_store is None:
+        raise HTTPException(status_code=503, detail="Photo is in cold storage, which is not configured")
+    async with archive_cache.reading(photo["archive"]) as file:
+        return await run_in_threadpool(read_archive_entry, file, photo["id"])
+
+async def rehydrate_photo(photo: dict) -> dict:
+    """Fill in image_data of a photo document loaded from cold storage"""
+    if photo.get("image_data") is None and photo.get("archive"):
+        photo["image_data"] = base64.b64encode(await read_archived_photo(photo)).decode()
+    return photo
+
+async def release_archives(keys: Iterable[str]):
+    """Delete archives no photo refers to any more"""
+    for key in keys:
+        if archive_store is None or await db.photos.find_one({"archive": key}, {"_id": 1}):
+            continue
+        try:
+            await run_in_threadpool(archive_store.delete, key)
+        except Exception as e:
+            logger.warning(f"Could not delete archive {key}: {e}")
+        archive_cache.discard(key)
+
+async def seal_archive(key: str, archive: zipfile.ZipFile, path: Path, photo_ids: List[str]):
+    """Upload a finished archive and turn its photos into stubs"""
+    await run_in_threadpool(archive.close)
+    await run_in_threadpool(archive_store.put, key, path)
+    path.unlink(missing_ok=True)  # Still staged if the store made a copy
+    result = await db.photos.update_many(
+        {"id": {"$in": photo_ids}, "archive": None},
+        {"$set": {"archive": key, "derivatives": None}, "$unset": {"image_data": ""}}
+    )
+    await db.photo_derivatives.delete_many({"photo_id": {"$in": photo_ids}})
+    if result.modified_count == 0:
+        await release_archives([key])  # All of its photos were deleted meanwhile
+    return result.modified_count
+
+async def archive_session_photos(session_id: str) -> int:
+    """Move a session's photos into cold storage; returns how many were moved"""
+    # IDs first, so the cursor does not time out while archives upload
+    photo_ids = [
+        photo["id"] for photo in await db.photos.find(
+            {"session_id": session_id, "archive": None, "image_data": {"$ne": None}}, {"id": 1}
+        ).to_list(None)
+    ]
+    staging = COLD_STORAGE_CACHE_DIR / "staging"
+    staging.mkdir(parents=True, exist_ok=True)
+    moved = 0
+    archive = None
+    try:
+        for start in range(0, len(photo_ids), ZIP_STREAM_BATCH_SIZE):
+            batch_ids = photo_ids[start:start + ZIP_STREAM_BATCH_SIZE]
+            async for photo in db.photos.find({"id": {"$in": batch_ids}, "archive": None}, {"id": 1, "image_data": 1}):
+                if archive is None:
+                    key = f"{session_id}/{uuid.uuid4()}.zip"
+                    path = staging / key.replace("/", "_")
+                    # Stored, not deflated: JPEG and PNG data does not compress further
+                    archive = zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED)
+                    archived_ids, archived_bytes = [], 0
+                data = base64.b64decode(photo["image_data"])
+                await run_in_threadpool(archive.writestr, photo["id"], data)
+                archived_ids.append(photo["id"])
+                archived_bytes += len(data)
+                if archived_bytes >= COLD_STORAGE_ARCHIVE_BYTES:
+                    moved += await seal_archive(key, archive, path, archived_ids)
+                    archive = None
+        if archive is not None:
+            moved += await seal_archive(key, archive, path, archived_ids)
+            archive = None
+    finally:
+        if archive is not None:
+            archive.close()
+            path.unlink(missing_ok=True)
+    return moved
+
+async def archive_idle_sessions():
+    cutoff = datetime.utcnow() - timedelta(days=COLD_STORAGE_AFTER_DAYS)
+    sessions = await db.sessions.find(
+        {"photo_count": {"$ne": 0}, "$or": [
+            {"last_upload_at": {"$lt": cutoff}},
+            {"last_upload_at": None, "created_at": {"$lt": cutoff}},
+        ]},
+        {"id": 1}
+    ).to_list(None)
+    for session in sessions:
+        if not await db.photos.find_one({"session_id": session["id"], "archive": None}, {"_id": 1}):
+            continue
+        moved = await archive_session_photos(session["id"])
+        if moved:
+            logger.info(f"Moved {moved} photos of session {session['id']} to cold storage")
+
 async def create_initial_superadmin():
-    existing_superadmin = await db.users.find_one({"is_superadmin": True})
-    if not existing_superadmin:
-        superadmin = User(
-            username="superadmin",
-            password_hash=get_password_hash("changeme123"),
-            is_superadmin=True,
-            allowed_sessions=[],  # Superadmin has access to all sessions
-            created_by="system"
+    if await db.users.find_one({"is_superadmin": True}):
+        return
+    superadmin = User(
+        username="superadmin",
+        password_hash=get_password_hash("changeme123"),
+        is_superadmin=True,
+        allowed_sessions=[],  # Superadmin has access to all sessions
+        created_by="system"
+    )
+    try:
+        # Upsert so concurrent workers cannot both insert; the unique username
+        # index turns a lost race into a DuplicateKeyError
+        result = await db.users.update_one(
+            {"is_superadmin": True},
+            {"$setOnInsert": superadmin.dict()},
+            upsert=True
         )
-        await db.users.insert_one(superadmin.dict())
+    except DuplicateKeyError:
+        return
+    if result.upserted_id is not None:
         logger.info("Created initial superadmin user (username: superadmin, password: changeme123)")
 
+# Upload admission control
+# Limits are per worker process, since each worker holds its own request bodies.
+UPLOAD_MAX_INFLIGHT_BYTES = int(os.environ.get('UPLOAD_MAX_INFLIGHT_MB', '256')) * 1024 * 1024
+UPLOAD_MAX_PER_SESSION = int(os.environ.get('UPLOAD_MAX_PER_SESSION', '4'))
+UPLOAD_MAX_QUEUE_PER_SESSION = int(os.environ.get('UPLOAD_MAX_QUEUE_PER_SESSION', '16'))
+UPLOAD_MAX_QUEUE = int(os.environ.get('UPLOAD_MAX_QUEUE', '256'))
+UPLOAD_QUEUE_TIMEOUT = float(os.environ.get('UPLOAD_QUEUE_TIMEOUT', '15'))
+UPLOAD_RETRY_AFTER = int(os.environ.get('UPLOAD_RETRY_AFTER', '5'))
+UPLOAD_ASSUMED_BYTES = 50 * 1024 * 1024  # Body size assumed when Content-Length is missing (nginx limit)
+# Peers whose X-Real-IP / X-Forwarded-For headers are believed (the nginx container)
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(network.strip())
+    for network in os.environ.get('TRUSTED_PROXIES', '127.0.0.0/8,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16').split(',')
+    if network.strip()
+]
+
+# Resumable uploads; chunks are staged in MongoDB so any worker can take any chunk,
+# and TTL indexes drop abandoned uploads
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE_KB', '1024')) * 1024
+UPLOAD_MIN_CHUNK_SIZE = 256 * 1024
+UPLOAD_MAX_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_MAX_FILE_BYTES = min(int(os.environ.get('UPLOAD_MAX_FILE_MB', '200')) * 1024 * 1024, MAX_PHOTO_BYTES)
+UPLOAD_STAGING_TTL = timedelta(hours=float(os.environ.get('UPLOAD_STAGING_TTL_HOURS', '24')))
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: Optional[int] = None):
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+class UploadAdmissionController:
+    """Admit uploads under a global in-flight byte cap and a per-session concurrency limit.
+
+    Waiting uploads are queued per session and admitted round-robin across sessions,
+    so one busy session cannot starve the others.
+    """
+
+    def __init__(self, max_inflight_bytes: int, max_per_session: int,
+                 max_queue_per_session: int, max_queue: int, queue_timeout: float):
+        self.max_inflight_bytes = max_inflight_bytes
+        self.max_per_session = max_per_session
+        self.max_queue_per_session = max_queue_per_session
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.inflight_bytes = 0
+        self.active: Dict[str, int] = {}
+        self.waiting: "OrderedDict[str, deque]" = OrderedDict()
+        self.queued = 0
+
+    def _fits(self, session_key: str, size: int) -> bool:
+        if self.active.get(session_key, 0) >= self.max_per_session:
+            return False
+        # An idle worker always admits one upload, however large
+        return self.inflight_bytes == 0 or self.inflight_bytes + size <= self.max_inflight_bytes
+
+    def _grant(self, session_key: str, size: int):
+        self.inflight_bytes += size
+        self.active[session_key] = self.active.get(session_key, 0) + 1
+
+    def _dispatch(self):
+        progress = True
+        while progress and self.waiting:
+            progress = False
+            for session_key in list(self.waiting):
+                queue = self.waiting[session_key]
+                while queue and queue[0][1].done():
+                    queue.popleft()  # Timed out or cancelled
+                if not queue:
+                    del self.waiting[session_key]
+                    continue
+                size, future = queue[0]
+                if self._fits(session_key, size):
+                    queue.popleft()
+                    self.queued -= 1
+                    self._grant(session_key, size)
+                    future.set_result(True)
+                    # Served sessions go to the back of the rotation
+                    self.waiting.move_to_end(session_key)
+                    progress = True
+
+    async def acquire(self, session_key: str, size: int):
+        if size > self.max_inflight_bytes:
+            raise AdmissionRejected(413, "Upload too large")
+        if not self.waiting.get(session_key) and self._fits(session_key, size):
+            self._grant(session_key, size)
+            return
+        if len(self.waiting.get(session_key, ())) >= self.max_queue_per_session:
+            raise AdmissionRejected(429, "Too many uploads for this session, please retry", UPLOAD_RETRY_AFTER)
+        if self.queued >= self.max_queue:
+            raise AdmissionRejected(503, "Server busy, please retry", UPLOAD_RETRY_AFTER)
+
+        future = asyncio.get_running_loop().create_future()
+        self.waiting.setdefault(session_key, deque()).append((size, future))
+        self.queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._abandon(session_key, size, future)
+            raise AdmissionRejected(503, "Server busy, please retry", UPLOAD_RETRY_AFTER)
+        except asyncio.CancelledError:
+            self._abandon(session_key, size, future)
+            raise
+
+    def _abandon(self, session_key: str, size: int, future: asyncio.Future):
+        if future.done() and not future.cancelled():
+            # Admitted just as the waiter gave up; hand the slot back
+            self.release(session_key, size)
+        else:
+            future.cancel()
+            self.queued -= 1
+            self._dispatch()
+
+    def release(self, session_key: str, size: int):
+        self.inflight_bytes -= size
+        self.active[session_key] -= 1
+        if not self.active[session_key]:
+            del self.active[session_key]
+        self._dispatch()
+
+upload_admission = UploadAdmissionController(
+    UPLOAD_MAX_INFLIGHT_BYTES, UPLOAD_MAX_PER_SESSION,
+    UPLOAD_MAX_QUEUE_PER_SESSION, UPLOAD_MAX_QUEUE, UPLOAD_QUEUE_TIMEOUT
+)
+
+class UploadAdmissionMiddleware:
+    """Apply upload admission control before the request body is read.
+
+    Clients identify their session with the X-Upload-Session header; requests
+    without it, or naming no active session, are grouped by client address,
+    as reported by a trusted proxy.
+    """
+
+    def __init__(self, app, controller: UploadAdmissionController):
+        self.app = app
+        self.controller = controller
+
+    @staticmethod
+    def is_upload(scope) -> bool:
+        if scope["type"] != "http":
+            return False
+        if scope["method"] == "POST":
+            path = scope["path"]
+            return path == "/api/photos" or (path.startswith("/api/uploads/") and path.endswith("/complete"))
+        if scope["method"] == "PUT":
+            return scope["path"].startswith("/api/uploads/") and "/chunks/" in scope["path"]
+        return False
+
+    @staticmethod
+    def client_address(scope, headers) -> str:
+        """The uploading client's address; proxy headers are only believed from a trusted proxy"""
+        peer = (scope.get("client") or ("unknown",))[0]
+        try:
+            trusted = any(ipaddress.ip_address(peer) in network for network in TRUSTED_PROXIES)
+        except ValueError:
+            trusted = False
+        if trusted:
+            real_ip = headers.get(b"x-real-ip", b"").decode("latin-1").strip()
+            if real_ip:
+                return real_ip
+            # The last entry is the one our proxy appended; earlier ones are client-supplied
+            forwarded_for = headers.get(b"x-forwarded-for", b"").decode("latin-1").split(",")[-1].strip()
+            if forwarded_for:
+                return forwarded_for
+        return peer
+
+    @staticmethod
+    def estimated_file_size(content_length: int) -> int:
+        """Lower bound of the photo size in a JSON upload body (base64 plus a little JSON)"""
+        return max(0, content_length - 1024) * 3 // 4
+
+    async def __call__(self, scope, receive, send):
+        if not self.is_upload(scope):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        session_key = f"client:{self.client_address(scope, headers)}"
+        try:
+            content_length = int(headers.get(b"content-length", b""))
+        except ValueError:
+            content_length = None  # Chunked transfer encoding
+        size = UPLOAD_ASSUMED_BYTES if content_length is None else content_length
+
+        if scope["path"].endswith("/complete"):
+            # Finalizing has an empty body but assembles the whole file in memory
+            upload = await db.uploads.find_one({"id": scope["path"].split("/")[3]}, {"session_id": 1, "file_size": 1})
+            if upload:
+                session_key, size = upload["session_id"], upload["file_size"]
+        else:
+            # The header is client-chosen, so only an active session gets its own share;
+            # made-up values would otherwise escape the per-session limits
+            claimed_session = headers.get(b"x-upload-session", b"").decode("latin-1")
+            session = await get_active_session(claimed_session) if claimed_session else None
+            if session:
+                session_key = claimed_session
+                if scope["method"] == "POST" and content_length is not None:
+                    # A full session or an oversized photo is refused before the body is read;
+                    # without a length, reserve_quota checks once the body is in
+                    try:
+                        check_quota(session, self.estimated_file_size(content_length))
+                    except HTTPException as e:
+                        await JSONResponse({"detail": e.detail}, status_code=e.status_code)(scope, receive, send)
+                        return
+
+        try:
+            await self.controller.acquire(session_key, size)
+        except AdmissionRejected as e:
+            response_headers = {"Retry-After": str(e.retry_after)} if e.retry_after else None
+            response = JSONResponse({"detail": e.detail}, status_code=e.status_code, headers=response_headers)
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(session_key, size)
+
 # Routes
 @api_router.get("/")
 async def root():
@@ -209,15 +1730,11 @@ async def create_user(user_create: UserCreate, current_user: User = Depends(get_
         raise HTTPException(status_code=400, detail="Username already exists")
     
     # Validate session access if allowed_sessions is specified
-    if user_create.allowed_sessions:
-        for session_id in user_create.allowed_sessions:
-            session = await db.sessions.find_one({"id": session_id})
-            if not session:
-                raise HTTPException(status_code=400, detail=f"Session {session_id} not found")
+    await validate_session_ids(user_create.allowed_sessions)
     
     user = User(
         username=user_create.username,
-        password_hash=get_password_hash(user_create.password),
+        password_hash=await run_in_threadpool(get_password_hash, user_create.password),
         is_superadmin=user_create.is_superadmin,
         allowed_sessions=user_create.allowed_sessions,
         created_by=current_user.id
@@ -247,27 +1764,96 @@ async def update_user(user_id: str, user_update: UserUpdate, current_user: User
         update_data["username"] = user_update.username
     
     if user_update.password is not None:
-        update_data["password_hash"] = get_password_hash(user_update.password)
+        update_data["password_hash"] = await run_in_threadpool(get_password_hash, user_update.password)
     
     if user_update.is_superadmin is not None:
         update_data["is_superadmin"] = user_update.is_superadmin
     
     if user_update.allowed_sessions is not None:
-        # Validate session access if allowed_sessions is specified
-        if user_update.allowed_sessions:
-            for session_id in user_update.allowed_sessions:
-                session = await db.sessions.find_one({"id": session_id})
-                if not session:
-                    raise HTTPException(status_code=400, detail=f"Session {session_id} not found")
+        # Only newly granted sessions must exist; hard-deleted sessions stay in the list
+        # because removing a user's last one would grant access to all sessions
+        already_allowed = set(existing_user.get("allowed_sessions", []))
+        await validate_session_ids([
+            session_id for session_id in user_update.allowed_sessions if session_id not in already_allowed
+        ])
         update_data["allowed_sessions"] = user_update.allowed_sessions
     
-    # Update user
-    await db.users.update_one({"id": user_id}, {"$set": update_data})
+    # Update user; the new version makes every worker rebuild its access set
+    await db.users.update_one({"id": user_id}, {"$set": update_data, "$inc": {"version": 1}})
     
     # Return updated user
     updated_user = await db.users.find_one({"id": user_id})
     return User(**updated_user)
 
+@api_router.post("/users/bulk")
+async def provision_users(users: List[UserProvision], current_user: User = Depends(get_current_superadmin)):
+    """Create or update many users at once; existing users are matched by username"""
+    if not users:
+        raise HTTPException(status_code=400, detail="No users provided")
+    if len(users) > BULK_USER_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_USER_LIMIT} users per request")
+    usernames = [entry.username for entry in users]
+    seen = set()
+    duplicates = sorted({username for username in usernames if username in seen or seen.add(username)})
+    if duplicates:
+        raise HTTPException(status_code=400, detail=f"Duplicate usernames: {', '.join(duplicates)}")
+    
+    existing = {
+        user["username"]: user
+        for user in await db.users.find(
+            {"username": {"$in": usernames}}, {"id": 1, "username": 1, "allowed_sessions": 1}
+        ).to_list(None)
+    }
+    # As in update_user, only newly granted sessions must exist
+    await validate_session_ids([
+        session_id for entry in users for session_id in (entry.allowed_sessions or [])
+        if session_id not in existing.get(entry.username, {}).get("allowed_sessions", [])
+    ])
+    missing_passwords = [entry.username for entry in users if entry.username not in existing and not entry.password]
+    if missing_passwords:
+        raise HTTPException(status_code=400, detail=f"Password required for new users: {', '.join(missing_passwords)}")
+    
+    loop = asyncio.get_running_loop()
+    hashes = await asyncio.gather(*[
+        loop.run_in_executor(password_hash_pool, get_password_hash, entry.password) if entry.password
+        else asyncio.sleep(0)
+        for entry in users
+    ])
+    
+    operations = []
+    created, updated = [], []
+    for entry, password_hash in zip(users, hashes):
+        if entry.username in existing:
+            update_data = {"password_hash": password_hash} if password_hash else {}
+            if entry.is_superadmin is not None:
+                update_data["is_superadmin"] = entry.is_superadmin
+            if entry.allowed_sessions is not None:
+                update_data["allowed_sessions"] = entry.allowed_sessions
+            if update_data:
+                operations.append(UpdateOne(
+                    {"username": entry.username}, {"$set": update_data, "$inc": {"version": 1}}
+                ))
+            updated.append(existing[entry.username]["id"])
+        else:
+            user = User(
+                username=entry.username,
+                password_hash=password_hash,
+                is_superadmin=bool(entry.is_superadmin),
+                allowed_sessions=entry.allowed_sessions or [],
+                created_by=current_user.id
+            )
+            operations.append(InsertOne(user.dict()))
+            created.append(user.id)
+    
+    if operations:
+        try:
+            await db.users.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # Another request created some of the same usernames in the meantime
+            failed = len(e.details.get("writeErrors", []))
+            raise HTTPException(status_code=409, detail=f"{failed} users could not be written; retry the request")
+    return {"created": created, "updated": updated}
+
 @api_router.delete("/users/{user_id}")
 async def delete_user(user_id: str, current_user: User = Depends(get_current_superadmin)):
     if user_id == current_user.id:
@@ -284,24 +1870,55 @@ async def create_session(session_create: SessionCreate, current_user: User = Dep
     session = Session(
         name=session_create.name,
         description=session_create.description,
-        created_by=current_user.id
+        created_by=current_user.id,
+        max_image_dimension=session_create.max_image_dimension,
+        image_quality=session_create.image_quality,
+        strip_metadata=session_create.strip_metadata,
+        max_photos=session_create.max_photos,
+        max_total_bytes=session_create.max_total_bytes,
+        max_file_size=session_create.max_file_size,
+        purge_after_deactivation_days=session_create.purge_after_deactivation_days,
+        purge_after_last_upload_days=session_create.purge_after_last_upload_days
     )
     await db.sessions.insert_one(session.dict())
+    await publish_invalidation("sessions", session.id)
     return session
 
 @api_router.get("/sessions", response_model=List[Session])
-async def get_sessions(current_user: User = Depends(get_current_user)):
-    # If user is superadmin or has no session restrictions, return all sessions
-    if current_user.is_superadmin or not current_user.allowed_sessions:
-        sessions = await db.sessions.find({"is_active": True}).to_list(1000)
-    else:
-        # Return only sessions the user has access to
-        sessions = await db.sessions.find({
-            "id": {"$in": current_user.allowed_sessions},
-            "is_active": True
-        }).to_list(1000)
+async def get_sessions(
+    request: Request,
+    response: Response,
+    limit: int = Query(200, ge=1, le=1000),
+    after: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Active sessions the user may access, newest first.
+
+    Pass the id of the last session received as `after` for the next page;
+    X-Total-Count holds the number of sessions in the user's view.
+    """
+    directory = await get_session_directory()
+    etag = '"' + hashlib.sha1(
+        f"{directory.etag}:{current_user.id}:{current_user.version}:{limit}:{after}".encode()
+    ).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
     
-    return [Session(**session) for session in sessions]
+    # Superadmins and users without session restrictions see every session
+    sessions = current_user.access.filter(directory.sessions, lambda session: session.id)
+    start = 0
+    if after:
+        if after not in directory.position:
+            raise HTTPException(status_code=400, detail="Unknown page cursor")
+        anchor = directory.position[after]
+        start = next(
+            (index for index, session in enumerate(sessions) if directory.position[session.id] > anchor),
+            len(sessions)
+        )
+    response.headers.update(headers)
+    response.headers["X-Total-Count"] = str(len(sessions))
+    return sessions[start:start + limit]
 
 @api_router.get("/sessions/{session_id}", response_model=Session)
 async def get_session(session_id: str, current_user: User = Depends(get_current_user)):
@@ -313,6 +1930,27 @@ async def get_session(session_id: str, current_user: User = Depends(get_current_
         raise HTTPException(status_code=404, detail="Session not found")
     return Session(**session)
 
+@api_router.put("/sessions/{session_id}", response_model=Session)
+async def update_session(session_id: str, session_update: SessionUpdate, current_user: User = Depends(get_current_user)):
+    # Check session access
+    await check_session_access(session_id, current_user)
+    
+    # Downscaling settings may be cleared by sending null explicitly
+    update_data = session_update.dict(exclude_unset=True)
+    for field in ("name", "description", "strip_metadata"):
+        if update_data.get(field, "") is None:
+            del update_data[field]
+    if not update_data:
+        raise HTTPException(status_code=400, detail="No changes provided")
+    
+    result = await db.sessions.update_one({"id": session_id}, {"$set": update_data})
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    await publish_invalidation("sessions", session_id)
+    session = await db.sessions.find_one({"id": session_id})
+    return Session(**session)
+
 @api_router.get("/sessions/{session_id}/qr")
 async def get_session_qr(session_id: str, current_user: User = Depends(get_current_user)):
     # Check session access
@@ -329,24 +1967,201 @@ async def get_session_qr(session_id: str, current_user: User = Depends(get_curre
     
     return {"qr_code": qr_code, "upload_url": upload_url}
 
+@api_router.get("/sessions/{session_id}/contact-sheet")
+async def get_contact_sheet(
+    session_id: str,
+    columns: int = Query(6, ge=1, le=20),
+    tile_size: int = Query(200, ge=64, le=600),
+    format: Literal["jpeg", "png", "pdf"] = "jpeg",
+    rows_per_page: int = Query(8, ge=1, le=40),
+    sort: Literal["taken_at", "uploaded_at"] = "taken_at",
+    current_user: User = Depends(get_current_user)
+):
+    """Overview of a session's photos as one grid image, or a PDF with rows_per_page rows per page"""
+    # Check session access
+    await check_session_access(session_id, current_user)
+    
+    session = await db.sessions.find_one({"id": session_id}, {"name": 1})
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    width = columns * (tile_size + 2 * CONTACT_SHEET_MARGIN) + 2 * CONTACT_SHEET_MARGIN
+    if width > CONTACT_SHEET_MAX_WIDTH:
+        raise HTTPException(status_code=400, detail=f"Sheet would be {width} pixels wide; use fewer columns or smaller tiles")
+    
+    _, media_type = CONTACT_SHEET_FORMATS[format]
+    filename = f"{file_safe(session['name'])}_contact_sheet.{'jpg' if format == 'jpeg' else format}"
+    headers = {"Content-Disposition": f'inline; filename="{filename}"'}
+    key = (session_id, columns, tile_size, format, rows_per_page if format == "pdf" else None, sort)
+    cached = contact_sheets.get(key)
+    if cached is not None:
+        contact_sheets.move_to_end(key)
+        return Response(content=cached, media_type=media_type, headers=headers)
+    
+    loop = asyncio.get_running_loop()
+    max_photos = min(CONTACT_SHEET_MAX_PHOTOS, CONTACT_SHEET_MAX_PIXELS // tile_size ** 2)
+    async with contact_sheet_semaphore:
+        tiles = []
+        cursor = db.photos.find({"session_id": session_id}, {"id": 1, "image_data": 1, "archive": 1}).sort(
+            [(sort, -1), ("id", -1)]).limit(max_photos).batch_size(ZIP_STREAM_BATCH_SIZE)
+        batch = []
+        async for photo in cursor:
+            image_data = photo.get("image_data") or await read_archived_photo(photo)
+            batch.append(loop.run_in_executor(contact_sheet_pool, decode_tile, image_data, tile_size))
+            if len(batch) == ZIP_STREAM_BATCH_SIZE:
+                tiles.extend(await asyncio.gather(*batch))
+                batch = []
+        tiles.extend(await asyncio.gather(*batch))
+        if not tiles:
+            raise HTTPException(status_code=404, detail="Session has no photos")
+        
+        data = await run_in_threadpool(render_contact_sheet, tiles, columns, rows_per_page, format)
+    cache_contact_sheet(key, data)
+    return Response(content=data, media_type=media_type, headers=headers)
+
 @api_router.delete("/sessions/{session_id}")
-async def delete_session(session_id: str, current_user: User = Depends(get_current_user)):
+async def delete_session(session_id: str, hard: bool = False, current_user: User = Depends(get_current_user)):
+    """Deactivate a session; hard=true also deletes it and all its photos in the background"""
     # Check session access
     await check_session_access(session_id, current_user)
     
-    result = await db.sessions.update_one(
-        {"id": session_id}, 
-        {"$set": {"is_active": False}}
-    )
+    update = {"is_active": False, "deactivated_at": datetime.utcnow()}
+    if hard:
+        update["deleting"] = True
+    result = await db.sessions.update_one({"id": session_id}, {"$set": update})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Session not found")
+    await publish_invalidation("sessions", session_id)
+    if hard:
+        task = asyncio.create_task(hard_delete_session(session_id))
+        background_tasks.append(task)
+        task.add_done_callback(background_tasks.remove)
+        return {"message": "Session is being deleted"}
     return {"message": "Session deactivated successfully"}
 
+@api_router.get("/retention/report")
+async def get_retention_report(current_user: User = Depends(get_current_superadmin)):
+    """Dry run of the purge job: sessions whose photos would be deleted now"""
+    return await retention_report()
+
+# Web derivatives; generated in the background after ingest, a few at a time per worker
+derivative_semaphore = asyncio.Semaphore(DERIVATIVE_CONCURRENCY)
+pending_derivatives: Dict[str, asyncio.Task] = {}
+
+async def generate_derivatives(photo_id: str):
+    try:
+        async with derivative_semaphore:
+            photo = await db.photos.find_one({"id": photo_id}, {"image_data": 1, "derivatives": 1})
+            if not photo or photo.get("derivatives") is not None or not photo.get("image_data"):
+                return
+            derivatives = await run_in_threadpool(encode_derivatives, base64.b64decode(photo["image_data"]))
+            for content_type, data in derivatives.items():
+                await db.photo_derivatives.update_one(
+                    {"photo_id": photo_id, "content_type": content_type},
+                    {"$set": {"data": Binary(data), "size": len(data), "created_at": datetime.utcnow()}},
+                    upsert=True
+                )
+            result = await db.photos.update_one({"id": photo_id}, {"$set": {"derivatives": list(derivatives)}})
+            if result.matched_count == 0:
+                # Deleted while encoding
+                await db.photo_derivatives.delete_many({"photo_id": photo_id})
+    except Exception as e:
+        logger.error(f"Error generating derivatives for photo {photo_id}: {e}")
+
+def schedule_derivatives(photo_id: str):
+    if not DERIVATIVE_FORMATS or photo_id in pending_derivatives:
+        return
+    task = asyncio.create_task(generate_derivatives(photo_id))
+    pending_derivatives[photo_id] = task
+    task.add_done_callback(lambda _: pending_derivatives.pop(photo_id, None))
+
+# Upload quotas
+# check_quota is a cheap early filter on the cached session; reserve_quota is the
+# authoritative check, a conditional $inc on the session counters. A reservation
+# that is never committed or released (e.g. a crashed worker) is fixed by the
+# periodic counter reconciliation.
+def check_file_size(session: dict, file_size: int):
+    if file_size > MAX_PHOTO_BYTES:
+        raise HTTPException(status_code=413, detail=f"File exceeds the limit of {MAX_PHOTO_BYTES} bytes")
+    max_file_size = session.get("max_file_size")
+    if max_file_size and file_size > max_file_size:
+        raise HTTPException(status_code=413, detail=f"File exceeds this session's limit of {max_file_size} bytes")
+
+def check_quota(session: dict, file_size: int):
+    check_file_size(session, file_size)
+    max_photos = session.get("max_photos")
+    if max_photos and session.get("photo_count", 0) >= max_photos:
+        raise HTTPException(status_code=429, detail="This session is not accepting more photos")
+    max_total_bytes = session.get("max_total_bytes")
+    if max_total_bytes and session.get("total_bytes", 0) + file_size > max_total_bytes:
+        raise HTTPException(status_code=413, detail="This session has no storage left for this file")
+
+async def reserve_quota(session: dict, file_size: int):
+    check_file_size(session, file_size)
+    conditions = {"id": session["id"]}
+    if session.get("max_photos"):
+        conditions["photo_count"] = {"$lt": session["max_photos"]}
+    if session.get("max_total_bytes"):
+        conditions["$expr"] = {"$lte": [{"$add": [{"$ifNull": ["$total_bytes", 0]}, file_size]},
+                                        session["max_total_bytes"]]}
+    result = await db.sessions.update_one(
+        conditions,
+        {"$inc": {"photo_count": 1, "total_bytes": file_size}, "$set": {"reserved_at": datetime.utcnow()}}
+    )
+    if result.matched_count == 0:
+        # Report which quota was hit, using the current counters
+        current = await db.sessions.find_one({"id": session["id"]}, {"photo_count": 1, "total_bytes": 1})
+        check_quota({**session, **(current or {})}, file_size)
+        raise HTTPException(status_code=429, detail="This session is not accepting more photos")
+
+async def commit_quota(session_id: str, reserved_bytes: int, photos: List["Photo"]):
+    """Settle the reservations of stored photos, which may have shrunk while being processed"""
+    await db.sessions.update_one(
+        {"id": session_id},
+        {"$inc": {"total_bytes": sum(photo.file_size for photo in photos) - reserved_bytes},
+         "$max": {"last_upload_at": max(photo.uploaded_at for photo in photos)}}
+    )
+
+async def release_quota(session_id: str, reserved_bytes: int, count: int = 1):
+    await db.sessions.update_one({"id": session_id}, {"$inc": {"photo_count": -count, "total_bytes": -reserved_bytes}})
+
 # Photo upload routes
+async def prepare_photo(photo: Photo, session: dict, data: bytes):
+    """Apply the session's image settings to an uploaded photo and fill in its metadata"""
+    quality = session.get("image_quality") or DEFAULT_IMAGE_QUALITY
+    processed, metadata = await run_in_threadpool(
+        prepare_image, data, session.get("max_image_dimension"), quality, session.get("strip_metadata", False)
+    )
+    if processed is not None:
+        name = photo.filename.rsplit(".", 1)[0] if "." in photo.filename else photo.filename
+        photo.filename = f"{name}.jpg"
+        photo.content_type = "image/jpeg"
+        photo.image_data = base64.b64encode(processed).decode()
+        photo.file_size = len(processed)
+    for field, value in metadata.items():
+        setattr(photo, field, value)
+    photo.taken_at = photo.taken_at or photo.uploaded_at
+
+async def ingest_photo(photo: Photo, session: dict) -> Photo:
+    """Store a newly uploaded photo; shared by every upload path"""
+    data = base64.b64decode(photo.image_data)
+    photo.file_size = len(data)
+    await reserve_quota(session, len(data))
+    try:
+        await prepare_photo(photo, session, data)
+        await db.photos.insert_one(photo.dict())
+    except BaseException:
+        await release_quota(session["id"], len(data))
+        raise
+    await commit_quota(session["id"], len(data), [photo])
+    schedule_derivatives(photo.id)
+    await publish_invalidation("session_photos", photo.session_id)
+    return photo
+
 @api_router.post("/photos", response_model=Photo)
 async def upload_photo(photo_upload: PhotoUpload):
     # Verify session exists and is active
-    session = await db.sessions.find_one({"id": photo_upload.session_id, "is_active": True})
+    session = await get_active_session(photo_upload.session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found or inactive")
     
@@ -357,16 +2172,406 @@ async def upload_photo(photo_upload: PhotoUpload):
         image_data=photo_upload.image_data,
         file_size=photo_upload.file_size
     )
-    await db.photos.insert_one(photo.dict())
+    return await ingest_photo(photo, session)
+
+# Resumable chunked uploads
+def upload_status(upload: dict, received_chunks: List[dict]) -> dict:
+    received = sorted(chunk["index"] for chunk in received_chunks)
+    # Contiguous offset the client can safely resume from
+    next_chunk = 0
+    for index in received:
+        if index != next_chunk:
+            break
+        next_chunk += 1
+    return {
+        "upload_id": upload["id"],
+        "session_id": upload["session_id"],
+        "chunk_size": upload["chunk_size"],
+        "total_chunks": upload["total_chunks"],
+        "received_chunks": received,
+        "received_bytes": min(upload["file_size"], next_chunk * upload["chunk_size"]),
+        "next_chunk": next_chunk,
+        "photo_id": upload["photo_id"],
+    }
+
+async def get_staged_upload(upload_id: str) -> dict:
+    upload = await db.uploads.find_one({"id": upload_id})
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found or expired")
+    return upload
+
+@api_router.post("/uploads")
+async def create_upload(upload_create: UploadCreate):
+    session = await get_active_session(upload_create.session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found or inactive")
+    if upload_create.file_size <= 0:
+        raise HTTPException(status_code=400, detail="File is empty")
+    if upload_create.file_size > UPLOAD_MAX_FILE_BYTES:
+        raise HTTPException(status_code=413, detail="File too large")
+    # Reject before any chunk is sent; the quota is reserved when the upload completes
+    check_quota(session, upload_create.file_size)
+
+    chunk_size = upload_create.chunk_size or UPLOAD_CHUNK_SIZE
+    chunk_size = max(UPLOAD_MIN_CHUNK_SIZE, min(UPLOAD_MAX_CHUNK_SIZE, chunk_size))
+    upload = {
+        "id": str(uuid.uuid4()),
+        "session_id": upload_create.session_id,
+        "filename": upload_create.filename,
+        "content_type": upload_create.content_type,
+        "file_size": upload_create.file_size,
+        "chunk_size": chunk_size,
+        "total_chunks": -(-upload_create.file_size // chunk_size),
+        # Reserved up front so that repeated finalize calls create the photo once
+        "photo_id": str(uuid.uuid4()),
+        "completed": False,
+        "created_at": datetime.utcnow(),
+        "expires_at": datetime.utcnow() + UPLOAD_STAGING_TTL
+    }
+    await db.uploads.insert_one(upload)
+    return upload_status(upload, [])
+
+@api_router.get("/uploads/{upload_id}")
+async def get_upload_status(upload_id: str):
+    upload = await get_staged_upload(upload_id)
+    chunks = await db.upload_chunks.find({"upload_id": upload_id}, {"index": 1}).to_list(None)
+    return upload_status(upload, chunks)
+
+@api_router.put("/uploads/{upload_id}/chunks/{index}")
+async def put_upload_chunk(upload_id: str, index: int, request: Request):
+    upload = await get_staged_upload(upload_id)
+    if upload["completed"]:
+        raise HTTPException(status_code=409, detail="Upload already completed")
+    if index < 0 or index >= upload["total_chunks"]:
+        raise HTTPException(status_code=400, detail="Chunk index out of range")
+
+    data = await request.body()
+    expected = upload["chunk_size"]
+    if index == upload["total_chunks"] - 1:
+        expected = upload["file_size"] - upload["chunk_size"] * index
+    if len(data) != expected:
+        raise HTTPException(status_code=400, detail=f"Chunk {index} must be {expected} bytes, got {len(data)}")
+
+    expires_at = datetime.utcnow() + UPLOAD_STAGING_TTL
+    await db.upload_chunks.update_one(
+        {"upload_id": upload_id, "index": index},
+        {"$set": {"data": Binary(data), "size": len(data), "expires_at": expires_at}},
+        upsert=True
+    )
+    # Keep the whole upload alive while the client is still sending
+    await db.upload_chunks.update_many({"upload_id": upload_id}, {"$set": {"expires_at": expires_at}})
+    await db.uploads.update_one({"id": upload_id}, {"$set": {"expires_at": expires_at}})
+    return {"upload_id": upload_id, "index": index, "size": len(data)}
+
+@api_router.post("/uploads/{upload_id}/complete", response_model=Photo)
+async def complete_upload(upload_id: str):
+    upload = await get_staged_upload(upload_id)
+    if upload["completed"]:
+        photo = await db.photos.find_one({"id": upload["photo_id"]})
+        if not photo:
+            raise HTTPException(status_code=409, detail="Upload already completed")
+        return Photo(**photo)
+
+    chunks = await db.upload_chunks.find({"upload_id": upload_id}).sort("index", 1).to_list(None)
+    if len(chunks) != upload["total_chunks"]:
+        missing = sorted(set(range(upload["total_chunks"])) - {chunk["index"] for chunk in chunks})
+        raise HTTPException(status_code=409, detail={"message": "Upload incomplete", "missing_chunks": missing})
+
+    session = await get_active_session(upload["session_id"])
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found or inactive")
+
+    data = b"".join(bytes(chunk["data"]) for chunk in chunks)
+    photo = Photo(
+        id=upload["photo_id"],
+        session_id=upload["session_id"],
+        filename=upload["filename"],
+        content_type=upload["content_type"],
+        image_data=base64.b64encode(data).decode(),
+        file_size=len(data)
+    )
+    try:
+        await ingest_photo(photo, session)
+    except DuplicateKeyError:
+        pass  # A concurrent finalize already stored it
+
+    await db.uploads.update_one({"id": upload_id}, {"$set": {"completed": True}})
+    await db.upload_chunks.delete_many({"upload_id": upload_id})
     return photo
 
-@api_router.get("/photos/session/{session_id}", response_model=List[Photo])
-async def get_photos_by_session(session_id: str, current_user: User = Depends(get_current_user)):
+# Archive imports
+# The request body is spooled to a temporary file while it arrives; a background task
+# then reads one entry at a time and stores the photos in insert_many batches.
+IMPORT_MAX_BYTES = int(float(os.environ.get('IMPORT_MAX_MB', '2048')) * 1024 * 1024)
+IMPORT_MAX_ENTRY_BYTES = MAX_PHOTO_BYTES  # Larger entries could not be stored; they are skipped unread
+IMPORT_BATCH_SIZE = 20
+IMPORT_SKIPPED_REPORTED = 100  # Skipped entries listed in the job status
+IMPORT_JOB_TTL = timedelta(days=7)
+
+def archive_entries(path: Path, kind: str) -> Iterable[Tuple[str, Optional[bytes], Optional[str]]]:
+    """Yield (name, data, reason) for each file of a ZIP or tar archive; data is None when it is skipped for reason"""
+    if kind == "zip":
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    reason = import_skip_reason(info.filename, info.file_size)
+                    yield info.filename, None if reason else archive.read(info), reason
+    else:
+        # Streaming mode reads the members in order without building an index
+        with tarfile.open(path, "r|*") as archive:
+            for member in archive:
+                if member.isfile():
+                    reason = import_skip_reason(member.name, member.size)
+                    yield member.name, None if reason else archive.extractfile(member).read(), reason
+
+def import_skip_reason(name: str, size: int) -> Optional[str]:
+    filename = name.rsplit("/", 1)[-1]
+    if filename.startswith(".") or name.startswith("__MACOSX/"):
+        return "hidden file"
+    content_type, _ = mimetypes.guess_type(filename)
+    if not content_type or not content_type.startswith("image/"):
+        return "not an image"
+    if size > IMPORT_MAX_ENTRY_BYTES:
+        return "file too large"
+    return None
+
+def is_readable_image(data: bytes) -> bool:
+    try:
+        with Image.open(io.BytesIO(data)):
+            return True
+    except Exception:
+        return False
+
+def import_status(job: dict) -> dict:
+    return {key: value for key, value in job.items() if key not in ("_id", "expires_at")}
+
+async def import_archive_photos(job: dict, session: dict, path: Path, kind: str):
+    """Import the photos of a spooled archive, recording progress in the job document"""
+    session_id = session["id"]
+    progress = {"status": "running", "processed": 0, "imported": 0, "skipped": 0, "skipped_entries": []}
+    batch: List[Photo] = []
+    reserved_bytes = 0
+
+    async def save_progress(**changes):
+        progress.update(changes)
+        await db.import_jobs.update_one({"id": job["id"]}, {"$set": {**progress, "updated_at": datetime.utcnow()}})
+
+    def skip(name: str, reason: str):
+        progress["skipped"] += 1
+        if len(progress["skipped_entries"]) < IMPORT_SKIPPED_REPORTED:
+            progress["skipped_entries"].append({"name": name, "reason": reason})
+
+    async def store_batch():
+        nonlocal batch, reserved_bytes
+        try:
+            await db.photos.insert_many([photo.dict() for photo in batch], ordered=False)
+        except BaseException:
+            await release_quota(session_id, reserved_bytes, len(batch))
+            raise
+        await commit_quota(session_id, reserved_bytes, batch)
+        for photo in batch:
+            schedule_derivatives(photo.id)
+        await publish_invalidation("session_photos", session_id)
+        await save_progress(imported=progress["imported"] + len(batch))
+        batch, reserved_bytes = [], 0
+
+    loop = asyncio.get_running_loop()
+    entries = iter(archive_entries(path, kind))
+    reading: Optional[asyncio.Future] = None
+    try:
+        await save_progress()
+        while True:
+            # Shielded, so a cancelled import can wait for the generator before closing it
+            reading = loop.run_in_executor(None, next, entries, None)
+            entry = await asyncio.shield(reading)
+            if entry is None:
+                break
+            name, data, reason = entry
+            progress["processed"] += 1
+            if data is None:
+                skip(name, reason)
+                continue
+            if not await run_in_threadpool(is_readable_image, data):
+                skip(name, "not a readable image")
+                continue
+            try:
+                check_file_size(session, len(data))
+            except HTTPException as e:
+                skip(name, e.detail)
+                continue
+            try:
+                await reserve_quota(session, len(data))
+            except HTTPException as e:
+                skip(name, e.detail)
+                progress["stopped_reason"] = e.detail  # The session is full; the remaining entries are not read
+                break
+            reserved_bytes += len(data)
+            photo = Photo(
+                session_id=session_id,
+                filename=name.rsplit("/", 1)[-1],
+                content_type=mimetypes.guess_type(name)[0],
+                image_data=base64.b64encode(data).decode(),
+                file_size=len(data)
+            )
+            batch.append(photo)
+            await prepare_photo(photo, session, data)
+            if len(batch) == IMPORT_BATCH_SIZE:
+                await store_batch()
+        if batch:
+            await store_batch()
+        await save_progress(status="completed", finished_at=datetime.utcnow())
+    except asyncio.CancelledError:
+        if batch:
+            await release_quota(session_id, reserved_bytes, len(batch))
+        # Shutdown cancels imports; without a final status clients would poll until the job expires
+        await save_progress(status="interrupted", finished_at=datetime.utcnow())
+        raise
+    except Exception as e:
+        logger.error(f"Import {job['id']} into session {session_id} failed: {e}")
+        if batch:
+            await release_quota(session_id, reserved_bytes, len(batch))
+        await save_progress(status="failed", error=str(e), finished_at=datetime.utcnow())
+    finally:
+        if reading is not None and not reading.done():
+            await asyncio.wait([reading])  # Closing a generator that is running raises ValueError
+        await run_in_threadpool(entries.close)
+        path.unlink(missing_ok=True)
+
+@api_router.post("/sessions/{session_id}/import", status_code=202)
+async def import_archive(session_id: str, request: Request, current_user: User = Depends(get_current_user)):
+    """Add the photos of a ZIP or tar archive sent as the request body.
+
+    The import runs in the background; poll GET /sessions/{session_id}/import/{job_id} for progress.
+    """
+    # Check session access
+    await check_session_access(session_id, current_user)
+    
+    session = await db.sessions.find_one({"id": session_id, "deleting": {"$ne": True}}, {"_id": 0})
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    fd, name = tempfile.mkstemp(prefix="import-", suffix=".part")
+    path = Path(name)
+    try:
+        received = 0
+        with os.fdopen(fd, "wb") as spool:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > IMPORT_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Archives may be at most {IMPORT_MAX_BYTES} bytes")
+                await run_in_threadpool(spool.write, chunk)
+        if await run_in_threadpool(zipfile.is_zipfile, path):
+            kind = "zip"
+        elif await run_in_threadpool(tarfile.is_tarfile, path):
+            kind = "tar"
+        else:
+            raise HTTPException(status_code=400, detail="Upload a ZIP or tar archive")
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    
+    now = datetime.utcnow()
+    job = {
+        "id": str(uuid.uuid4()),
+        "session_id": session_id,
+        "created_by": current_user.username,
+        "archive_bytes": received,
+        "status": "queued",
+        "processed": 0,
+        "imported": 0,
+        "skipped": 0,
+        "skipped_entries": [],
+        "created_at": now,
+        "updated_at": now,
+        "expires_at": now + IMPORT_JOB_TTL,
+    }
+    await db.import_jobs.insert_one(job)
+    task = asyncio.create_task(import_archive_photos(job, session, path, kind))
+    background_tasks.append(task)
+    task.add_done_callback(background_tasks.remove)
+    return import_status(job)
+
+@api_router.get("/sessions/{session_id}/import/{job_id}")
+async def get_import_status(session_id: str, job_id: str, current_user: User = Depends(get_current_user)):
+    # Check session access
+    await check_session_access(session_id, current_user)
+    
+    job = await db.import_jobs.find_one({"id": job_id, "session_id": session_id})
+    if not job:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return import_status(job)
+
+@api_router.get("/photos/session/{session_id}", response_model=List[PhotoListItem])
+async def get_photos_by_session(
+    session_id: str,
+    include_data: bool = True,
+    limit: int = Query(1000, ge=1, le=1000),
+    after: Optional[str] = None,
+    sort: Literal["uploaded_at", "taken_at"] = "uploaded_at",
+    current_user: User = Depends(get_current_user)
+):
+    """List photos newest first by upload or capture time.
+
+    Pass the id of the last photo received as `after` for the next page.
+    """
     # Check session access
     await check_session_access(session_id, current_user)
     
-    photos = await db.photos.find({"session_id": session_id}).sort("uploaded_at", -1).to_list(1000)
-    return [Photo(**photo) for photo in photos]
+    query = {"session_id": session_id}
+    if after:
+        anchor = await db.photos.find_one({"id": after, "session_id": session_id}, {sort: 1})
+        if not anchor:
+            raise HTTPException(status_code=400, detail="Unknown page cursor")
+        query["$or"] = [
+            {sort: {"$lt": anchor[sort]}},
+            {sort: anchor[sort], "id": {"$lt": after}}
+        ]
+    projection = None if include_data else {"image_data": 0}
+    cursor = db.photos.find(query, projection).sort([(sort, -1), ("id", -1)]).limit(limit)
+    photos = await cursor.to_list(limit)
+    if include_data:
+        photos = [await rehydrate_photo(photo) for photo in photos]
+    return [PhotoListItem(**photo) for photo in photos]
+
+@api_router.get("/photos/session/{session_id}/duplicates")
+async def get_duplicate_groups(
+    session_id: str,
+    max_distance: int = Query(DUPLICATE_MAX_DISTANCE, ge=0, le=32),
+    current_user: User = Depends(get_current_user)
+):
+    """Groups of near-duplicate photos in a session; the first photo of each group is the one to keep"""
+    await check_session_access(session_id, current_user)
+    
+    index = await get_duplicate_index(session_id)
+    groups = await run_in_threadpool(index.groups, max_distance)
+    return {
+        "session_id": session_id,
+        "max_distance": max_distance,
+        "duplicate_count": sum(len(group) - 1 for group in groups),
+        "groups": [{"keep": group[0], "photo_ids": group} for group in groups]
+    }
+
+@api_router.get("/photos/{photo_id}/duplicates")
+async def get_photo_duplicates(
+    photo_id: str,
+    max_distance: int = Query(DUPLICATE_MAX_DISTANCE, ge=0, le=32),
+    current_user: User = Depends(get_current_user)
+):
+    """Near-duplicates of one photo within its session, closest first"""
+    photo = await db.photos.find_one({"id": photo_id}, {"session_id": 1, "phash": 1})
+    if not photo:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    
+    # Check session access for this photo
+    await check_session_access(photo["session_id"], current_user)
+    
+    if not photo.get("phash"):
+        return []
+    index = await get_duplicate_index(photo["session_id"])
+    if photo_id not in index.photos:
+        return []
+    matches = sorted(index.near(photo_id, max_distance), key=lambda match: match[1])
+    return [{"photo_id": other_id, "distance": distance} for other_id, distance in matches]
 
 @api_router.get("/photos/{photo_id}", response_model=Photo)
 async def get_photo(photo_id: str, current_user: User = Depends(get_current_user)):
@@ -377,7 +2582,55 @@ async def get_photo(photo_id: str, current_user: User = Depends(get_current_user
     # Check session access for this photo
     await check_session_access(photo["session_id"], current_user)
     
-    return Photo(**photo)
+    return Photo(**await rehydrate_photo(photo))
+
+@api_router.get("/photos/{photo_id}/image")
+async def get_photo_image(
+    photo_id: str,
+    request: Request,
+    original: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """Image bytes for galleries.
+
+    A WebP or AVIF derivative is served instead of the original when the Accept
+    header allows it; pass original=true for the uploaded file.
+    """
+    photo = await db.photos.find_one({"id": photo_id}, {"image_data": 0})
+    if not photo:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    
+    # Check session access for this photo
+    await check_session_access(photo["session_id"], current_user)
+    
+    headers = {"Cache-Control": "private, max-age=86400", "Vary": "Accept"}
+    if not original:
+        derivatives = photo.get("derivatives")
+        if derivatives is None:
+            # Not generated yet, or stored before derivatives existed; cold photos are served as they are
+            if not photo.get("archive"):
+                schedule_derivatives(photo_id)
+        else:
+            accepted = parse_accept(request.headers.get("accept", ""))
+            for _, content_type, _ in DERIVATIVE_FORMATS:
+                if content_type not in derivatives or accepted.get(content_type, 0) <= 0:
+                    continue
+                derivative = await db.photo_derivatives.find_one(
+                    {"photo_id": photo_id, "content_type": content_type}, {"data": 1}
+                )
+                if derivative:
+                    return Response(content=bytes(derivative["data"]), media_type=content_type, headers=headers)
+    
+    if photo.get("archive"):
+        return Response(content=await read_archived_photo(photo), media_type=photo["content_type"], headers=headers)
+    image = await db.photos.find_one({"id": photo_id}, {"image_data": 1})
+    if not image:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    return Response(
+        content=base64.b64decode(image["image_data"]),
+        media_type=photo["content_type"],
+        headers=headers
+    )
 
 @api_router.delete("/photos/{photo_id}")
 async def delete_photo(photo_id: str, current_user: User = Depends(get_current_user)):
@@ -391,112 +2644,221 @@ async def delete_photo(photo_id: str, current_user: User = Depends(get_current_u
     result = await db.photos.delete_one({"id": photo_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Photo not found")
+    await db.sessions.update_one(
+        {"id": photo["session_id"]},
+        {"$inc": {"photo_count": -1, "total_bytes": -photo.get("file_size", 0)}}
+    )
+    await db.photo_derivatives.delete_many({"photo_id": photo_id})
+    if photo.get("archive"):
+        await release_archives([photo["archive"]])
+    await publish_invalidation("session_photos", photo["session_id"])
     return {"message": "Photo deleted successfully"}
 
+@api_router.post("/photos/bulk-delete")
+async def bulk_delete_photos(photo_ids: List[str], current_user: User = Depends(get_current_user)):
+    """Delete several photos at once; photos that don't exist or aren't accessible are skipped"""
+    if not photo_ids:
+        raise HTTPException(status_code=400, detail="No photo IDs provided")
+    if len(photo_ids) > BULK_DELETE_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_DELETE_LIMIT} photos per request")
+    
+    docs = await db.photos.find({"id": {"$in": photo_ids}}, PHOTO_DELETE_FIELDS).to_list(None)
+    docs = current_user.access.filter(docs, lambda doc: doc["session_id"])
+    if not docs:
+        raise HTTPException(status_code=404, detail="No accessible photos found")
+    
+    per_session = await delete_photo_docs(docs)
+    for session_id in per_session:
+        await publish_invalidation("session_photos", session_id)
+    return {"deleted": [doc["id"] for doc in docs], "deleted_count": len(docs)}
+
+async def accessible_photo_ids(photo_ids: List[str], current_user: User) -> Tuple[List[str], Optional[str]]:
+    """Filter photo IDs down to existing photos the user may access, keeping their order.
+
+    Also returns the session of the first accessible photo, used to name exports.
+    """
+    docs = await db.photos.find(
+        {"id": {"$in": photo_ids}}, {"id": 1, "session_id": 1}
+    ).to_list(None)
+    session_by_photo = {doc["id"]: doc["session_id"] for doc in docs}
+    
+    # Skips missing photos and photos the user doesn't have access to
+    accessible = current_user.access.filter(photo_ids, session_by_photo.get)
+    first_session = session_by_photo[accessible[0]] if accessible else None
+    return accessible, first_session
+
+def file_safe(name: str) -> str:
+    return name.replace(" ", "_").replace("/", "_").replace('"', "")
+
+async def export_name(session_id: Optional[str]) -> str:
+    session_name = "photos"
+    if session_id:
+        session = await db.sessions.find_one({"id": session_id}, {"name": 1})
+        if session:
+            session_name = file_safe(session["name"])
+    return f"{session_name}_photos.zip"
+
+async def stream_photos_zip(photo_ids: List[str]):
+    """Stream a ZIP of the given photos, loading a few documents at a time"""
+    writer = ZipStreamWriter()
+    for start in range(0, len(photo_ids), ZIP_STREAM_BATCH_SIZE):
+        batch_ids = photo_ids[start:start + ZIP_STREAM_BATCH_SIZE]
+        photos = await db.photos.find({"id": {"$in": batch_ids}}).to_list(None)
+        position = {photo_id: index for index, photo_id in enumerate(batch_ids)}
+        photos.sort(key=lambda photo: position[photo["id"]])
+        for photo in photos:
+            archived = await read_archived_photo(photo) if photo.get("archive") else None
+            data = await run_in_threadpool(writer.add_photo, photo, archived)
+            if data:
+                yield data
+    yield writer.close()
+
+def zip_response(photo_ids: List[str], filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        stream_photos_zip(photo_ids),
+        media_type='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
 @api_router.post("/photos/bulk-download")
-async def bulk_download_photos(photo_ids: List[str], current_user: User = Depends(get_current_user)):
-    """Download multiple photos as a ZIP file"""
+async def bulk_download_photos(
+    photo_ids: List[str],
+    exclude_duplicates: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """Download multiple photos as a ZIP file, optionally leaving out near-duplicates"""
     if not photo_ids:
         raise HTTPException(status_code=400, detail="No photo IDs provided")
     
-    # Fetch all photos and validate access
-    photos = []
-    for photo_id in photo_ids:
-        photo = await db.photos.find_one({"id": photo_id})
-        if not photo:
-            continue  # Skip missing photos
-        
-        # Check session access for this photo
-        try:
-            await check_session_access(photo["session_id"], current_user)
-            photos.append(photo)
-        except HTTPException:
-            continue  # Skip photos user doesn't have access to
+    accessible, first_session = await accessible_photo_ids(photo_ids, current_user)
+    if not accessible:
+        raise HTTPException(status_code=404, detail="No accessible photos found")
+    if exclude_duplicates:
+        accessible = await without_near_duplicates(accessible, DUPLICATE_MAX_DISTANCE)
+    
+    return zip_response(accessible, await export_name(first_session))
+
+# Signed download links
+# The browser can fetch these with a plain GET (no Authorization header), so it
+# streams the download straight to disk instead of buffering a blob in memory.
+def create_download_token(username: str, target: str) -> str:
+    return create_access_token(
+        data={"sub": username, "scope": "download", "target": target},
+        expires_delta=timedelta(minutes=DOWNLOAD_LINK_EXPIRE_MINUTES)
+    )
+
+async def get_download_user(token: str, target: str) -> User:
+    """Resolve the user a download link was issued to; access is re-checked on use"""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=401, detail="Download link invalid or expired")
+    if payload.get("scope") != "download" or payload.get("target") != target:
+        raise HTTPException(status_code=401, detail="Download link invalid or expired")
+    user = await db.users.find_one({"username": payload.get("sub")})
+    if user is None:
+        raise HTTPException(status_code=401, detail="User not found")
+    return User(**user)
+
+@api_router.post("/photos/bulk-download/link")
+async def create_bulk_download_link(
+    photo_ids: List[str],
+    exclude_duplicates: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """Store a selection server-side and return a short-lived GET URL for its ZIP"""
+    if not photo_ids:
+        raise HTTPException(status_code=400, detail="No photo IDs provided")
     
-    if not photos:
+    accessible, first_session = await accessible_photo_ids(photo_ids, current_user)
+    if not accessible:
         raise HTTPException(status_code=404, detail="No accessible photos found")
+    if exclude_duplicates:
+        accessible = await without_near_duplicates(accessible, DUPLICATE_MAX_DISTANCE)
     
-    # Create a temporary ZIP file
-    def create_zip():
-        with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-            with zipfile.ZipFile(tmp_file.name, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                for photo in photos:
-                    try:
-                        # Decode base64 image data
-                        image_data = base64.b64decode(photo["image_data"])
-                        
-                        # Create a safe filename
-                        safe_filename = photo["filename"]
-                        if not safe_filename.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.bmp')):
-                            # Try to determine extension from content type
-                            content_type = photo.get("content_type", "")
-                            if "jpeg" in content_type or "jpg" in content_type:
-                                safe_filename += ".jpg"
-                            elif "png" in content_type:
-                                safe_filename += ".png"
-                            elif "gif" in content_type:
-                                safe_filename += ".gif"
-                            else:
-                                safe_filename += ".jpg"  # Default to jpg
-                        
-                        # Add timestamp to filename to avoid conflicts
-                        name, ext = safe_filename.rsplit('.', 1)
-                        uploaded_at = photo.get("uploaded_at", "")
-                        if uploaded_at:
-                            # Convert datetime to string if needed
-                            if hasattr(uploaded_at, 'strftime'):
-                                timestamp = uploaded_at.strftime("%Y%m%d_%H%M%S")
-                            else:
-                                timestamp = str(uploaded_at).replace(":", "-").replace(".", "-")[:19]
-                        else:
-                            timestamp = "unknown"
-                        unique_filename = f"{name}_{timestamp}.{ext}"
-                        
-                        zip_file.writestr(unique_filename, image_data)
-                    except Exception as e:
-                        logger.error(f"Error adding photo {photo['id']} to ZIP: {e}")
-                        continue
-            
-            return tmp_file.name
+    expires_at = datetime.utcnow() + timedelta(minutes=DOWNLOAD_LINK_EXPIRE_MINUTES)
+    selection_id = str(uuid.uuid4())
+    await db.download_selections.insert_one({
+        "id": selection_id,
+        "user_id": current_user.id,
+        "photo_ids": accessible,
+        "filename": await export_name(first_session),
+        "created_at": datetime.utcnow(),
+        "expires_at": expires_at
+    })
+    token = create_download_token(current_user.username, selection_id)
+    return {
+        "url": f"/api/photos/bulk-download/{selection_id}?token={token}",
+        "photo_count": len(accessible),
+        "expires_at": expires_at
+    }
+
+@api_router.get("/photos/bulk-download/{selection_id}")
+async def download_selection(selection_id: str, token: str):
+    user = await get_download_user(token, selection_id)
+    selection = await db.download_selections.find_one({"id": selection_id})
+    if not selection or selection["user_id"] != user.id:
+        raise HTTPException(status_code=404, detail="Download not found or expired")
     
-    # Generate ZIP file
-    zip_filename = create_zip()
+    # Apply the bulk download access rules again in case access changed
+    accessible, _ = await accessible_photo_ids(selection["photo_ids"], user)
+    if not accessible:
+        raise HTTPException(status_code=404, detail="No accessible photos found")
+    return zip_response(accessible, selection["filename"])
+
+@api_router.post("/photos/{photo_id}/download-link")
+async def create_photo_download_link(photo_id: str, current_user: User = Depends(get_current_user)):
+    photo = await db.photos.find_one({"id": photo_id}, {"session_id": 1})
+    if not photo:
+        raise HTTPException(status_code=404, detail="Photo not found")
     
-    # Stream the ZIP file
-    def iterfile():
-        with open(zip_filename, 'rb') as file_like:
-            yield from file_like
-        # Clean up temporary file
-        os.unlink(zip_filename)
+    # Check session access for this photo
+    await check_session_access(photo["session_id"], current_user)
     
-    # Get session name for ZIP filename
-    session_name = "photos"
-    if photos:
-        session = await db.sessions.find_one({"id": photos[0]["session_id"]})
-        if session:
-            session_name = session["name"].replace(" ", "_").replace("/", "_")
+    token = create_download_token(current_user.username, photo_id)
+    return {"url": f"/api/photos/{photo_id}/download?token={token}"}
+
+@api_router.get("/photos/{photo_id}/download")
+async def download_photo(photo_id: str, token: str):
+    user = await get_download_user(token, photo_id)
+    photo = await db.photos.find_one({"id": photo_id})
+    if not photo:
+        raise HTTPException(status_code=404, detail="Photo not found")
     
-    headers = {
-        'Content-Disposition': f'attachment; filename="{session_name}_photos.zip"'
-    }
+    # Check session access for this photo
+    await check_session_access(photo["session_id"], user)
     
-    return StreamingResponse(
-        iterfile(),
-        media_type='application/zip',
-        headers=headers
+    filename = photo["filename"].replace('"', "")
+    return Response(
+        content=await read_archived_photo(photo) if photo.get("archive") else base64.b64decode(photo["image_data"]),
+        media_type=photo["content_type"],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
     )
 
 # Public route for checking session
 @api_router.get("/public/sessions/{session_id}/check")
-async def check_session_public(session_id: str):
-    session = await db.sessions.find_one({"id": session_id, "is_active": True})
+async def check_session_public(session_id: str, response: Response):
+    session = await get_active_session(session_id)
     if not session:
-        raise HTTPException(status_code=404, detail="Session not found or inactive")
-    return {"session_name": session["name"], "session_id": session_id}
+        raise HTTPException(
+            status_code=404,
+            detail="Session not found or inactive",
+            headers={"Cache-Control": f"public, max-age={int(ACTIVE_SESSION_NEGATIVE_TTL)}"}
+        )
+    response.headers["Cache-Control"] = f"public, max-age={PUBLIC_SESSION_MAX_AGE}"
+    return {
+        "session_name": session["name"],
+        "session_id": session_id,
+        "max_image_dimension": session.get("max_image_dimension"),
+        "image_quality": session.get("image_quality") or DEFAULT_IMAGE_QUALITY,
+        "max_file_size": session.get("max_file_size")
+    }
 
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(UploadAdmissionMiddleware, controller=upload_admission)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -512,10 +2874,34 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+background_tasks: List[asyncio.Task] = []
+
 @app.on_event("startup")
 async def startup_event():
+    await ensure_indexes()
     await create_initial_superadmin()
+    background_tasks.append(asyncio.create_task(listen_for_invalidations()))
+    # Scans the photos collection, so it runs in the background
+    background_tasks.append(asyncio.create_task(backfill_photo_metadata()))
+    # The first run also fills in counters for sessions created before they existed
+    background_tasks.append(asyncio.create_task(
+        run_periodically("reconcile_session_stats", SESSION_STATS_RECONCILE_INTERVAL, reconcile_session_stats)
+    ))
+    background_tasks.append(asyncio.create_task(
+        run_periodically("purge_expired_photos", RETENTION_CHECK_INTERVAL, purge_expired_photos)
+    ))
+    if archive_store is not None:
+        background_tasks.append(asyncio.create_task(
+            run_periodically("archive_idle_sessions", COLD_STORAGE_CHECK_INTERVAL, archive_idle_sessions)
+        ))
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    tasks = background_tasks + list(pending_derivatives.values())
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        # Give cancelled jobs a moment to record their state before the client closes
+        await asyncio.wait(tasks, timeout=5)
+    archive_cache.clear()
     client.close()
\ No newline at end of file
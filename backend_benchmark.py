@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for QR Photo Upload System backend hot functions
+Runs the CPU-heavy pieces of server.py on synthetic photos of realistic sizes
+and reports ops/sec and peak memory. Results can be stored as a baseline and
+checked for regressions (see tests/test_benchmark_regressions.py).
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from PIL import Image
+
+ROOT_DIR = Path(__file__).parent
+sys.path.insert(0, str(ROOT_DIR / 'backend'))
+
+import server  # noqa: E402
+
+DEFAULT_BASELINE_PATH = Path(os.environ.get('BENCHMARK_BASELINE', ROOT_DIR / 'benchmark_baseline.json'))
+DEFAULT_MAX_REGRESSION = float(os.environ.get('BENCHMARK_MAX_REGRESSION', '20'))
+PHOTO_SIZES_MB = [1, 4, 12]
+
+
+def make_image(target_bytes, image_format, seed):
+    """Create a JPEG or PNG of roughly target_bytes from random noise"""
+    rng = random.Random(seed)
+    # Noise costs roughly 0.9 bytes per pixel as JPEG q90 and 3 bytes per pixel as PNG
+    bytes_per_pixel = 0.9 if image_format == 'JPEG' else 3.0
+    pixels = max(64 * 64, int(target_bytes / bytes_per_pixel))
+    width = int((pixels * 4 / 3) ** 0.5)
+    height = max(1, pixels // width)
+    img = Image.frombytes('RGB', (width, height), rng.randbytes(width * height * 3))
+    buffer = io.BytesIO()
+    if image_format == 'JPEG':
+        img.save(buffer, format='JPEG', quality=90)
+    else:
+        img.save(buffer, format='PNG', compress_level=1)
+    return buffer.getvalue()
+
+
+_photo_cache = {}
+
+
+def synthetic_photo(size_mb, image_format):
+    """Photo document as stored in db.photos, cached per size and format"""
+    key = (size_mb, image_format)
+    if key not in _photo_cache:
+        data = make_image(int(size_mb * 1024 * 1024), image_format, seed=size_mb)
+        ext = 'jpg' if image_format == 'JPEG' else 'png'
+        _photo_cache[key] = {
+            "id": f"bench-{size_mb}mb-{ext}",
+            "session_id": "bench-session",
+            "filename": f"bench_{size_mb}mb.{ext}",
+            "content_type": f"image/{'jpeg' if image_format == 'JPEG' else 'png'}",
+            "image_data": base64.b64encode(data).decode(),
+            "uploaded_at": datetime(2025, 1, 1),
+            "file_size": len(data),
+        }
+    return _photo_cache[key]
+
+
+def bench_qr_code():
+    return lambda: server.generate_qr_code("http://localhost:3000/upload/0b7d5f1e-5c52-4a4e-9d0e-2c8d1f3a9b7c")
+
+
+def bench_b64decode(size_mb, image_format):
+    image_data = synthetic_photo(size_mb, image_format)["image_data"]
+    return lambda: base64.b64decode(image_data)
+
+
+def bench_zip(photo_count):
+    templates = [synthetic_photo(size, fmt) for size in (1, 4) for fmt in ('JPEG', 'PNG')]
+    photos = []
+    for index in range(photo_count):
+        photo = dict(templates[index % len(templates)])
+        photo["id"] = f"bench-zip-{index}"
+        photo["uploaded_at"] = datetime(2025, 1, 1) + timedelta(seconds=index)
+        photos.append(photo)
+
+    def run():
+        writer = server.ZipStreamWriter()
+        for photo in photos:
+            writer.add_photo(photo)
+        writer.close()
+    return run
+
+
+def bench_photo_models(photo_count):
+    image_data = synthetic_photo(1, 'JPEG')["image_data"]
+    docs = [{
+        "_id": index,
+        "id": f"bench-model-{index}",
+        "session_id": "bench-session",
+        "filename": f"photo_{index}.jpg",
+        "content_type": "image/jpeg",
+        "image_data": image_data,
+        "uploaded_at": datetime(2025, 1, 1) + timedelta(seconds=index),
+        "file_size": 1024 * 1024,
+    } for index in range(photo_count)]
+    return lambda: [server.Photo(**doc) for doc in docs]
+
+
+def bench_verify_password():
+    password_hash = server.get_password_hash("changeme123")
+    return lambda: server.verify_password("changeme123", password_hash)
+
+
+# name -> factory returning a zero-argument callable; setup cost is not measured
+BENCHMARKS = {
+    "generate_qr_code": bench_qr_code,
+    "verify_password": bench_verify_password,
+    "photo_models_1000": lambda: bench_photo_models(1000),
+    "zip_20_photos": lambda: bench_zip(20),
+}
+for _size in PHOTO_SIZES_MB:
+    for _fmt in ('JPEG', 'PNG'):
+        BENCHMARKS[f"b64decode_{_size}mb_{_fmt.lower()}"] = (
+            lambda size=_size, fmt=_fmt: bench_b64decode(size, fmt))
+
+
+def run_benchmark(name, min_time=1.0, min_rounds=3):
+    """Time one benchmark and measure the peak memory of a single call"""
+    func = BENCHMARKS[name]()
+    func()  # warm up
+
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < min_rounds or time.perf_counter() - started < min_time:
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    median = statistics.median(timings)
+    return {
+        "rounds": len(timings),
+        "ops_per_sec": 1.0 / median if median > 0 else float('inf'),
+        "median_ms": median * 1000,
+        "min_ms": min(timings) * 1000,
+        "stdev_ms": (statistics.stdev(timings) * 1000) if len(timings) > 1 else 0.0,
+        "peak_memory_mb": peak / 1024 / 1024,
+    }
+
+
+def load_baseline(path=DEFAULT_BASELINE_PATH):
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def regression_percent(result, baseline_result):
+    """How much slower result is than baseline_result, in percent (negative means faster)"""
+    return (baseline_result["ops_per_sec"] / result["ops_per_sec"] - 1.0) * 100
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark backend hot functions")
+    parser.add_argument('benchmarks', nargs='*', help=f"Benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument('--min-time', type=float, default=1.0, help="Minimum seconds spent timing each benchmark")
+    parser.add_argument('--output', default=None, help="Write results JSON to this path")
+    parser.add_argument('--save-baseline', action='store_true', help=f"Store results as the baseline ({DEFAULT_BASELINE_PATH})")
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE_PATH))
+    parser.add_argument('--max-regression', type=float, default=DEFAULT_MAX_REGRESSION,
+                        help="Fail when a benchmark is this many percent slower than the baseline")
+    args = parser.parse_args(argv)
+
+    names = args.benchmarks or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(unknown)}")
+
+    baseline = None if args.save_baseline else load_baseline(args.baseline)
+    results = {}
+    regressions = []
+    print(f"{'Benchmark':<28}{'ops/sec':>12}{'median ms':>12}{'peak MB':>10}{'vs baseline':>14}")
+    for name in names:
+        result = run_benchmark(name, min_time=args.min_time)
+        results[name] = result
+        delta = ""
+        if baseline and name in baseline["results"]:
+            slower = regression_percent(result, baseline["results"][name])
+            delta = f"{slower:+.1f}% time"
+            if slower > args.max_regression:
+                regressions.append(name)
+        print(f"{name:<28}{result['ops_per_sec']:>12.2f}{result['median_ms']:>12.2f}"
+              f"{result['peak_memory_mb']:>10.1f}{delta:>14}")
+
+    report = {"created_at": datetime.utcnow().isoformat(), "python": sys.version.split()[0], "results": results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+
+    if regressions:
+        print(f"\n⚠️  Regressed by more than {args.max_regression:.0f}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
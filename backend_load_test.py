@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Load Testing for QR Photo Upload System
+Simulates event-day traffic against a local backend and MongoDB:
+guests uploading photos, organizers polling galleries and periodic bulk downloads.
+Reports throughput, latency percentiles and error rates per endpoint and
+writes machine-readable results so releases can be compared.
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+
+import httpx
+from PIL import Image
+
+DEFAULT_BACKEND_URL = os.environ.get('LOAD_TEST_BACKEND_URL', 'http://localhost:8001')
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '0.0.0.0', '::1', 'backend')
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def make_jpeg(target_bytes, seed):
+    """Create a JPEG of roughly target_bytes from random noise (noise barely compresses)"""
+    rng = random.Random(seed)
+    # Noise at quality 90 costs roughly 0.9 bytes per pixel
+    pixels = max(64 * 64, int(target_bytes / 0.9))
+    width = int((pixels * 4 / 3) ** 0.5)
+    height = max(1, pixels // width)
+    img = Image.frombytes('RGB', (width, height), rng.randbytes(width * height * 3))
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies = []
+        self.status_codes = {}
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def record(self, latency, status_code, ok, sent=0, received=0):
+        self.latencies.append(latency)
+        key = str(status_code)
+        self.status_codes[key] = self.status_codes.get(key, 0) + 1
+        if not ok:
+            self.errors += 1
+        self.bytes_sent += sent
+        self.bytes_received += received
+
+    def summary(self, duration):
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        return {
+            'requests': count,
+            'errors': self.errors,
+            'error_rate': (self.errors / count) if count else 0.0,
+            'throughput_rps': (count / duration) if duration > 0 else 0.0,
+            'latency_ms': {
+                'min': latencies[0] * 1000 if latencies else 0.0,
+                'mean': (sum(latencies) / count * 1000) if count else 0.0,
+                'p50': percentile(latencies, 50) * 1000,
+                'p95': percentile(latencies, 95) * 1000,
+                'p99': percentile(latencies, 99) * 1000,
+                'max': latencies[-1] * 1000 if latencies else 0.0,
+            },
+            'status_codes': self.status_codes,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+        }
+
+
+class LoadTester:
+    def __init__(self, args):
+        self.args = args
+        self.api_base_url = f"{args.backend_url.rstrip('/')}/api"
+        self.stats = {}
+        self.auth_token = None
+        self.session_ids = []
+        self.photo_ids = {}
+        self.payloads = []
+        self.deadline = 0.0
+        self.started_at = 0.0
+
+    def endpoint_stats(self, name):
+        if name not in self.stats:
+            self.stats[name] = EndpointStats()
+        return self.stats[name]
+
+    async def timed_request(self, client, name, method, endpoint, **kwargs):
+        """Send a request and record its latency under the endpoint name"""
+        sent = len(kwargs.get('content') or b'')
+        if 'json' in kwargs:
+            sent = len(json.dumps(kwargs['json']))
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, f"{self.api_base_url}{endpoint}", **kwargs)
+            elapsed = time.perf_counter() - start
+            self.endpoint_stats(name).record(
+                elapsed, response.status_code, response.status_code < 400,
+                sent=sent, received=len(response.content)
+            )
+            return response
+        except httpx.HTTPError as e:
+            elapsed = time.perf_counter() - start
+            self.endpoint_stats(name).record(elapsed, type(e).__name__, False, sent=sent)
+            return None
+
+    def build_payloads(self):
+        """Pre-encode a pool of photos so image generation is not part of the measurement"""
+        sizes = [int(size * 1024 * 1024) for size in self.args.photo_sizes_mb]
+        for index in range(self.args.payload_pool):
+            jpeg = make_jpeg(sizes[index % len(sizes)], seed=index)
+            self.payloads.append({
+                'image_data': base64.b64encode(jpeg).decode(),
+                'file_size': len(jpeg),
+            })
+        print(f"Prepared {len(self.payloads)} synthetic photos "
+              f"({sum(p['file_size'] for p in self.payloads) / 1024 / 1024:.1f} MB total)")
+
+    async def setup(self, client):
+        response = await client.post(f"{self.api_base_url}/auth/login", json={
+            "username": self.args.username,
+            "password": self.args.password
+        })
+        if response.status_code != 200:
+            raise RuntimeError(f"Login failed with status {response.status_code}")
+        self.auth_token = response.json()['access_token']
+        headers = {'Authorization': f"Bearer {self.auth_token}"}
+
+        run_label = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+        for index in range(self.args.sessions):
+            response = await client.post(f"{self.api_base_url}/sessions", headers=headers, json={
+                "name": f"Load Test {run_label} #{index + 1}",
+                "description": "Created by backend_load_test.py"
+            })
+            if response.status_code != 200:
+                raise RuntimeError(f"Session creation failed with status {response.status_code}")
+            session_id = response.json()['id']
+            self.session_ids.append(session_id)
+            self.photo_ids[session_id] = []
+        print(f"Created {len(self.session_ids)} load test sessions")
+
+    async def teardown(self, client):
+        headers = {'Authorization': f"Bearer {self.auth_token}"}
+        for session_id in self.session_ids:
+            for photo_id in self.photo_ids[session_id]:
+                await client.delete(f"{self.api_base_url}/photos/{photo_id}", headers=headers)
+            await client.delete(f"{self.api_base_url}/sessions/{session_id}", headers=headers)
+        print(f"Cleaned up {len(self.session_ids)} sessions")
+
+    def think(self, mean_seconds):
+        return asyncio.sleep(random.expovariate(1.0 / mean_seconds) if mean_seconds > 0 else 0)
+
+    async def guest(self, client, guest_index):
+        """A phone that scans the QR code, checks the session and uploads a few photos"""
+        # Stagger arrivals over the ramp-up window like guests scanning the QR code
+        await asyncio.sleep(random.uniform(0, self.args.ramp_up))
+        session_id = self.session_ids[guest_index % len(self.session_ids)]
+        photos_left = self.args.photos_per_guest
+
+        await self.timed_request(client, 'GET /api/public/sessions/{id}/check', 'GET',
+                                 f"/public/sessions/{session_id}/check")
+        while photos_left > 0 and time.monotonic() < self.deadline:
+            payload = random.choice(self.payloads)
+            response = await self.timed_request(client, 'POST /api/photos', 'POST', '/photos', json={
+                "session_id": session_id,
+                "filename": f"guest{guest_index}_{photos_left}.jpg",
+                "content_type": "image/jpeg",
+                "image_data": payload['image_data'],
+                "file_size": payload['file_size']
+            }, headers={'X-Upload-Session': session_id})
+            if response is not None and response.status_code == 200:
+                self.photo_ids[session_id].append(response.json()['id'])
+            photos_left -= 1
+            await self.think(self.args.guest_think_time)
+
+    async def organizer(self, client, organizer_index):
+        """An organizer keeping the gallery of one session open"""
+        session_id = self.session_ids[organizer_index % len(self.session_ids)]
+        headers = {'Authorization': f"Bearer {self.auth_token}"}
+        while time.monotonic() < self.deadline:
+            await self.timed_request(client, 'GET /api/photos/session/{id}', 'GET',
+                                     f"/photos/session/{session_id}", headers=headers)
+            await self.think(self.args.poll_interval)
+
+    async def downloader(self, client):
+        """Periodic bulk download of a random selection from a random session"""
+        headers = {'Authorization': f"Bearer {self.auth_token}"}
+        while time.monotonic() < self.deadline:
+            await self.think(self.args.download_interval)
+            session_id = random.choice(self.session_ids)
+            photo_ids = list(self.photo_ids[session_id])
+            if not photo_ids:
+                continue
+            selection = random.sample(photo_ids, min(len(photo_ids), self.args.download_size))
+            await self.timed_request(client, 'POST /api/photos/bulk-download', 'POST',
+                                     '/photos/bulk-download', json=selection, headers=headers)
+
+    async def run(self):
+        self.build_payloads()
+        limits = httpx.Limits(max_connections=self.args.max_connections,
+                              max_keepalive_connections=self.args.max_connections)
+        timeout = httpx.Timeout(self.args.request_timeout)
+        async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+            await self.setup(client)
+            print(f"Running for {self.args.duration}s: {self.args.guests} guests, "
+                  f"{self.args.organizers} organizers, {self.args.downloaders} downloaders")
+            self.started_at = time.monotonic()
+            self.deadline = self.started_at + self.args.duration
+            tasks = [self.guest(client, i) for i in range(self.args.guests)]
+            tasks += [self.organizer(client, i) for i in range(self.args.organizers)]
+            tasks += [self.downloader(client) for _ in range(self.args.downloaders)]
+            await asyncio.gather(*tasks)
+            duration = time.monotonic() - self.started_at
+            if not self.args.keep_data:
+                await self.teardown(client)
+        return duration
+
+    def report(self, duration):
+        endpoints = {name: stats.summary(duration) for name, stats in sorted(self.stats.items())}
+        total_requests = sum(e['requests'] for e in endpoints.values())
+        total_errors = sum(e['errors'] for e in endpoints.values())
+        return {
+            'started_at': datetime.utcnow().isoformat(),
+            'git_commit': git_commit(),
+            'host': platform.node(),
+            'backend_url': self.args.backend_url,
+            'duration_s': duration,
+            'config': {key: value for key, value in vars(self.args).items() if key != 'password'},
+            'totals': {
+                'requests': total_requests,
+                'errors': total_errors,
+                'error_rate': (total_errors / total_requests) if total_requests else 0.0,
+                'throughput_rps': (total_requests / duration) if duration > 0 else 0.0,
+            },
+            'endpoints': endpoints,
+        }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report):
+    print("\n" + "="*100)
+    print("LOAD TEST SUMMARY")
+    print("="*100)
+    print(f"{'Endpoint':<38}{'Reqs':>7}{'Err%':>7}{'RPS':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, stats in report['endpoints'].items():
+        latency = stats['latency_ms']
+        print(f"{name:<38}{stats['requests']:>7}{stats['error_rate'] * 100:>6.1f}%{stats['throughput_rps']:>8.1f}"
+              f"{latency['p50']:>10.1f}{latency['p95']:>10.1f}{latency['p99']:>10.1f}{latency['max']:>10.1f}")
+    totals = report['totals']
+    print(f"\nTotal: {totals['requests']} requests in {report['duration_s']:.1f}s "
+          f"({totals['throughput_rps']:.1f} req/s), {totals['error_rate'] * 100:.2f}% errors")
+
+
+def compare_reports(current, baseline_path):
+    """Print p95 latency and throughput deltas against a previous results file"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nComparison with {baseline_path} (commit {baseline.get('git_commit')}):")
+    for name, stats in current['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if not previous:
+            continue
+        old_p95 = previous['latency_ms']['p95']
+        new_p95 = stats['latency_ms']['p95']
+        p95_delta = ((new_p95 - old_p95) / old_p95 * 100) if old_p95 else 0.0
+        old_rps = previous['throughput_rps']
+        rps_delta = ((stats['throughput_rps'] - old_rps) / old_rps * 100) if old_rps else 0.0
+        print(f"  {name:<38} p95 {old_p95:>8.1f} -> {new_p95:>8.1f} ms ({p95_delta:+.1f}%), "
+              f"rps {rps_delta:+.1f}%")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate event-day traffic against a local backend")
+    parser.add_argument('--backend-url', default=DEFAULT_BACKEND_URL)
+    parser.add_argument('--allow-remote', action='store_true',
+                        help="Allow targeting a non-local backend (never point this at production)")
+    parser.add_argument('--username', default='superadmin')
+    parser.add_argument('--password', default='changeme123')
+    parser.add_argument('--duration', type=float, default=60.0, help="Test duration in seconds")
+    parser.add_argument('--ramp-up', type=float, default=10.0, help="Window in which guests arrive")
+    parser.add_argument('--sessions', type=int, default=3)
+    parser.add_argument('--guests', type=int, default=200, help="Concurrent phones uploading")
+    parser.add_argument('--photos-per-guest', type=int, default=5)
+    parser.add_argument('--guest-think-time', type=float, default=2.0, help="Mean seconds between uploads")
+    parser.add_argument('--photo-sizes-mb', type=float, nargs='+', default=[1.0, 3.0, 6.0])
+    parser.add_argument('--payload-pool', type=int, default=6, help="Distinct synthetic photos to reuse")
+    parser.add_argument('--organizers', type=int, default=5, help="Organizers polling galleries")
+    parser.add_argument('--poll-interval', type=float, default=5.0)
+    parser.add_argument('--downloaders', type=int, default=1)
+    parser.add_argument('--download-interval', type=float, default=15.0)
+    parser.add_argument('--download-size', type=int, default=50, help="Photos per bulk download")
+    parser.add_argument('--max-connections', type=int, default=500)
+    parser.add_argument('--request-timeout', type=float, default=120.0)
+    parser.add_argument('--keep-data', action='store_true', help="Do not delete created sessions and photos")
+    parser.add_argument('--output', default=None, help="Results JSON path (default: load_test_results/<timestamp>.json)")
+    parser.add_argument('--compare', default=None, help="Previous results JSON to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    host = urlparse(args.backend_url).hostname
+    if host not in LOCAL_HOSTS and not args.allow_remote:
+        print(f"Refusing to load test non-local backend {args.backend_url} (use --allow-remote)")
+        return 2
+
+    tester = LoadTester(args)
+    duration = asyncio.run(tester.run())
+    report = tester.report(duration)
+    print_report(report)
+
+    output = args.output or os.path.join(
+        'load_test_results', f"{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare_reports(report, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, createContext, useContext } from "react";
+import React, { useState, useEffect, useRef, useCallback, createContext, useContext } from "react";
 import "./App.css";
 import { BrowserRouter, Routes, Route, Navigate, useNavigate, useParams } from "react-router-dom";
 import axios from "axios";
@@ -82,28 +82,285 @@ const ProtectedRoute = ({ children }) => {
   return user ? children : <Navigate to="/admin/login" />;
 };
 
+const formatBytes = (bytes) => {
+  if (bytes < 1024 * 1024) {
+    return `${(bytes / 1024).toFixed(0)} KB`;
+  }
+  if (bytes < 1024 * 1024 * 1024) {
+    return `${(bytes / 1024 / 1024).toFixed(1)} MB`;
+  }
+  return `${(bytes / 1024 / 1024 / 1024).toFixed(2)} GB`;
+};
+
+// Sessions are paginated; the browser revalidates each page with its ETag
+const SESSIONS_PAGE_SIZE = 200;
+
+const fetchAllSessions = async () => {
+  const sessions = [];
+  let after = null;
+  for (;;) {
+    const params = { limit: SESSIONS_PAGE_SIZE };
+    if (after) {
+      params.after = after;
+    }
+    const response = await axios.get(`${API}/sessions`, { params });
+    sessions.push(...response.data);
+    if (response.data.length < SESSIONS_PAGE_SIZE) {
+      return sessions;
+    }
+    after = response.data[response.data.length - 1].id;
+  }
+};
+
+// Navigate to a signed download URL so the browser saves the response
+// directly to disk instead of holding it in memory
+const startDownload = (url) => {
+  const link = document.createElement('a');
+  link.href = `${BACKEND_URL}${url}`;
+  document.body.appendChild(link);
+  link.click();
+  document.body.removeChild(link);
+};
+
+// Gallery virtualization: only rows near the viewport are mounted and images
+// are fetched when their tile scrolls into view
+const GALLERY_PAGE_SIZE = 60;
+const GALLERY_TILE_HEIGHT = 340;
+const GALLERY_ROW_HEIGHT = GALLERY_TILE_HEIGHT + 24; // gap-6
+const GALLERY_OVERSCAN_ROWS = 2;
+
+// Matches the grid-cols-1 md:grid-cols-2 lg:grid-cols-3 xl:grid-cols-4 breakpoints
+const galleryColumns = (width) => (width >= 1280 ? 4 : width >= 1024 ? 3 : width >= 768 ? 2 : 1);
+
+// 1x1 images used to detect which formats the browser can decode; the backend
+// serves smaller WebP/AVIF versions of photos when the Accept header lists them
+const IMAGE_FORMAT_PROBES = [
+  ['image/avif', 'data:image/avif;base64,AAAAIGZ0eXBhdmlmAAAAAGF2aWZtaWYxbWlhZk1BMUIAAADrbWV0YQAAAAAAAAAhaGRscgAAAAAAAAAAcGljdAAAAAAAAAAAAAAAAAAAAAAOcGl0bQAAAAAAAQAAAB5pbG9jAAAAAEQAAAEAAQAAAAEAAAETAAAAIAAAAChpaW5mAAAAAAABAAAAGmluZmUCAAAAAAEAAGF2MDFDb2xvcgAAAABqaXBycAAAAEtpcGNvAAAAFGlzcGUAAAAAAAAAAQAAAAEAAAAQcGl4aQAAAAADCAgIAAAADGF2MUOBAAwAAAAAE2NvbHJuY2x4AAEADQAGgAAAABdpcG1hAAAAAAAAAAEAAQQBAoMEAAAAKG1kYXQSAAoIGAAGiAhoNCAyEh7Hh4VZ3///4sAAAJA1jjx+rQ=='],
+  ['image/webp', 'data:image/webp;base64,UklGRiQAAABXRUJQVlA4IBgAAAAwAQCdASoBAAEAB0CWJaQAA3AA/u+5AAA='],
+];
+
+let imageAcceptPromise = null;
+
+const getImageAccept = () => {
+  if (!imageAcceptPromise) {
+    const probe = ([type, src]) => new Promise((resolve) => {
+      const img = new window.Image();
+      img.onload = () => resolve(img.width > 0 ? type : null);
+      img.onerror = () => resolve(null);
+      img.src = src;
+    });
+    imageAcceptPromise = Promise.all(IMAGE_FORMAT_PROBES.map(probe))
+      .then((types) => [...types.filter(Boolean), 'image/*'].join(','));
+  }
+  return imageAcceptPromise;
+};
+
+const PHOTO_LOAD_ATTEMPTS = 5;
+
+// Opening a gallery requests many tiles at once; throttled ones back off with jitter
+// so they don't all retry in the same instant
+const fetchPhotoImage = async (photoId, isCancelled) => {
+  const accept = await getImageAccept();
+  for (let attempt = 1; ; attempt++) {
+    try {
+      return await axios.get(`${API}/photos/${photoId}/image`, {
+        responseType: 'blob',
+        headers: { Accept: accept },
+      });
+    } catch (error) {
+      const status = error.response?.status;
+      const retryable = !status || status === 429 || status >= 500;
+      if (!retryable || attempt >= PHOTO_LOAD_ATTEMPTS || isCancelled()) throw error;
+      const backoff = Math.min(8000, 500 * 2 ** (attempt - 1));
+      await new Promise(resolve => setTimeout(resolve, backoff / 2 + Math.random() * backoff / 2));
+    }
+  }
+};
+
+const useLazyPhotoUrl = (photoId, elementRef) => {
+  const [url, setUrl] = useState(null);
+
+  useEffect(() => {
+    const element = elementRef.current;
+    if (!element) return;
+    let objectUrl = null;
+    let cancelled = false;
+    const observer = new IntersectionObserver((entries) => {
+      if (!entries[0].isIntersecting) return;
+      observer.disconnect();
+      fetchPhotoImage(photoId, () => cancelled)
+        .then((response) => {
+          if (cancelled) return;
+          objectUrl = URL.createObjectURL(response.data);
+          setUrl(objectUrl);
+        })
+        .catch((error) => console.error('Error loading photo:', error));
+    }, { rootMargin: '200px' });
+    observer.observe(element);
+    return () => {
+      cancelled = true;
+      observer.disconnect();
+      // Unmounted tiles release their decoded image
+      if (objectUrl) URL.revokeObjectURL(objectUrl);
+    };
+  }, [photoId, elementRef]);
+
+  return url;
+};
+
+const PhotoTile = ({ photo, selected, onSelect, onDownload, onDelete }) => {
+  const imageRef = useRef(null);
+  const imageUrl = useLazyPhotoUrl(photo.id, imageRef);
+
+  return (
+    <div className="bg-white rounded-lg shadow-lg overflow-hidden relative" style={{ height: GALLERY_TILE_HEIGHT }}>
+      {/* Selection checkbox */}
+      <div className="absolute top-2 left-2 z-10">
+        <input
+          type="checkbox"
+          checked={selected}
+          onChange={() => onSelect(photo.id)}
+          className="w-5 h-5 text-blue-600 bg-white border-gray-300 rounded focus:ring-blue-500"
+        />
+      </div>
+      
+      <div ref={imageRef} className="w-full h-48 bg-gray-200 overflow-hidden">
+        {imageUrl ? (
+          <img
+            src={imageUrl}
+            alt={photo.filename}
+            className="w-full h-48 object-cover"
+            decoding="async"
+          />
+        ) : photo.placeholder && (
+          // Tiny preview from the listing, blurred until the real image arrives
+          <img
+            src={photo.placeholder}
+            alt=""
+            aria-hidden="true"
+            className="w-full h-48 object-cover"
+            style={{ filter: 'blur(12px)', transform: 'scale(1.2)' }}
+          />
+        )}
+      </div>
+      <div className="p-4">
+        <h3 className="text-sm font-medium text-gray-900 truncate mb-2">
+          {photo.filename}
+        </h3>
+        <p className="text-xs text-gray-500 mb-2">
+          {new Date(photo.taken_at || photo.uploaded_at).toLocaleString()}
+        </p>
+        <p className="text-xs text-gray-500 mb-4">
+          {(photo.file_size / 1024 / 1024).toFixed(2)} MB
+        </p>
+        <div className="flex space-x-2">
+          <button
+            onClick={() => onDownload(photo)}
+            className="flex-1 bg-blue-500 hover:bg-blue-600 text-white px-3 py-1 rounded text-sm"
+          >
+            Download
+          </button>
+          <button
+            onClick={() => onDelete(photo.id)}
+            className="flex-1 bg-red-500 hover:bg-red-600 text-white px-3 py-1 rounded text-sm"
+          >
+            Delete
+          </button>
+        </div>
+      </div>
+    </div>
+  );
+};
+
+const VirtualPhotoGrid = ({ photos, renderTile, onEndReached }) => {
+  const containerRef = useRef(null);
+  const sentinelRef = useRef(null);
+  const [columns, setColumns] = useState(galleryColumns(window.innerWidth));
+  const [rowRange, setRowRange] = useState({ start: 0, end: 0 });
+  const rowCount = Math.ceil(photos.length / columns);
+
+  useEffect(() => {
+    const updateWindow = () => {
+      if (!containerRef.current) return;
+      const top = containerRef.current.getBoundingClientRect().top;
+      const start = Math.max(0, Math.floor(-top / GALLERY_ROW_HEIGHT) - GALLERY_OVERSCAN_ROWS);
+      const end = Math.ceil((window.innerHeight - top) / GALLERY_ROW_HEIGHT) + GALLERY_OVERSCAN_ROWS;
+      setColumns(galleryColumns(window.innerWidth));
+      setRowRange(prev => (prev.start === start && prev.end === end ? prev : { start, end }));
+    };
+    updateWindow();
+    window.addEventListener('scroll', updateWindow, { passive: true });
+    window.addEventListener('resize', updateWindow);
+    return () => {
+      window.removeEventListener('scroll', updateWindow);
+      window.removeEventListener('resize', updateWindow);
+    };
+  }, [photos.length]);
+
+  useEffect(() => {
+    const sentinel = sentinelRef.current;
+    if (!sentinel) return;
+    const observer = new IntersectionObserver((entries) => {
+      if (entries[0].isIntersecting) onEndReached();
+    }, { rootMargin: '400px' });
+    observer.observe(sentinel);
+    return () => observer.disconnect();
+  }, [onEndReached, photos.length]);
+
+  const firstRow = Math.min(rowRange.start, rowCount);
+  const lastRow = Math.min(rowRange.end, rowCount);
+  const visiblePhotos = photos.slice(firstRow * columns, lastRow * columns);
+
+  return (
+    <div ref={containerRef} style={{ position: 'relative', height: rowCount * GALLERY_ROW_HEIGHT }}>
+      <div
+        className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 xl:grid-cols-4 gap-6"
+        style={{ position: 'absolute', top: firstRow * GALLERY_ROW_HEIGHT, left: 0, right: 0 }}
+      >
+        {visiblePhotos.map(renderTile)}
+      </div>
+      <div ref={sentinelRef} style={{ position: 'absolute', bottom: 0, height: 1, width: 1 }} />
+    </div>
+  );
+};
+
 // Photo Gallery Component
 const PhotoGallery = () => {
   const { sessionId } = useParams();
   const [session, setSession] = useState(null);
   const [photos, setPhotos] = useState([]);
+  const [hasMore, setHasMore] = useState(false);
   const [selectedPhotos, setSelectedPhotos] = useState([]);
   const [loading, setLoading] = useState(true);
   const [downloading, setDownloading] = useState(false);
+  const [sortBy, setSortBy] = useState('uploaded_at');
+  const [skipDuplicates, setSkipDuplicates] = useState(false);
+  const [importJob, setImportJob] = useState(null);
+  const loadingMore = useRef(false);
   const navigate = useNavigate();
 
   useEffect(() => {
     fetchSessionAndPhotos();
-  }, [sessionId]);
+  }, [sessionId, sortBy]);
+
+  const fetchPhotoPage = async (after) => {
+    const params = { include_data: false, limit: GALLERY_PAGE_SIZE, sort: sortBy };
+    if (after) {
+      params.after = after;
+    }
+    const response = await axios.get(`${API}/photos/session/${sessionId}`, { params });
+    setHasMore(response.data.length === GALLERY_PAGE_SIZE);
+    return response.data;
+  };
 
   const fetchSessionAndPhotos = async () => {
     try {
-      const [sessionResponse, photosResponse] = await Promise.all([
+      const [sessionResponse, firstPage] = await Promise.all([
         axios.get(`${API}/sessions/${sessionId}`),
-        axios.get(`${API}/photos/session/${sessionId}`)
+        fetchPhotoPage(null)
       ]);
       setSession(sessionResponse.data);
-      setPhotos(photosResponse.data);
+      setPhotos(firstPage);
     } catch (error) {
       console.error('Error fetching session and photos:', error);
     } finally {
@@ -111,11 +368,42 @@ const PhotoGallery = () => {
     }
   };
 
-  const downloadPhoto = (photo) => {
-    const link = document.createElement('a');
-    link.download = photo.filename;
-    link.href = `data:${photo.content_type};base64,${photo.image_data}`;
-    link.click();
+  const loadMorePhotos = useCallback(async () => {
+    if (!hasMore || loadingMore.current || photos.length === 0) return;
+    loadingMore.current = true;
+    try {
+      const nextPage = await fetchPhotoPage(photos[photos.length - 1].id);
+      setPhotos(prev => [...prev, ...nextPage]);
+    } catch (error) {
+      console.error('Error fetching more photos:', error);
+    } finally {
+      loadingMore.current = false;
+    }
+  }, [hasMore, photos, sessionId, sortBy]);
+
+  const downloadPhoto = async (photo) => {
+    try {
+      const response = await axios.post(`${API}/photos/${photo.id}/download-link`);
+      startDownload(response.data.url);
+    } catch (error) {
+      console.error('Error downloading photo:', error);
+    }
+  };
+
+  const openContactSheet = async (format) => {
+    try {
+      const response = await axios.get(`${API}/sessions/${sessionId}/contact-sheet`, {
+        params: { format, sort: sortBy },
+        responseType: 'blob'
+      });
+      const url = URL.createObjectURL(response.data);
+      window.open(url, '_blank');
+      // Give the new tab time to load the sheet before releasing it
+      setTimeout(() => URL.revokeObjectURL(url), 60000);
+    } catch (error) {
+      console.error('Error rendering contact sheet:', error);
+      alert('Error rendering contact sheet. Please try again.');
+    }
   };
 
   const handleBulkDownload = async () => {
@@ -126,33 +414,11 @@ const PhotoGallery = () => {
 
     setDownloading(true);
     try {
-      const response = await axios.post(`${API}/photos/bulk-download`, selectedPhotos, {
-        responseType: 'blob',
-        headers: {
-          'Content-Type': 'application/json',
-        },
+      // The signed link is fetched by the browser itself and streamed to disk
+      const response = await axios.post(`${API}/photos/bulk-download/link`, selectedPhotos, {
+        params: { exclude_duplicates: skipDuplicates }
       });
-
-      // Create download link
-      const url = window.URL.createObjectURL(new Blob([response.data]));
-      const link = document.createElement('a');
-      link.href = url;
-      
-      // Get filename from response header or use default
-      const contentDisposition = response.headers['content-disposition'];
-      let filename = 'photos.zip';
-      if (contentDisposition) {
-        const filenameMatch = contentDisposition.match(/filename="(.+)"/);
-        if (filenameMatch) {
-          filename = filenameMatch[1];
-        }
-      }
-      
-      link.download = filename;
-      document.body.appendChild(link);
-      link.click();
-      document.body.removeChild(link);
-      window.URL.revokeObjectURL(url);
+      startDownload(response.data.url);
 
       // Clear selection after download
       setSelectedPhotos([]);
@@ -180,12 +446,59 @@ const PhotoGallery = () => {
     );
   };
 
+  const handleImport = async (e) => {
+    const file = e.target.files[0];
+    e.target.value = '';
+    if (!file) return;
+    try {
+      const response = await axios.post(`${API}/sessions/${sessionId}/import`, file, {
+        headers: { 'Content-Type': file.type || 'application/octet-stream' }
+      });
+      let job = response.data;
+      setImportJob(job);
+      // The archive is imported in the background; poll until it is done
+      while (job.status === 'queued' || job.status === 'running') {
+        await new Promise(resolve => setTimeout(resolve, 2000));
+        job = (await axios.get(`${API}/sessions/${sessionId}/import/${job.id}`)).data;
+        setImportJob(job);
+      }
+      if (job.status === 'failed') {
+        alert('Import failed: ' + job.error);
+      } else if (job.status === 'interrupted') {
+        alert(`Import was interrupted by a server restart after ${job.imported} photos`);
+      } else if (job.skipped > 0) {
+        alert(`Imported ${job.imported} photos, skipped ${job.skipped} files` + (job.stopped_reason ? ` (${job.stopped_reason})` : ''));
+      }
+      fetchSessionAndPhotos();
+    } catch (error) {
+      console.error('Error importing archive:', error);
+      alert('Error importing archive: ' + (error.response?.data?.detail || 'Unknown error'));
+    } finally {
+      setImportJob(null);
+    }
+  };
+
+  const handleBulkDelete = async () => {
+    if (!window.confirm(`Are you sure you want to delete ${selectedPhotos.length} photos?`)) {
+      return;
+    }
+    try {
+      const response = await axios.post(`${API}/photos/bulk-delete`, selectedPhotos);
+      const deleted = new Set(response.data.deleted);
+      setPhotos(prev => prev.filter(photo => !deleted.has(photo.id)));
+      setSelectedPhotos(prev => prev.filter(id => !deleted.has(id)));
+    } catch (error) {
+      console.error('Error deleting photos:', error);
+      alert('Error deleting photos. Please try again.');
+    }
+  };
+
   const deletePhoto = async (photoId) => {
     if (window.confirm('Are you sure you want to delete this photo?')) {
       try {
         await axios.delete(`${API}/photos/${photoId}`);
-        setPhotos(photos.filter(photo => photo.id !== photoId));
-        setSelectedPhotos(selectedPhotos.filter(id => id !== photoId));
+        setPhotos(prev => prev.filter(photo => photo.id !== photoId));
+        setSelectedPhotos(prev => prev.filter(id => id !== photoId));
       } catch (error) {
         console.error('Error deleting photo:', error);
       }
@@ -216,12 +529,34 @@ const PhotoGallery = () => {
                 {session?.name || 'Photo Gallery'}
               </h1>
               <p className="text-gray-600">
-                {photos.length} photos uploaded
+                {session ? session.photo_count : photos.length} photos uploaded
+                {session && ` · ${formatBytes(session.total_bytes)}`}
               </p>
             </div>
             
+            <label className={`px-4 py-2 rounded-md text-sm text-white ${
+              importJob ? 'bg-gray-400 cursor-wait' : 'bg-indigo-500 hover:bg-indigo-600 cursor-pointer'
+            }`}>
+              {importJob ? `Importing... ${importJob.imported} added` : 'Import ZIP'}
+              <input
+                type="file"
+                accept=".zip,.tar,.tgz,.tar.gz,application/zip,application/x-tar,application/gzip"
+                onChange={handleImport}
+                disabled={!!importJob}
+                className="hidden"
+              />
+            </label>
+            
             {photos.length > 0 && (
               <div className="flex items-center space-x-4">
+                <select
+                  value={sortBy}
+                  onChange={(e) => setSortBy(e.target.value)}
+                  className="border border-gray-300 rounded-md px-3 py-2 text-sm"
+                >
+                  <option value="uploaded_at">Newest uploads</option>
+                  <option value="taken_at">Newest taken</option>
+                </select>
                 <div className="text-sm text-gray-600">
                   {selectedPhotos.length} selected
                 </div>
@@ -231,6 +566,21 @@ const PhotoGallery = () => {
                 >
                   {selectedPhotos.length === photos.length ? 'Deselect All' : 'Select All'}
                 </button>
+                <button
+                  onClick={() => openContactSheet('pdf')}
+                  className="bg-blue-500 hover:bg-blue-600 text-white px-4 py-2 rounded-md text-sm"
+                >
+                  Contact Sheet
+                </button>
+                <label className="flex items-center text-sm text-gray-600">
+                  <input
+                    type="checkbox"
+                    checked={skipDuplicates}
+                    onChange={(e) => setSkipDuplicates(e.target.checked)}
+                    className="mr-2"
+                  />
+                  Skip near-duplicates
+                </label>
                 <button
                   onClick={handleBulkDownload}
                   disabled={selectedPhotos.length === 0 || downloading}
@@ -242,6 +592,17 @@ const PhotoGallery = () => {
                 >
                   {downloading ? 'Downloading...' : `Download Selected (${selectedPhotos.length})`}
                 </button>
+                <button
+                  onClick={handleBulkDelete}
+                  disabled={selectedPhotos.length === 0}
+                  className={`px-4 py-2 rounded-md text-sm font-medium ${
+                    selectedPhotos.length === 0
+                      ? 'bg-gray-300 text-gray-500 cursor-not-allowed'
+                      : 'bg-red-500 hover:bg-red-600 text-white'
+                  }`}
+                >
+                  Delete Selected ({selectedPhotos.length})
+                </button>
               </div>
             )}
           </div>
@@ -254,54 +615,20 @@ const PhotoGallery = () => {
             <p className="text-gray-500 text-lg">No photos uploaded yet</p>
           </div>
         ) : (
-          <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 xl:grid-cols-4 gap-6">
-            {photos.map((photo) => (
-              <div key={photo.id} className="bg-white rounded-lg shadow-lg overflow-hidden relative">
-                {/* Selection checkbox */}
-                <div className="absolute top-2 left-2 z-10">
-                  <input
-                    type="checkbox"
-                    checked={selectedPhotos.includes(photo.id)}
-                    onChange={() => handlePhotoSelect(photo.id)}
-                    className="w-5 h-5 text-blue-600 bg-white border-gray-300 rounded focus:ring-blue-500"
-                  />
-                </div>
-                
-                <div className="aspect-w-16 aspect-h-12">
-                  <img
-                    src={`data:${photo.content_type};base64,${photo.image_data}`}
-                    alt={photo.filename}
-                    className="w-full h-48 object-cover"
-                  />
-                </div>
-                <div className="p-4">
-                  <h3 className="text-sm font-medium text-gray-900 truncate mb-2">
-                    {photo.filename}
-                  </h3>
-                  <p className="text-xs text-gray-500 mb-2">
-                    {new Date(photo.uploaded_at).toLocaleString()}
-                  </p>
-                  <p className="text-xs text-gray-500 mb-4">
-                    {(photo.file_size / 1024 / 1024).toFixed(2)} MB
-                  </p>
-                  <div className="flex space-x-2">
-                    <button
-                      onClick={() => downloadPhoto(photo)}
-                      className="flex-1 bg-blue-500 hover:bg-blue-600 text-white px-3 py-1 rounded text-sm"
-                    >
-                      Download
-                    </button>
-                    <button
-                      onClick={() => deletePhoto(photo.id)}
-                      className="flex-1 bg-red-500 hover:bg-red-600 text-white px-3 py-1 rounded text-sm"
-                    >
-                      Delete
-                    </button>
-                  </div>
-                </div>
-              </div>
-            ))}
-          </div>
+          <VirtualPhotoGrid
+            photos={photos}
+            onEndReached={loadMorePhotos}
+            renderTile={(photo) => (
+              <PhotoTile
+                key={photo.id}
+                photo={photo}
+                selected={selectedPhotos.includes(photo.id)}
+                onSelect={handlePhotoSelect}
+                onDownload={downloadPhoto}
+                onDelete={deletePhoto}
+              />
+            )}
+          />
         )}
       </div>
     </div>
@@ -342,8 +669,7 @@ const UserManagement = () => {
 
   const fetchSessions = async () => {
     try {
-      const response = await axios.get(`${API}/sessions`);
-      setSessions(response.data);
+      setSessions(await fetchAllSessions());
     } catch (error) {
       console.error('Error fetching sessions:', error);
     }
@@ -704,7 +1030,12 @@ const UserManagement = () => {
 // Home Page Component
 const Home = () => {
   const [sessions, setSessions] = useState([]);
-  const [newSession, setNewSession] = useState({ name: '', description: '' });
+  const emptySession = {
+    name: '', description: '', max_image_dimension: '', image_quality: '', strip_metadata: false,
+    max_photos: '', max_total_mb: '', max_file_mb: '',
+    purge_after_deactivation_days: '', purge_after_last_upload_days: ''
+  };
+  const [newSession, setNewSession] = useState(emptySession);
   const [showCreateForm, setShowCreateForm] = useState(false);
   const [qrCodes, setQrCodes] = useState({});
   const { user, logout } = useAuth();
@@ -718,8 +1049,7 @@ const Home = () => {
 
   const fetchSessions = async () => {
     try {
-      const response = await axios.get(`${API}/sessions`);
-      setSessions(response.data);
+      setSessions(await fetchAllSessions());
     } catch (error) {
       console.error('Error fetching sessions:', error);
     }
@@ -728,12 +1058,25 @@ const Home = () => {
   const createSession = async (e) => {
     e.preventDefault();
     try {
-      await axios.post(`${API}/sessions`, newSession);
-      setNewSession({ name: '', description: '' });
+      const { max_total_mb, max_file_mb, ...settings } = newSession;
+      const megabytes = (value) => (value ? Math.round(parseFloat(value) * 1024 * 1024) : null);
+      const days = (value) => (value === '' ? null : parseInt(value, 10));
+      await axios.post(`${API}/sessions`, {
+        ...settings,
+        max_image_dimension: newSession.max_image_dimension ? parseInt(newSession.max_image_dimension, 10) : null,
+        image_quality: newSession.image_quality ? parseInt(newSession.image_quality, 10) : null,
+        max_photos: newSession.max_photos ? parseInt(newSession.max_photos, 10) : null,
+        max_total_bytes: megabytes(max_total_mb),
+        max_file_size: megabytes(max_file_mb),
+        purge_after_deactivation_days: days(newSession.purge_after_deactivation_days),
+        purge_after_last_upload_days: days(newSession.purge_after_last_upload_days),
+      });
+      setNewSession(emptySession);
       setShowCreateForm(false);
       fetchSessions();
     } catch (error) {
       console.error('Error creating session:', error);
+      alert('Error creating session: ' + (typeof error.response?.data?.detail === 'string' ? error.response.data.detail : 'Invalid settings'));
     }
   };
 
@@ -761,8 +1104,10 @@ const Home = () => {
 
   const deleteSession = async (sessionId, sessionName) => {
     if (window.confirm(`Are you sure you want to delete the session "${sessionName}"? This action cannot be undone.`)) {
+      // Deactivating keeps the photos until retention removes them; a hard delete removes them now
+      const hard = window.confirm(`Also permanently delete all photos of "${sessionName}"? Cancel keeps them until the retention period ends.`);
       try {
-        await axios.delete(`${API}/sessions/${sessionId}`);
+        await axios.delete(`${API}/sessions/${sessionId}`, { params: { hard } });
         fetchSessions();
         // Remove QR code from state if it exists
         setQrCodes(prev => {
@@ -840,6 +1185,95 @@ const Home = () => {
                   rows="3"
                 />
               </div>
+              <div className="grid grid-cols-1 md:grid-cols-2 gap-4">
+                <div>
+                  <label className="block text-sm font-medium text-gray-700">Resize photos to (px, optional)</label>
+                  <input
+                    type="number"
+                    min="256"
+                    max="10000"
+                    placeholder="e.g. 2048 — leave empty to keep originals"
+                    value={newSession.max_image_dimension}
+                    onChange={(e) => setNewSession({...newSession, max_image_dimension: e.target.value})}
+                    className="mt-1 block w-full border border-gray-300 rounded-md px-3 py-2"
+                  />
+                </div>
+                <div>
+                  <label className="block text-sm font-medium text-gray-700">JPEG quality (30-100, optional)</label>
+                  <input
+                    type="number"
+                    min="30"
+                    max="100"
+                    placeholder="85"
+                    value={newSession.image_quality}
+                    onChange={(e) => setNewSession({...newSession, image_quality: e.target.value})}
+                    className="mt-1 block w-full border border-gray-300 rounded-md px-3 py-2"
+                  />
+                </div>
+              </div>
+              <label className="flex items-center text-sm text-gray-700">
+                <input
+                  type="checkbox"
+                  checked={newSession.strip_metadata}
+                  onChange={(e) => setNewSession({...newSession, strip_metadata: e.target.checked})}
+                  className="mr-2"
+                />
+                Remove GPS location and device serial numbers from uploaded photos
+              </label>
+              <div className="grid grid-cols-1 md:grid-cols-3 gap-4">
+                <div>
+                  <label className="block text-sm font-medium text-gray-700">Max photos (optional)</label>
+                  <input
+                    type="number"
+                    min="1"
+                    value={newSession.max_photos}
+                    onChange={(e) => setNewSession({...newSession, max_photos: e.target.value})}
+                    className="mt-1 block w-full border border-gray-300 rounded-md px-3 py-2"
+                  />
+                </div>
+                <div>
+                  <label className="block text-sm font-medium text-gray-700">Max total size in MB (optional)</label>
+                  <input
+                    type="number"
+                    min="1"
+                    value={newSession.max_total_mb}
+                    onChange={(e) => setNewSession({...newSession, max_total_mb: e.target.value})}
+                    className="mt-1 block w-full border border-gray-300 rounded-md px-3 py-2"
+                  />
+                </div>
+                <div>
+                  <label className="block text-sm font-medium text-gray-700">Max file size in MB (optional)</label>
+                  <input
+                    type="number"
+                    min="1"
+                    value={newSession.max_file_mb}
+                    onChange={(e) => setNewSession({...newSession, max_file_mb: e.target.value})}
+                    className="mt-1 block w-full border border-gray-300 rounded-md px-3 py-2"
+                  />
+                </div>
+              </div>
+              <div className="grid grid-cols-1 md:grid-cols-2 gap-4">
+                <div>
+                  <label className="block text-sm font-medium text-gray-700">Delete photos days after deactivation (0 = never, empty = default)</label>
+                  <input
+                    type="number"
+                    min="0"
+                    value={newSession.purge_after_deactivation_days}
+                    onChange={(e) => setNewSession({...newSession, purge_after_deactivation_days: e.target.value})}
+                    className="mt-1 block w-full border border-gray-300 rounded-md px-3 py-2"
+                  />
+                </div>
+                <div>
+                  <label className="block text-sm font-medium text-gray-700">Delete photos days after last upload (0 = never, empty = default)</label>
+                  <input
+                    type="number"
+                    min="0"
+                    value={newSession.purge_after_last_upload_days}
+                    onChange={(e) => setNewSession({...newSession, purge_after_last_upload_days: e.target.value})}
+                    className="mt-1 block w-full border border-gray-300 rounded-md px-3 py-2"
+                  />
+                </div>
+              </div>
               <div className="flex space-x-4">
                 <button
                   type="submit"
@@ -869,6 +1303,15 @@ const Home = () => {
               <p className="text-sm text-gray-500 mb-4">
                 Created: {new Date(session.created_at).toLocaleString()}
               </p>
+              <p className="text-sm text-gray-500 mb-4">
+                {session.photo_count} photos · {formatBytes(session.total_bytes)}
+                {session.last_upload_at && ` · last upload ${new Date(session.last_upload_at).toLocaleString()}`}
+              </p>
+              {session.max_image_dimension && (
+                <p className="text-sm text-gray-500 mb-4">
+                  Photos resized to {session.max_image_dimension}px
+                </p>
+              )}
               
               <div className="space-y-3">
                 <button
@@ -920,6 +1363,152 @@ const Home = () => {
   );
 };
 
+// Upload scheduler: uploads several files at once, retries failures with
+// exponential backoff and adapts how many uploads run in parallel to the
+// throughput it measures
+const UPLOAD_SETTINGS = {
+  initialConcurrency: 3,
+  minConcurrency: 1,
+  maxConcurrency: 6,
+  maxAttempts: 5,
+  baseRetryDelay: 1000,
+  maxRetryDelay: 30000,
+  adaptWindow: 2000,
+};
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+const isRetryableUploadError = (error) => {
+  const status = error.response?.status;
+  // No status means a network error; 409 means chunks are missing and the upload can resume.
+  // A 429 without Retry-After is a session quota and will not clear by retrying.
+  if (status === 429) {
+    return Boolean(error.response.headers?.['retry-after']);
+  }
+  return !status || status >= 500 || [408, 409].includes(status);
+};
+
+const uploadRetryDelay = (error, attempt, settings) => {
+  const retryAfter = parseInt(error.response?.headers?.['retry-after'], 10);
+  if (!Number.isNaN(retryAfter)) {
+    return retryAfter * 1000;
+  }
+  const backoff = Math.min(settings.maxRetryDelay, settings.baseRetryDelay * 2 ** (attempt - 1));
+  return backoff / 2 + Math.random() * backoff / 2;
+};
+
+const runUploadQueue = (items, uploadItem, settings = UPLOAD_SETTINGS) => new Promise((resolve) => {
+  const results = new Array(items.length);
+  let next = 0;
+  let active = 0;
+  let settled = 0;
+  let concurrency = settings.initialConcurrency;
+  let windowStart = Date.now();
+  let windowBytes = 0;
+  let baselineThroughput = 0;
+
+  // Probe one more parallel upload while throughput keeps improving, back off when it drops
+  const recordBytes = (bytes) => {
+    windowBytes += bytes;
+    const elapsed = Date.now() - windowStart;
+    if (elapsed < settings.adaptWindow) return;
+    const throughput = windowBytes / elapsed;
+    if (throughput > baselineThroughput * 1.1) {
+      concurrency = Math.min(settings.maxConcurrency, concurrency + 1);
+      baselineThroughput = throughput;
+    } else if (throughput < baselineThroughput * 0.7) {
+      concurrency = Math.max(settings.minConcurrency, concurrency - 1);
+      baselineThroughput = throughput;
+    }
+    windowStart = Date.now();
+    windowBytes = 0;
+    launch();
+  };
+
+  const runItem = async (index) => {
+    let sent = 0;
+    const onProgress = (loaded) => {
+      if (loaded > sent) {
+        recordBytes(loaded - sent);
+        sent = loaded;
+      }
+      settings.onProgress?.(index, loaded);
+    };
+    for (let attempt = 1; ; attempt++) {
+      try {
+        return { ok: true, value: await uploadItem(items[index], index, onProgress) };
+      } catch (error) {
+        const status = error.response?.status;
+        if (status === 429 || status === 503) {
+          // The server is shedding load; halve the parallelism
+          concurrency = Math.max(settings.minConcurrency, Math.floor(concurrency / 2));
+        }
+        if (attempt >= settings.maxAttempts || !isRetryableUploadError(error)) {
+          return { ok: false, error };
+        }
+        await sleep(uploadRetryDelay(error, attempt, settings));
+      }
+    }
+  };
+
+  function launch() {
+    while (active < concurrency && next < items.length) {
+      const index = next++;
+      active++;
+      runItem(index).then((result) => {
+        results[index] = result;
+        active--;
+        settled++;
+        settings.onSettled?.(index, result);
+        if (settled === items.length) {
+          resolve(results);
+        } else {
+          launch();
+        }
+      });
+    }
+  }
+
+  if (items.length === 0) {
+    resolve(results);
+  } else {
+    launch();
+  }
+});
+
+// Downscale an image in the browser when the session asks for it. Returns the
+// original file when it already fits or cannot be decoded (e.g. HEIC, animated GIF).
+const prepareUploadFile = async (file, maxDimension, quality) => {
+  if (!maxDimension || !file.type.startsWith('image/') || file.type === 'image/gif') {
+    return file;
+  }
+  try {
+    const bitmap = await createImageBitmap(file, { imageOrientation: 'from-image' });
+    const scale = maxDimension / Math.max(bitmap.width, bitmap.height);
+    if (scale >= 1) {
+      bitmap.close();
+      return file;
+    }
+    const canvas = document.createElement('canvas');
+    canvas.width = Math.round(bitmap.width * scale);
+    canvas.height = Math.round(bitmap.height * scale);
+    const context = canvas.getContext('2d');
+    context.fillStyle = '#ffffff'; // JPEG has no transparency
+    context.fillRect(0, 0, canvas.width, canvas.height);
+    context.drawImage(bitmap, 0, 0, canvas.width, canvas.height);
+    bitmap.close();
+    const blob = await new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', quality / 100));
+    if (!blob || blob.size >= file.size) {
+      return file;
+    }
+    const name = file.name.replace(/\.[^.]+$/, '') + '.jpg';
+    return new File([blob], name, { type: 'image/jpeg', lastModified: file.lastModified });
+  } catch (error) {
+    console.error('Could not downscale image, uploading original:', error);
+    return file;
+  }
+};
+
 // Upload Page Component
 const UploadPage = () => {
   const { sessionId } = useParams();
@@ -927,6 +1516,8 @@ const UploadPage = () => {
   const [files, setFiles] = useState([]);
   const [uploading, setUploading] = useState(false);
   const [uploadProgress, setUploadProgress] = useState({});
+  const [bytesUploaded, setBytesUploaded] = useState({});
+  const [uploadSizes, setUploadSizes] = useState({});
   const [uploadComplete, setUploadComplete] = useState(false);
   const [error, setError] = useState('');
   const [successCount, setSuccessCount] = useState(0);
@@ -950,34 +1541,56 @@ const UploadPage = () => {
     const selectedFiles = Array.from(e.target.files);
     setFiles(selectedFiles);
     setUploadProgress({});
+    setBytesUploaded({});
+    setUploadSizes({});
     setUploadComplete(false);
     setError('');
     setSuccessCount(0);
   };
 
-  const uploadFile = async (file) => {
-    return new Promise((resolve, reject) => {
-      const reader = new FileReader();
-      reader.onload = async (e) => {
-        try {
-          const base64Data = e.target.result.split(',')[1];
-          const photoData = {
-            session_id: sessionId,
-            filename: file.name,
-            content_type: file.type,
-            image_data: base64Data,
-            file_size: file.size
-          };
-          
-          await axios.post(`${API}/photos`, photoData);
-          resolve();
-        } catch (error) {
-          reject(error);
-        }
-      };
-      reader.onerror = reject;
-      reader.readAsDataURL(file);
-    });
+  // Resumable chunked upload: the upload id is remembered per file so a retry
+  // (or a page reload) continues from the last chunk the server acknowledged
+  const uploadFile = async (file, onProgress = () => {}) => {
+    const uploadHeaders = { 'X-Upload-Session': sessionId };
+    const resumeKey = `upload:${sessionId}:${file.name}:${file.size}:${file.lastModified}`;
+    let status = null;
+
+    const savedUploadId = localStorage.getItem(resumeKey);
+    if (savedUploadId) {
+      try {
+        const response = await axios.get(`${API}/uploads/${savedUploadId}`);
+        status = response.data;
+      } catch (error) {
+        localStorage.removeItem(resumeKey); // Expired or unknown, start over
+      }
+    }
+
+    if (!status) {
+      const response = await axios.post(`${API}/uploads`, {
+        session_id: sessionId,
+        filename: file.name,
+        content_type: file.type,
+        file_size: file.size
+      });
+      status = response.data;
+      localStorage.setItem(resumeKey, status.upload_id);
+    }
+
+    const { upload_id: uploadId, chunk_size: chunkSize, total_chunks: totalChunks } = status;
+    const received = new Set(status.received_chunks);
+    onProgress(status.received_bytes);
+    for (let index = 0; index < totalChunks; index++) {
+      if (received.has(index)) continue;
+      const offset = index * chunkSize;
+      const chunk = file.slice(offset, Math.min(file.size, offset + chunkSize));
+      await axios.put(`${API}/uploads/${uploadId}/chunks/${index}`, chunk, {
+        headers: { ...uploadHeaders, 'Content-Type': 'application/octet-stream' },
+        onUploadProgress: (event) => onProgress(offset + event.loaded),
+      });
+    }
+
+    await axios.post(`${API}/uploads/${uploadId}/complete`, null, { headers: uploadHeaders });
+    localStorage.removeItem(resumeKey);
   };
 
   const handleUpload = async () => {
@@ -986,19 +1599,25 @@ const UploadPage = () => {
     setUploading(true);
     setError('');
     setUploadComplete(false);
-    let successfulUploads = 0;
     
-    for (let i = 0; i < files.length; i++) {
-      const file = files[i];
-      try {
-        setUploadProgress(prev => ({ ...prev, [i]: 'uploading' }));
-        await uploadFile(file);
-        setUploadProgress(prev => ({ ...prev, [i]: 'completed' }));
-        successfulUploads++;
-      } catch (error) {
-        setUploadProgress(prev => ({ ...prev, [i]: 'error' }));
-        setError(`Failed to upload ${file.name}`);
-      }
+    const results = await runUploadQueue(files, async (file, index, onProgress) => {
+      setUploadProgress(prev => ({ ...prev, [index]: 'uploading' }));
+      const prepared = await prepareUploadFile(file, session.max_image_dimension, session.image_quality);
+      setUploadSizes(prev => ({ ...prev, [index]: prepared.size }));
+      await uploadFile(prepared, onProgress);
+    }, {
+      ...UPLOAD_SETTINGS,
+      onProgress: (index, loaded) => setBytesUploaded(prev => ({ ...prev, [index]: loaded })),
+      onSettled: (index, result) => setUploadProgress(prev => ({
+        ...prev,
+        [index]: result.ok ? 'completed' : 'error'
+      })),
+    });
+    
+    const successfulUploads = results.filter(result => result.ok).length;
+    const failedFiles = files.filter((file, index) => !results[index].ok).map(file => file.name);
+    if (failedFiles.length > 0) {
+      setError(`Failed to upload ${failedFiles.join(', ')}`);
     }
     
     setSuccessCount(successfulUploads);
@@ -1101,7 +1720,12 @@ const UploadPage = () => {
                             {(file.size / 1024 / 1024).toFixed(2)} MB
                           </span>
                           {uploadProgress[index] === 'uploading' && (
-                            <div className="w-4 h-4 border-2 border-blue-500 border-t-transparent rounded-full animate-spin"></div>
+                            <>
+                              <span className="text-xs text-blue-600">
+                                {Math.round(Math.min(1, (bytesUploaded[index] || 0) / (uploadSizes[index] || file.size || 1)) * 100)}%
+                              </span>
+                              <div className="w-4 h-4 border-2 border-blue-500 border-t-transparent rounded-full animate-spin"></div>
+                            </>
                           )}
                           {uploadProgress[index] === 'completed' && (
                             <div className="w-4 h-4 bg-green-500 rounded-full flex items-center justify-center">
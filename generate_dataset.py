@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Synthetic dataset generator for scale testing the QR Photo Upload System
+Fills a local MongoDB with users, sessions and photos that match the
+User, Session and Photo schemas in backend/server.py. Photo inserts are
+batched with insert_many across parallel worker processes.
+
+    python generate_dataset.py --sessions 2000 --photos-per-session 50:300 --photo-size-mb 1:8
+"""
+
+import base64
+import io
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Tuple
+
+import typer
+from PIL import Image
+from pymongo import MongoClient
+
+ROOT_DIR = Path(__file__).parent
+sys.path.insert(0, str(ROOT_DIR / 'backend'))
+
+from server import MAX_PHOTO_BYTES, User, Session, Photo, get_password_hash  # noqa: E402
+
+app = typer.Typer(add_completion=False, help=__doc__)
+
+DISTRIBUTIONS = ('fixed', 'uniform', 'lognormal')
+UPLOAD_PATTERNS = ('uniform', 'burst', 'decay')
+
+
+def parse_range(value: str) -> Tuple[float, float]:
+    """Parse 'N' or 'MIN:MAX' into a (min, max) tuple"""
+    if ':' in value:
+        low, high = value.split(':', 1)
+        low, high = float(low), float(high)
+    else:
+        low = high = float(value)
+    if low < 0 or high < low:
+        raise typer.BadParameter(f"Invalid range '{value}'")
+    return low, high
+
+
+def sample(rng: random.Random, bounds: Tuple[float, float], distribution: str) -> float:
+    """Draw from [low, high] following the named distribution"""
+    low, high = bounds
+    if distribution == 'fixed' or low == high:
+        return high if distribution == 'fixed' else low
+    if distribution == 'uniform':
+        return rng.uniform(low, high)
+    # lognormal: most values near the low end with a long tail, clamped to the range
+    mu = math.log(max(low, 1e-3) * 2)
+    return min(high, max(low, rng.lognormvariate(mu, 0.75)))
+
+
+def upload_offset(rng: random.Random, window: timedelta, pattern: str) -> timedelta:
+    """Offset of an upload from the session start within the upload window"""
+    seconds = window.total_seconds()
+    if pattern == 'uniform':
+        return timedelta(seconds=rng.uniform(0, seconds))
+    if pattern == 'burst':
+        # A few peaks (ceremony, speeches, dancing) with uploads clustered around them
+        peak = rng.choice((0.15, 0.45, 0.8))
+        return timedelta(seconds=min(seconds, max(0.0, rng.gauss(peak, 0.05) * seconds)))
+    # decay: most uploads right after the event starts, tailing off over the window
+    return timedelta(seconds=min(seconds, rng.expovariate(5.0 / seconds)))
+
+
+def make_jpeg(target_bytes: int, seed: int) -> bytes:
+    """Create a JPEG of roughly target_bytes from random noise (noise barely compresses)"""
+    rng = random.Random(seed)
+    pixels = max(64 * 64, int(target_bytes / 0.9))
+    width = int((pixels * 4 / 3) ** 0.5)
+    height = max(1, pixels // width)
+    img = Image.frombytes('RGB', (width, height), rng.randbytes(width * height * 3))
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+class ImagePool:
+    """Pre-encoded JPEGs bucketed by size so 100 GB of photos do not need 100 GB of encoding"""
+
+    def __init__(self, size_bounds_mb: Tuple[float, float], buckets: int, seed: int):
+        low, high = size_bounds_mb
+        # Larger photos would be refused by the server, so they are capped at its limit
+        self.sizes = sorted({
+            min(MAX_PHOTO_BYTES, max(16 * 1024, int((low + (high - low) * i / max(1, buckets - 1)) * 1024 * 1024)))
+            for i in range(buckets)
+        })
+        self.payloads = {}
+        self.seed = seed
+
+    def get(self, size_bytes: int) -> Tuple[str, int]:
+        """Base64 data and decoded size of the pooled image closest to size_bytes"""
+        bucket = min(self.sizes, key=lambda s: abs(s - size_bytes))
+        if bucket not in self.payloads:
+            data = make_jpeg(bucket, seed=self.seed + bucket)
+            # Encoded sizes only approximate the target; shrink until the server would store it
+            while len(data) > MAX_PHOTO_BYTES:
+                data = make_jpeg(int(bucket * MAX_PHOTO_BYTES / len(data) * 0.98), seed=self.seed + bucket)
+            self.payloads[bucket] = (base64.b64encode(data).decode(), len(data))
+        return self.payloads[bucket]
+
+
+def insert_session_photos(job: dict) -> Tuple[int, int]:
+    """Worker: generate and insert the photos of a chunk of sessions, returns (photos, bytes)"""
+    rng = random.Random(job['seed'])
+    pool = ImagePool(job['photo_size_mb'], job['image_buckets'], job['seed'])
+    client = MongoClient(job['mongo_url'])
+    collection = client[job['db_name']].photos
+    window = timedelta(hours=job['upload_window_hours'])
+    batch_limit = job['batch_mb'] * 1024 * 1024
+
+    inserted = 0
+    inserted_bytes = 0
+    batch = []
+    batch_bytes = 0
+    for session_id, created_at, photo_count in job['sessions']:
+        for index in range(photo_count):
+            target = int(sample(rng, job['photo_size_mb'], job['size_distribution']) * 1024 * 1024)
+            image_data, file_size = pool.get(target)
+            photo = Photo(
+                session_id=session_id,
+                filename=f"IMG_{index + 1:05d}.jpg",
+                content_type="image/jpeg",
+                image_data=image_data,
+                uploaded_at=created_at + upload_offset(rng, window, job['upload_pattern']),
+                file_size=file_size
+            )
+            batch.append(photo.dict())
+            batch_bytes += len(image_data)
+            if len(batch) >= job['batch_size'] or batch_bytes >= batch_limit:
+                collection.insert_many(batch, ordered=False)
+                inserted += len(batch)
+                inserted_bytes += batch_bytes
+                batch, batch_bytes = [], 0
+    if batch:
+        collection.insert_many(batch, ordered=False)
+        inserted += len(batch)
+        inserted_bytes += batch_bytes
+    client.close()
+    return inserted, inserted_bytes
+
+
+@app.command()
+def generate(
+    mongo_url: str = typer.Option(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'), help="MongoDB URL"),
+    db_name: str = typer.Option(os.environ.get('DB_NAME', 'test_database'), help="Database to fill"),
+    users: int = typer.Option(50, help="Admin users to create (besides any existing superadmin)"),
+    sessions: int = typer.Option(1000, help="Sessions to create"),
+    inactive_fraction: float = typer.Option(0.2, help="Fraction of sessions that are deactivated"),
+    restricted_fraction: float = typer.Option(0.5, help="Fraction of users restricted to some sessions"),
+    sessions_per_user: str = typer.Option("1:20", help="allowed_sessions per restricted user, N or MIN:MAX"),
+    photos_per_session: str = typer.Option("50:500", help="Photos per session, N or MIN:MAX"),
+    count_distribution: str = typer.Option("lognormal", help=f"Photos per session distribution: {', '.join(DISTRIBUTIONS)}"),
+    photo_size_mb: str = typer.Option("1:12", help="Photo size in MB, N or MIN:MAX; capped at the server's photo limit"),
+    size_distribution: str = typer.Option("lognormal", help=f"Photo size distribution: {', '.join(DISTRIBUTIONS)}"),
+    history_days: float = typer.Option(365, help="Spread session creation over this many past days"),
+    upload_window_hours: float = typer.Option(8, help="Uploads of a session happen within this window"),
+    upload_pattern: str = typer.Option("burst", help=f"uploaded_at pattern within the window: {', '.join(UPLOAD_PATTERNS)}"),
+    image_buckets: int = typer.Option(8, help="Distinct image sizes encoded per worker"),
+    workers: int = typer.Option(os.cpu_count() or 4, help="Parallel insert workers"),
+    batch_size: int = typer.Option(500, help="Maximum documents per insert_many"),
+    batch_mb: int = typer.Option(64, help="Maximum image megabytes per insert_many"),
+    seed: int = typer.Option(42, help="Random seed for reproducible datasets"),
+    drop: bool = typer.Option(False, help="Drop existing users (except superadmins), sessions and photos first"),
+    yes: bool = typer.Option(False, "--yes", "-y", help="Do not ask for confirmation"),
+):
+    """Fill MongoDB with synthetic users, sessions and photos"""
+    if count_distribution not in DISTRIBUTIONS or size_distribution not in DISTRIBUTIONS:
+        raise typer.BadParameter(f"Distribution must be one of {', '.join(DISTRIBUTIONS)}")
+    if upload_pattern not in UPLOAD_PATTERNS:
+        raise typer.BadParameter(f"Upload pattern must be one of {', '.join(UPLOAD_PATTERNS)}")
+    count_bounds = parse_range(photos_per_session)
+    size_bounds = parse_range(photo_size_mb)
+    allowed_bounds = parse_range(sessions_per_user)
+
+    rng = random.Random(seed)
+    session_plan = [int(round(sample(rng, count_bounds, count_distribution))) for _ in range(sessions)]
+    total_photos = sum(session_plan)
+    mean_size = (size_bounds[0] + size_bounds[1]) / 2
+    typer.echo(f"Target: {users} users, {sessions} sessions, {total_photos} photos "
+               f"(~{total_photos * mean_size / 1024:.1f} GB if sizes averaged {mean_size:.1f} MB) "
+               f"into {mongo_url}/{db_name}")
+    if not yes:
+        typer.confirm("Continue?", abort=True)
+
+    client = MongoClient(mongo_url)
+    db = client[db_name]
+    if drop:
+        db.photos.drop()
+        db.sessions.drop()
+        db.users.delete_many({"is_superadmin": {"$ne": True}})
+        typer.echo("Dropped existing sessions, photos and non-superadmin users")
+
+    # Hashing is deliberately slow, so every generated user shares one password
+    password_hash = get_password_hash("password123")
+    creator = db.users.find_one({"is_superadmin": True}) or {"id": "system"}
+    now = datetime.utcnow()
+
+    session_docs = []
+    for index in range(sessions):
+        created_at = now - timedelta(days=rng.uniform(0, history_days))
+        session_docs.append(Session(
+            name=f"Synthetic Event {index + 1}",
+            description=f"Generated dataset session {index + 1}",
+            created_at=created_at,
+            created_by=creator["id"],
+            is_active=rng.random() >= inactive_fraction
+        ).dict())
+    for start in range(0, len(session_docs), batch_size):
+        db.sessions.insert_many(session_docs[start:start + batch_size], ordered=False)
+
+    session_ids = [doc["id"] for doc in session_docs]
+    user_docs = []
+    for index in range(users):
+        allowed = []
+        if rng.random() < restricted_fraction:
+            count = min(len(session_ids), int(round(sample(rng, allowed_bounds, 'uniform'))))
+            allowed = rng.sample(session_ids, count)
+        user_docs.append(User(
+            username=f"synthetic_user_{seed}_{index + 1}",
+            password_hash=password_hash,
+            allowed_sessions=allowed,
+            created_by=creator["id"]
+        ).dict())
+    if user_docs:
+        db.users.insert_many(user_docs, ordered=False)
+    client.close()
+    typer.echo(f"Inserted {len(user_docs)} users (password: password123) and {len(session_docs)} sessions")
+
+    # Interleave big and small sessions so every worker gets a similar share of bytes
+    planned = list(zip(session_ids, [doc["created_at"] for doc in session_docs], session_plan))
+    chunks: List[list] = [[] for _ in range(max(1, workers) * 4)]
+    for index, entry in enumerate(sorted(planned, key=lambda p: p[2], reverse=True)):
+        chunks[index % len(chunks)].append(entry)
+    jobs = [{
+        'sessions': chunk,
+        'seed': seed * 1000 + index,
+        'mongo_url': mongo_url,
+        'db_name': db_name,
+        'photo_size_mb': size_bounds,
+        'size_distribution': size_distribution,
+        'upload_window_hours': upload_window_hours,
+        'upload_pattern': upload_pattern,
+        'image_buckets': image_buckets,
+        'batch_size': batch_size,
+        'batch_mb': batch_mb,
+    } for index, chunk in enumerate(chunks) if chunk]
+
+    started = time.monotonic()
+    photos_done = 0
+    bytes_done = 0
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(insert_session_photos, job) for job in jobs]
+        for future in as_completed(futures):
+            photos, size = future.result()
+            photos_done += photos
+            bytes_done += size
+            elapsed = time.monotonic() - started
+            typer.echo(f"  {photos_done}/{total_photos} photos, {bytes_done / 1024 ** 3:.2f} GB "
+                       f"({bytes_done / 1024 ** 2 / max(elapsed, 1e-6):.0f} MB/s)")
+
+    typer.echo(f"Done in {time.monotonic() - started:.1f}s: {photos_done} photos, "
+               f"{bytes_done / 1024 ** 3:.2f} GB of base64 image data")
+
+
+if __name__ == "__main__":
+    app()
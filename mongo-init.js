@@ -5,16 +5,27 @@ db = db.getSiblingDB('qr_photo_db');
 db.createCollection('users');
 db.createCollection('sessions');
 db.createCollection('photos');
+db.createCollection('cache_invalidations', { capped: true, size: 1048576 });
 
 // Create indexes for better performance
+db.users.createIndex({ "id": 1 }, { unique: true });
 db.users.createIndex({ "username": 1 }, { unique: true });
 db.users.createIndex({ "is_superadmin": 1 });
 db.users.createIndex({ "allowed_sessions": 1 });
 db.users.createIndex({ "created_by": 1 });
+db.sessions.createIndex({ "id": 1 }, { unique: true });
 db.sessions.createIndex({ "created_by": 1 });
 db.sessions.createIndex({ "created_at": -1 });
 db.sessions.createIndex({ "is_active": 1 });
+db.photos.createIndex({ "id": 1 }, { unique: true });
 db.photos.createIndex({ "session_id": 1 });
+db.photos.createIndex({ "session_id": 1, "uploaded_at": -1, "id": -1 });
+db.photos.createIndex({ "session_id": 1, "taken_at": -1, "id": -1 });
+db.photos.createIndex({ "archive": 1 }, { sparse: true });
 db.photos.createIndex({ "uploaded_at": -1 });
+db.photo_derivatives.createIndex({ "photo_id": 1, "content_type": 1 }, { unique: true });
+db.job_locks.createIndex({ "id": 1 }, { unique: true });
+db.import_jobs.createIndex({ "id": 1 }, { unique: true });
+db.import_jobs.createIndex({ "expires_at": 1 }, { expireAfterSeconds: 0 });
 
 print('Database initialized successfully');
\ No newline at end of file
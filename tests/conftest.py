@@ -0,0 +1,30 @@
+"""
+Shared setup for backend unit tests
+
+server.py reads its MongoDB settings at import time; the client connects
+lazily, so tests that never touch the database run without a server;
+tests that do use the in-memory database of the mongo fixture.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'qr_photo_test')
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """server.db backed by an in-memory MongoDB"""
+    from mongomock_motor import AsyncMongoMockClient
+    import server
+
+    database = AsyncMongoMockClient()[os.environ['DB_NAME']]
+    monkeypatch.setattr(server, "db", database)
+    server.active_sessions.clear()
+    yield database
+    server.active_sessions.clear()
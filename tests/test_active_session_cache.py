@@ -0,0 +1,62 @@
+"""
+Single-flight loading in get_active_session
+"""
+
+import asyncio
+
+import pytest
+
+import server
+
+
+class FakeSessions:
+    def __init__(self):
+        self.calls = 0
+        self.release = None
+
+    async def find_one(self, query, projection=None):
+        self.calls += 1
+        await self.release.wait()
+        return {"id": query["id"], "name": "Party", "is_active": True}
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    fake = FakeSessions()
+    monkeypatch.setattr(server, "db", type("FakeDB", (), {"sessions": fake})())
+    server.active_sessions.clear()
+    server.active_session_loads.clear()
+    yield fake
+    server.active_sessions.clear()
+
+
+def test_concurrent_callers_share_one_query(sessions):
+    async def scenario():
+        sessions.release = asyncio.Event()
+        callers = [asyncio.create_task(server.get_active_session("s1")) for _ in range(5)]
+        await asyncio.sleep(0)
+        sessions.release.set()
+        return await asyncio.gather(*callers)
+
+    results = asyncio.run(scenario())
+    assert sessions.calls == 1
+    assert all(result["id"] == "s1" for result in results)
+
+
+def test_waiters_recover_when_the_loading_caller_is_cancelled(sessions):
+    async def scenario():
+        sessions.release = asyncio.Event()
+        first = asyncio.create_task(server.get_active_session("s1"))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(server.get_active_session("s1"))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        sessions.release.set()
+        result = await asyncio.wait_for(second, timeout=1)
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return result
+
+    assert asyncio.run(scenario())["id"] == "s1"
+    assert sessions.calls == 2
@@ -0,0 +1,75 @@
+"""
+ArchiveCache: per-worker directories and eviction around open readers
+"""
+
+import asyncio
+import os
+import zipfile
+
+import pytest
+
+import server
+
+
+class FakeRemoteStore:
+    def __init__(self, root):
+        self.root = root
+        self.fetches = 0
+
+    def local_path(self, key):
+        return None
+
+    def fetch(self, key, path):
+        self.fetches += 1
+        with zipfile.ZipFile(path, "w") as archive:
+            archive.writestr("photo", key.encode() * 100)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    fake = FakeRemoteStore(tmp_path / "remote")
+    monkeypatch.setattr(server, "archive_store", fake)
+    return fake
+
+
+def test_cache_lives_in_a_per_worker_directory(tmp_path, store):
+    cache = server.ArchiveCache(tmp_path / "cache", 1024 * 1024)
+
+    async def scenario():
+        async with cache.reading("s1/a.zip") as file:
+            return server.read_archive_entry(file, "photo")
+
+    assert asyncio.run(scenario()) == b"s1/a.zip" * 100
+    assert (tmp_path / "cache" / f"worker-{os.getpid()}" / "s1" / "a.zip").exists()
+    cache.clear()
+    assert not (tmp_path / "cache" / f"worker-{os.getpid()}").exists()
+
+
+def test_open_archives_are_not_evicted(tmp_path, store):
+    cache = server.ArchiveCache(tmp_path / "cache", 1)  # Every archive is over budget
+
+    async def scenario():
+        async with cache.reading("a.zip") as first:
+            async with cache.reading("b.zip"):
+                pass
+            # Closing b evicted it, but not the archive still being read
+            assert (cache.directory / "a.zip").exists()
+            assert not (cache.directory / "b.zip").exists()
+            assert server.read_archive_entry(first, "photo") == b"a.zip" * 100
+        assert not (cache.directory / "a.zip").exists()
+        assert cache.sizes == {} and cache.readers == {}
+
+    asyncio.run(scenario())
+
+
+def test_cached_archives_are_reused(tmp_path, store):
+    cache = server.ArchiveCache(tmp_path / "cache", 1024 * 1024)
+
+    async def scenario():
+        async def read():
+            async with cache.reading("a.zip") as file:
+                return server.read_archive_entry(file, "photo")
+        return await asyncio.gather(*(read() for _ in range(3)))
+
+    assert asyncio.run(scenario()) == [b"a.zip" * 100] * 3
+    assert store.fetches == 1
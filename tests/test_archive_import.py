@@ -0,0 +1,125 @@
+"""
+Background archive imports
+"""
+
+import asyncio
+import io
+import threading
+import zipfile
+
+from PIL import Image
+
+import server
+
+
+def jpeg(color=(200, 30, 30)):
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 24), color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def queue_import(mongo, tmp_path, session_fields=None):
+    session = {"id": "party", "name": "Party", "is_active": True, "photo_count": 0, "total_bytes": 0,
+               **(session_fields or {})}
+    job = {"id": "job", "session_id": "party", "status": "queued"}
+    path = tmp_path / "archive.part"
+    path.write_bytes(b"spooled")
+
+    async def setup():
+        await mongo.sessions.insert_one(dict(session))
+        await mongo.import_jobs.insert_one(dict(job))
+
+    asyncio.run(setup())
+    return session, job, path
+
+
+def test_cancelled_import_is_marked_interrupted(mongo, tmp_path, monkeypatch):
+    session, job, path = queue_import(mongo, tmp_path)
+    reading, release = threading.Event(), threading.Event()
+    closed = []
+
+    def blocking_entries(path, kind):
+        try:
+            yield "first.jpg", jpeg(), None
+            reading.set()
+            release.wait(5)  # Still running in its thread when the import is cancelled
+            yield "second.jpg", jpeg(), None
+        finally:
+            closed.append(True)
+
+    monkeypatch.setattr(server, "archive_entries", blocking_entries)
+
+    async def scenario():
+        task = asyncio.create_task(server.import_archive_photos(job, session, path, "zip"))
+        await asyncio.get_running_loop().run_in_executor(None, reading.wait, 5)
+        task.cancel()
+        await asyncio.sleep(0.05)
+        release.set()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        else:
+            raise AssertionError("the import was not cancelled")
+        return (await mongo.import_jobs.find_one({"id": "job"}),
+                await mongo.sessions.find_one({"id": "party"}))
+
+    saved, stored_session = asyncio.run(scenario())
+    assert saved["status"] == "interrupted"
+    assert closed == [True]
+    assert not path.exists()
+    # The unstored first photo gave its reservation back
+    assert stored_session["photo_count"] == 0 and stored_session["total_bytes"] == 0
+
+
+def zip_archive(path, entries):
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+
+
+def import_zip(mongo, tmp_path, entries, **session_fields):
+    session, job, path = queue_import(mongo, tmp_path, session_fields)
+    zip_archive(path, entries)
+
+    async def scenario():
+        await server.import_archive_photos(job, session, path, "zip")
+        return (await mongo.import_jobs.find_one({"id": "job"}),
+                await mongo.photos.find({}, {"filename": 1}).to_list(None),
+                await mongo.sessions.find_one({"id": "party"}))
+
+    return asyncio.run(scenario())
+
+
+def test_import_skips_entries_that_are_not_photos(mongo, tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "IMPORT_MAX_ENTRY_BYTES", 10_000)
+    job, photos, session = import_zip(mongo, tmp_path, [
+        ("album/a.jpg", jpeg()),
+        ("album/.hidden.jpg", jpeg()),
+        ("__MACOSX/album/._a.jpg", b"resource fork"),
+        ("album/notes.txt", b"text"),
+        ("album/broken.jpg", b"not really a jpeg"),
+        ("album/huge.jpg", b"x" * 10_001),
+        ("album/b.jpg", jpeg((0, 0, 200))),
+    ])
+    assert job["status"] == "completed"
+    assert (job["processed"], job["imported"], job["skipped"]) == (7, 2, 5)
+    assert {entry["name"]: entry["reason"] for entry in job["skipped_entries"]} == {
+        "album/.hidden.jpg": "hidden file",
+        "__MACOSX/album/._a.jpg": "hidden file",
+        "album/notes.txt": "not an image",
+        "album/broken.jpg": "not a readable image",
+        "album/huge.jpg": "file too large",
+    }
+    assert sorted(photo["filename"] for photo in photos) == ["a.jpg", "b.jpg"]
+    assert session["photo_count"] == 2
+
+
+def test_import_stops_when_the_session_is_full(mongo, tmp_path):
+    job, photos, session = import_zip(mongo, tmp_path, [
+        (f"{index}.jpg", jpeg((index * 40, 0, 0))) for index in range(5)
+    ], max_photos=2)
+    assert job["status"] == "completed"
+    assert (job["processed"], job["imported"], job["skipped"]) == (3, 2, 1)
+    assert job["stopped_reason"] == "This session is not accepting more photos"
+    assert len(photos) == 2 and session["photo_count"] == 2
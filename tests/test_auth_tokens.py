@@ -0,0 +1,18 @@
+"""
+Token scoping: download links must not work as API credentials
+"""
+
+from fastapi.testclient import TestClient
+
+import server
+
+
+def test_download_token_is_rejected_as_bearer_token():
+    token = server.create_download_token("superadmin", "some-photo-id")
+    response = TestClient(server.app).get("/api/auth/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401
+
+
+def test_invalid_token_is_rejected():
+    response = TestClient(server.app).get("/api/auth/me", headers={"Authorization": "Bearer not-a-jwt"})
+    assert response.status_code == 401
@@ -0,0 +1,44 @@
+"""
+Benchmark regression gate for backend hot functions
+
+Skipped unless RUN_BENCHMARKS=1. Compares each benchmark in backend_benchmark.py
+with the stored baseline (BENCHMARK_BASELINE, default benchmark_baseline.json)
+and fails when it is more than BENCHMARK_MAX_REGRESSION percent slower.
+
+    python backend_benchmark.py --save-baseline
+    RUN_BENCHMARKS=1 python -m pytest tests/test_benchmark_regressions.py
+"""
+
+import os
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not os.environ.get('RUN_BENCHMARKS'),
+                                reason="set RUN_BENCHMARKS=1 to run benchmarks")
+
+if os.environ.get('RUN_BENCHMARKS'):
+    import backend_benchmark
+    BENCHMARK_NAMES = list(backend_benchmark.BENCHMARKS)
+else:
+    BENCHMARK_NAMES = []
+
+
+@pytest.fixture(scope="module")
+def baseline():
+    data = backend_benchmark.load_baseline()
+    if data is None:
+        pytest.skip(f"No baseline at {backend_benchmark.DEFAULT_BASELINE_PATH}; "
+                    f"run `python backend_benchmark.py --save-baseline` first")
+    return data["results"]
+
+
+@pytest.mark.parametrize("name", BENCHMARK_NAMES)
+def test_no_regression(name, baseline):
+    if name not in baseline:
+        pytest.skip(f"{name} has no baseline entry")
+    result = backend_benchmark.run_benchmark(name)
+    slower = backend_benchmark.regression_percent(result, baseline[name])
+    assert slower <= backend_benchmark.DEFAULT_MAX_REGRESSION, (
+        f"{name} is {slower:.1f}% slower than baseline "
+        f"({result['ops_per_sec']:.2f} vs {baseline[name]['ops_per_sec']:.2f} ops/sec)"
+    )
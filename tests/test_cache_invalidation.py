@@ -0,0 +1,94 @@
+"""
+Cross-worker invalidation listener
+"""
+
+import asyncio
+
+import pytest
+
+import server
+
+
+class FakeCursor:
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.alive = True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.messages:
+            self.alive = False  # Like a tailable cursor that lost its position
+            raise StopAsyncIteration
+        return self.messages.pop(0)
+
+
+class FakeInvalidations:
+    """Each connection sees the messages already stored, then those inserted after it opened"""
+
+    def __init__(self, connections):
+        self.connections = list(connections)
+        self.current = None
+
+    async def find_one(self, sort=None):
+        if not self.connections:
+            raise asyncio.CancelledError  # End of the scenario
+        self.current = self.connections.pop(0)
+        stored, _ = self.current
+        return stored[-1] if stored else None
+
+    def find(self, query, cursor_type=None):
+        stored, inserted = self.current
+        return FakeCursor(stored + inserted)
+
+
+def message(object_id, key):
+    return {"_id": object_id, "topic": "test", "key": key, "origin": "other-worker"}
+
+
+@pytest.fixture
+def received(monkeypatch):
+    calls = []
+    monkeypatch.setattr(server, "invalidation_handlers", {"test": [calls.append]})
+    sleep = asyncio.sleep
+    monkeypatch.setattr(asyncio, "sleep", lambda delay: sleep(0))
+    return calls
+
+
+def listen(monkeypatch, connections):
+    monkeypatch.setattr(server, "db", type("FakeDB", (), {"cache_invalidations": FakeInvalidations(connections)})())
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(server.listen_for_invalidations())
+
+
+def test_messages_after_the_newest_are_applied(monkeypatch, received):
+    old, new = message(5, "old"), message(9, "new")
+    listen(monkeypatch, [([old], [new])])
+    # Caches are dropped once on startup, before the cursor is positioned
+    assert received == [None, "new"]
+
+
+def test_reconnect_drops_caches_when_messages_were_missed(monkeypatch, received):
+    old, seen = message(5, "old"), message(9, "seen")
+    # Inserted by another worker while no cursor was open, with a smaller ObjectId
+    missed = message(7, "missed")
+    listen(monkeypatch, [([old], [seen]), ([old, seen, missed], [])])
+    assert received == [None, "seen", None]
+
+
+def test_reconnect_without_new_messages_keeps_caches(monkeypatch, received):
+    old, seen = message(5, "old"), message(9, "seen")
+    listen(monkeypatch, [([old], [seen]), ([old, seen], [])])
+    assert received == [None, "seen"]
+
+
+def test_empty_collection_does_not_drop_caches(monkeypatch, received):
+    listen(monkeypatch, [([], []), ([], [])])
+    assert received == []
+
+
+def test_own_messages_are_not_applied_twice(monkeypatch, received):
+    own = dict(message(9, "own"), origin=server.WORKER_ID)
+    listen(monkeypatch, [([], [own, message(10, "other")])])
+    assert received == ["other"]
@@ -0,0 +1,106 @@
+"""
+Resumable chunked uploads
+"""
+
+import asyncio
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import server
+
+
+def jpeg():
+    buffer = io.BytesIO()
+    Image.effect_noise((800, 800), 64).convert("RGB").save(buffer, format="JPEG", quality=95)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def client(mongo):
+    asyncio.run(mongo.sessions.insert_one(
+        {"id": "party", "name": "Party", "is_active": True, "photo_count": 0, "total_bytes": 0}
+    ))
+    return TestClient(server.app)
+
+
+def start_upload(client, data):
+    response = client.post("/api/uploads", json={
+        "session_id": "party", "filename": "big.jpg", "content_type": "image/jpeg",
+        "file_size": len(data), "chunk_size": server.UPLOAD_MIN_CHUNK_SIZE
+    })
+    assert response.status_code == 200
+    return response.json()
+
+
+def chunk(upload, data, index):
+    size = upload["chunk_size"]
+    return data[index * size:(index + 1) * size]
+
+
+def test_completion_reports_missing_chunks_and_resumes(client, mongo):
+    data = jpeg()
+    upload = start_upload(client, data)
+    total = upload["total_chunks"]
+    assert total >= 3
+    upload_id = upload["upload_id"]
+
+    for index in (0, total - 1):
+        response = client.put(f"/api/uploads/{upload_id}/chunks/{index}", content=chunk(upload, data, index))
+        assert response.status_code == 200
+    status = client.get(f"/api/uploads/{upload_id}").json()
+    assert status["received_chunks"] == [0, total - 1]
+    assert status["next_chunk"] == 1
+
+    response = client.post(f"/api/uploads/{upload_id}/complete")
+    assert response.status_code == 409
+    assert response.json()["detail"]["missing_chunks"] == list(range(1, total - 1))
+
+    for index in range(1, total - 1):
+        client.put(f"/api/uploads/{upload_id}/chunks/{index}", content=chunk(upload, data, index))
+    response = client.post(f"/api/uploads/{upload_id}/complete")
+    assert response.status_code == 200
+    assert response.json()["id"] == upload["photo_id"]
+
+
+def test_completion_is_idempotent(client, mongo):
+    data = jpeg()
+    upload = start_upload(client, data)
+    upload_id = upload["upload_id"]
+    for index in range(upload["total_chunks"]):
+        client.put(f"/api/uploads/{upload_id}/chunks/{index}", content=chunk(upload, data, index))
+
+    first = client.post(f"/api/uploads/{upload_id}/complete")
+    second = client.post(f"/api/uploads/{upload_id}/complete")
+    assert first.status_code == second.status_code == 200
+    assert first.json()["id"] == second.json()["id"] == upload["photo_id"]
+
+    async def stored():
+        return (await mongo.photos.count_documents({"session_id": "party"}),
+                await mongo.sessions.find_one({"id": "party"}),
+                await mongo.upload_chunks.count_documents({"upload_id": upload_id}))
+
+    photos, session, chunks = asyncio.run(stored())
+    assert photos == 1 and session["photo_count"] == 1
+    assert chunks == 0
+    response = client.put(f"/api/uploads/{upload_id}/chunks/0", content=chunk(upload, data, 0))
+    assert response.status_code == 409
+
+
+def test_chunks_must_have_the_agreed_size(client):
+    data = jpeg()
+    upload = start_upload(client, data)
+    response = client.put(f"/api/uploads/{upload['upload_id']}/chunks/0", content=b"short")
+    assert response.status_code == 400
+    response = client.put(f"/api/uploads/{upload['upload_id']}/chunks/{upload['total_chunks']}", content=b"x")
+    assert response.status_code == 400
+
+
+def test_files_larger_than_a_photo_document_are_refused(client):
+    response = client.post("/api/uploads", json={
+        "session_id": "party", "filename": "huge.jpg", "content_type": "image/jpeg",
+        "file_size": server.MAX_PHOTO_BYTES + 1
+    })
+    assert response.status_code == 413
@@ -0,0 +1,59 @@
+"""
+Contact sheet layout and rendering
+"""
+
+import io
+
+import numpy as np
+from PIL import Image
+
+import server
+from server import compose_grid, decode_tile, render_contact_sheet
+
+
+def tile(value, size=4):
+    return np.full((size, size, 3), value, dtype=np.uint8)
+
+
+def test_compose_grid_places_tiles_on_a_white_sheet():
+    size, margin, columns = 4, server.CONTACT_SHEET_MARGIN, 2
+    tiles = [tile(value, size) for value in (10, 20, 30)]
+    grid = np.asarray(compose_grid(tiles, columns))
+
+    cell = size + 2 * margin
+    assert grid.shape == (2 * cell + 2 * margin, columns * cell + 2 * margin, 3)
+    for index, value in enumerate((10, 20, 30)):
+        row, column = divmod(index, columns)
+        top, left = 2 * margin + row * cell, 2 * margin + column * cell
+        assert (grid[top:top + size, left:left + size] == value).all()
+    # The missing fourth tile leaves its cell white
+    top, left = 2 * margin + cell, 2 * margin + cell
+    assert (grid[top:top + size, left:left + size] == 255).all()
+    assert (grid[:2 * margin] == 255).all()
+
+
+def test_decode_tile_crops_to_a_square():
+    buffer = io.BytesIO()
+    Image.new("RGB", (300, 100), (0, 128, 0)).save(buffer, format="PNG")
+    decoded = decode_tile(buffer.getvalue(), 16)
+    assert decoded.shape == (16, 16, 3)
+    assert (decoded[..., 1] == 128).all()
+
+
+def test_undecodable_tiles_are_grey():
+    assert (decode_tile(b"not an image", 8) == 200).all()
+
+
+def test_pdf_pages_are_composed_from_consumed_tiles():
+    tiles = [tile(value) for value in range(5)]
+    pdf = render_contact_sheet(tiles, columns=2, rows_per_page=1, output_format="pdf")
+    assert pdf.startswith(b"%PDF")
+    assert b"/Count 3" in pdf  # Two tiles per page
+    assert tiles == []  # Tiles are released as their page is composed
+
+
+def test_single_image_formats_hold_every_tile():
+    png = render_contact_sheet([tile(value) for value in range(5)], columns=2, rows_per_page=1, output_format="png")
+    with Image.open(io.BytesIO(png)) as img:
+        cell = 4 + 2 * server.CONTACT_SHEET_MARGIN
+        assert img.size == (2 * cell + 2 * server.CONTACT_SHEET_MARGIN, 3 * cell + 2 * server.CONTACT_SHEET_MARGIN)
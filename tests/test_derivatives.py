@@ -0,0 +1,57 @@
+"""
+Web derivatives: encoding and Accept negotiation
+"""
+
+import io
+
+import pytest
+from PIL import Image
+
+import server
+from server import encode_derivatives, parse_accept
+
+
+def encoded(img, fmt, **options):
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def photo():
+    # Noise at maximum quality: every derivative format encodes it smaller
+    return encoded(Image.effect_noise((400, 300), 40).convert("RGB"), "JPEG", quality=100)
+
+
+def test_derivatives_are_encoded_in_every_available_format(photo):
+    derivatives = encode_derivatives(photo)
+    assert set(derivatives) == {content_type for _, content_type, _ in server.DERIVATIVE_FORMATS}
+    for content_type, data in derivatives.items():
+        assert len(data) < len(photo)
+        with Image.open(io.BytesIO(data)) as img:
+            assert img.get_format_mimetype() == content_type
+            assert img.size == (400, 300)
+
+
+def test_derivatives_are_downscaled(photo, monkeypatch):
+    monkeypatch.setattr(server, "DERIVATIVE_MAX_DIMENSION", 100)
+    for data in encode_derivatives(photo).values():
+        with Image.open(io.BytesIO(data)) as img:
+            assert max(img.size) == 100
+
+
+def test_no_derivatives_for_animations_or_unreadable_data():
+    frames = [Image.new("RGB", (32, 32), color) for color in ((255, 0, 0), (0, 0, 255))]
+    animation = encoded(frames[0], "GIF", save_all=True, append_images=frames[1:])
+    assert encode_derivatives(animation) == {}
+    assert encode_derivatives(b"not an image") == {}
+
+
+def test_parse_accept_reads_quality_values():
+    accepted = parse_accept("image/AVIF;q=0.9, image/webp, */*;q=0.1")
+    assert accepted == {"image/avif": 0.9, "image/webp": 1.0, "*/*": 0.1}
+
+
+def test_parse_accept_treats_malformed_quality_as_unacceptable():
+    assert parse_accept("image/webp;q=high, , image/jpeg") == {"image/webp": 0.0, "image/jpeg": 1.0}
+    assert parse_accept("") == {}
@@ -0,0 +1,74 @@
+"""
+Near-duplicate detection: perceptual hashes, the BK-tree and duplicate grouping
+"""
+
+from PIL import Image, ImageDraw
+
+from server import BKTree, DuplicateIndex, hamming_distance, perceptual_hash
+
+
+def scene(size=(320, 240), offset=0):
+    img = Image.new("RGB", size, (30, 90, 160))
+    draw = ImageDraw.Draw(img)
+    width, height = size
+    draw.ellipse((width * 0.2 + offset, height * 0.2, width * 0.6 + offset, height * 0.8), fill=(240, 200, 40))
+    draw.rectangle((width * 0.65, height * 0.1, width * 0.9, height * 0.5), fill=(20, 20, 20))
+    return img
+
+
+def test_perceptual_hash_survives_rescaling():
+    original = int(perceptual_hash(scene()), 16)
+    rescaled = int(perceptual_hash(scene((160, 120))), 16)
+    different = int(perceptual_hash(scene().transpose(Image.FLIP_LEFT_RIGHT)), 16)
+    assert hamming_distance(original, rescaled) <= 4
+    assert hamming_distance(original, different) > 16
+
+
+def test_hamming_distance_counts_differing_bits():
+    assert hamming_distance(0, 0) == 0
+    assert hamming_distance(0b1011, 0b0001) == 2
+    assert hamming_distance(0, (1 << 64) - 1) == 64
+
+
+def test_bk_tree_radius_search_matches_a_linear_scan():
+    values = [0, 1, 3, 0xFF, 0xF0F0, (1 << 64) - 1, 0b10101]
+    tree = BKTree()
+    for index, value in enumerate(values):
+        tree.add(value, f"p{index}")
+    assert tree.size == len(values)
+    for query in (0, 0xF0, (1 << 63)):
+        for radius in (0, 2, 8):
+            expected = {(f"p{index}", hamming_distance(query, value))
+                        for index, value in enumerate(values)
+                        if hamming_distance(query, value) <= radius}
+            assert set(tree.search(query, radius)) == expected
+
+
+def test_bk_tree_search_on_an_empty_tree():
+    assert BKTree().search(0, 64) == []
+
+
+def photo(photo_id, phash, width=100, height=100, file_size=1000):
+    return {"id": photo_id, "phash": f"{phash:016x}", "width": width, "height": height, "file_size": file_size}
+
+
+def test_duplicate_groups_are_transitive_and_best_first():
+    index = DuplicateIndex([
+        photo("small", 0b0000, width=10, height=10),
+        photo("large", 0b0011, width=200, height=200),
+        photo("chain", 0b1111),
+        photo("alone", (1 << 64) - 1),
+    ])
+    # small-large and large-chain are 2 bits apart, small-chain 4 bits
+    assert index.groups(2) == [["large", "chain", "small"]]
+    assert sorted(other for other, _ in index.near("large", 2)) == ["chain", "small"]
+    assert index.groups(1) == []
+
+
+def test_duplicate_groups_are_sorted_by_size():
+    index = DuplicateIndex([
+        photo("a1", 0x0), photo("a2", 0x1), photo("a3", 0x3),
+        photo("b1", 0xFF00FF00), photo("b2", 0xFF00FF01),
+    ])
+    groups = index.groups(1)
+    assert [len(group) for group in groups] == [3, 2]
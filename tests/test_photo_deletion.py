@@ -0,0 +1,80 @@
+"""
+Bulk photo deletion and hard session deletes
+"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+def organizer(*sessions):
+    return server.User(username="organizer", password_hash="x", allowed_sessions=list(sessions))
+
+
+@pytest.fixture
+def photos(mongo, monkeypatch):
+    monkeypatch.setattr(server, "PURGE_BATCH_PAUSE", 0)
+
+    async def setup():
+        await mongo.sessions.insert_many([
+            {"id": session_id, "name": session_id, "is_active": True, "photo_count": 2, "total_bytes": 300}
+            for session_id in ("mine", "theirs")
+        ])
+        await mongo.photos.insert_many([
+            {"id": f"{session_id}-{index}", "session_id": session_id, "file_size": size}
+            for session_id in ("mine", "theirs") for index, size in ((1, 100), (2, 200))
+        ])
+        await mongo.photo_derivatives.insert_one({"photo_id": "mine-1", "content_type": "image/webp"})
+
+    asyncio.run(setup())
+    return mongo
+
+
+def state(mongo):
+    async def load():
+        return ({photo["id"] async for photo in mongo.photos.find()},
+                {session["id"]: session async for session in mongo.sessions.find()},
+                await mongo.photo_derivatives.count_documents({}))
+
+    return asyncio.run(load())
+
+
+def test_bulk_delete_skips_missing_and_inaccessible_photos(photos):
+    result = asyncio.run(server.bulk_delete_photos(["mine-1", "theirs-1", "gone"], current_user=organizer("mine")))
+    assert result == {"deleted": ["mine-1"], "deleted_count": 1}
+
+    remaining, sessions, derivatives = state(photos)
+    assert remaining == {"mine-2", "theirs-1", "theirs-2"}
+    assert (sessions["mine"]["photo_count"], sessions["mine"]["total_bytes"]) == (1, 200)
+    assert (sessions["theirs"]["photo_count"], sessions["theirs"]["total_bytes"]) == (2, 300)
+    assert derivatives == 0
+
+
+def test_bulk_delete_rejects_empty_oversized_and_inaccessible_requests(photos):
+    for photo_ids, status in (([], 400), (["x"] * (server.BULK_DELETE_LIMIT + 1), 400), (["theirs-1"], 404)):
+        with pytest.raises(HTTPException) as excinfo:
+            asyncio.run(server.bulk_delete_photos(photo_ids, current_user=organizer("mine")))
+        assert excinfo.value.status_code == status
+
+
+def test_hard_delete_removes_the_session_and_everything_stored_for_it(photos):
+    async def scenario():
+        await photos.uploads.insert_one({"id": "upload", "session_id": "mine"})
+        await photos.upload_chunks.insert_one({"upload_id": "upload", "index": 0})
+        await photos.users.insert_one(organizer("mine").dict())
+        await photos.sessions.update_one({"id": "mine"}, {"$set": {"deleting": True}})
+        await server.hard_delete_session("mine")
+        return (await photos.uploads.count_documents({}), await photos.upload_chunks.count_documents({}),
+                await photos.users.find_one({"username": "organizer"}))
+
+    uploads, chunks, user = asyncio.run(scenario())
+    remaining, sessions, derivatives = state(photos)
+    assert remaining == {"theirs-1", "theirs-2"}
+    assert set(sessions) == {"theirs"}
+    assert uploads == chunks == derivatives == 0
+    # Removing the user's only session would grant access to every session
+    assert user["allowed_sessions"] == ["mine"]
+
@@ -0,0 +1,69 @@
+"""
+Retention report and purge job
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def sessions(mongo, monkeypatch):
+    monkeypatch.setattr(server, "RETENTION_DAYS_AFTER_DEACTIVATION", 30)
+    monkeypatch.setattr(server, "PURGE_BATCH_PAUSE", 0)
+    now = datetime.utcnow()
+
+    async def setup():
+        await mongo.sessions.insert_many([
+            {"id": "expired", "name": "Expired", "is_active": False, "photo_count": 1, "total_bytes": 100,
+             "deactivated_at": now - timedelta(days=31)},
+            {"id": "recent", "name": "Recent", "is_active": False, "photo_count": 1, "total_bytes": 100,
+             "deactivated_at": now - timedelta(days=29)},
+            # Deactivated before deactivated_at was recorded
+            {"id": "legacy", "name": "Legacy", "is_active": False, "photo_count": 1, "total_bytes": 100},
+            {"id": "active", "name": "Active", "is_active": True, "photo_count": 1, "total_bytes": 100},
+        ])
+        await mongo.photos.insert_many([
+            {"id": f"{session_id}-photo", "session_id": session_id, "file_size": 100}
+            for session_id in ("expired", "recent", "legacy", "active")
+        ])
+
+    asyncio.run(setup())
+    return mongo
+
+
+def test_report_lists_due_sessions_without_writing(sessions):
+    report = asyncio.run(server.retention_report())
+    assert [session["session_id"] for session in report["sessions"]] == ["expired"]
+    assert report["sessions"][0]["reason"] == "30 days after deactivation"
+    assert (report["photo_count"], report["total_bytes"]) == (1, 100)
+
+    legacy = asyncio.run(sessions.sessions.find_one({"id": "legacy"}))
+    assert "deactivated_at" not in legacy
+
+
+def test_deadline_of_sessions_without_deactivation_time_starts_now():
+    now = datetime.utcnow()
+    deadline, _ = server.retention_deadline({"is_active": False, "purge_after_deactivation_days": 7}, now)
+    assert deadline == now + timedelta(days=7)
+
+
+def test_purge_removes_due_photos_and_starts_legacy_clocks(sessions):
+    asyncio.run(server.purge_expired_photos())
+
+    async def load():
+        return ({photo["session_id"] async for photo in sessions.photos.find()},
+                await sessions.sessions.find_one({"id": "legacy"}))
+
+    remaining, legacy = asyncio.run(load())
+    assert remaining == {"recent", "legacy", "active"}
+    assert legacy["deactivated_at"] is not None
+
+
+def test_dry_run_purges_nothing(sessions, monkeypatch):
+    monkeypatch.setattr(server, "RETENTION_DRY_RUN", True)
+    asyncio.run(server.purge_expired_photos())
+    assert asyncio.run(sessions.photos.count_documents({})) == 4
@@ -0,0 +1,61 @@
+"""
+Per-user session access sets
+"""
+
+import pytest
+
+import server
+from server import User, session_access_for
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    server.session_access_cache.clear()
+    yield
+    server.session_access_cache.clear()
+
+
+def make_user(**fields):
+    return User(username="organizer", password_hash="x", **fields)
+
+
+@pytest.mark.parametrize("fields", [
+    {"is_superadmin": True, "allowed_sessions": ["s1"]},
+    {"allowed_sessions": []},
+])
+def test_superadmins_and_unrestricted_users_see_every_session(fields):
+    access = session_access_for(make_user(**fields))
+    assert access.all_sessions
+    assert access.allows("s1") and access.allows("anything")
+
+
+def test_restricted_user_sees_only_allowed_sessions():
+    access = session_access_for(make_user(allowed_sessions=["s1", "s2"]))
+    assert not access.all_sessions
+    assert access.allows("s1") and access.allows("s2")
+    assert not access.allows("s3")
+
+
+@pytest.mark.parametrize("fields", [{"is_superadmin": True}, {"allowed_sessions": ["s1"]}])
+def test_filter_drops_items_without_a_known_session(fields):
+    access = session_access_for(make_user(**fields))
+    photos = [{"id": "p1", "session_id": "s1"}, {"id": "p2", "session_id": None}]
+    assert access.filter(photos, lambda photo: photo["session_id"]) == [photos[0]]
+    assert not access.allows(None)
+
+
+def test_filter_keeps_only_allowed_sessions_in_order():
+    access = session_access_for(make_user(allowed_sessions=["s1", "s3"]))
+    items = ["s3", "s2", "s1", "s3"]
+    assert access.filter(items, lambda session_id: session_id) == ["s3", "s1", "s3"]
+
+
+def test_version_bump_recomputes_access():
+    user = make_user(allowed_sessions=["s1"])
+    first = session_access_for(user)
+    assert session_access_for(user) is first
+
+    changed = make_user(id=user.id, allowed_sessions=["s2"], version=user.version + 1)
+    second = session_access_for(changed)
+    assert second is not first
+    assert second.allows("s2") and not second.allows("s1")
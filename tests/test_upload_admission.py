@@ -0,0 +1,284 @@
+"""
+Upload admission: granting, queueing, round-robin dispatch, abandonment and session keying
+"""
+
+import asyncio
+from collections import deque
+
+import pytest
+from starlette.responses import JSONResponse
+
+import server
+from server import AdmissionRejected, UploadAdmissionController, UploadAdmissionMiddleware
+
+
+def make_controller(**overrides):
+    limits = dict(max_inflight_bytes=100, max_per_session=2,
+                  max_queue_per_session=2, max_queue=3, queue_timeout=1.0)
+    limits.update(overrides)
+    return UploadAdmissionController(**limits)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_grants_immediately_under_the_limits():
+    async def scenario():
+        controller = make_controller()
+        await controller.acquire("a", 40)
+        await controller.acquire("b", 40)
+        assert controller.inflight_bytes == 80
+        assert controller.active == {"a": 1, "b": 1}
+        controller.release("a", 40)
+        controller.release("b", 40)
+        assert controller.inflight_bytes == 0
+        assert controller.active == {}
+
+    asyncio.run(scenario())
+
+
+def test_idle_controller_admits_one_upload_of_any_allowed_size():
+    async def scenario():
+        controller = make_controller()
+        await controller.acquire("a", 100)
+        assert controller.inflight_bytes == 100
+
+    asyncio.run(scenario())
+
+
+def test_rejects_uploads_larger_than_the_cap():
+    async def scenario():
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await make_controller().acquire("a", 101)
+        assert excinfo.value.status_code == 413
+
+    asyncio.run(scenario())
+
+
+def test_per_session_limit_queues_until_release():
+    async def scenario():
+        controller = make_controller()
+        await controller.acquire("a", 10)
+        await controller.acquire("a", 10)
+        waiter = asyncio.create_task(controller.acquire("a", 10))
+        await settle()
+        assert not waiter.done()
+        assert controller.queued == 1
+
+        controller.release("a", 10)
+        await asyncio.wait_for(waiter, timeout=1)
+        assert controller.queued == 0
+        assert controller.active == {"a": 2}
+        assert controller.inflight_bytes == 20
+
+    asyncio.run(scenario())
+
+
+def test_dispatch_is_round_robin_across_sessions():
+    async def scenario():
+        controller = make_controller(max_per_session=4)
+        await controller.acquire("big", 100)
+        first_a = asyncio.create_task(controller.acquire("a", 50))
+        await settle()
+        second_a = asyncio.create_task(controller.acquire("a", 50))
+        await settle()
+        first_b = asyncio.create_task(controller.acquire("b", 50))
+        await settle()
+
+        controller.release("big", 100)
+        await settle()
+        # Session a was served once, so b goes next even though a queued earlier
+        assert first_a.done() and first_b.done()
+        assert not second_a.done()
+        assert controller.inflight_bytes == 100
+
+        controller.release("b", 50)
+        await asyncio.wait_for(second_a, timeout=1)
+        assert controller.active == {"a": 2}
+
+    asyncio.run(scenario())
+
+
+def test_full_queues_are_rejected():
+    async def scenario():
+        controller = make_controller(max_per_session=1)
+        await controller.acquire("a", 10)
+        await controller.acquire("b", 10)
+        waiters = [asyncio.create_task(controller.acquire("a", 10)) for _ in range(2)]
+        await settle()
+
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await controller.acquire("a", 10)
+        assert excinfo.value.status_code == 429
+
+        waiters.append(asyncio.create_task(controller.acquire("b", 10)))
+        await settle()
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await controller.acquire("c", 100)
+        assert excinfo.value.status_code == 503
+        assert excinfo.value.retry_after == server.UPLOAD_RETRY_AFTER
+
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        assert controller.queued == 0
+
+    asyncio.run(scenario())
+
+
+def test_timed_out_waiter_leaves_the_queue():
+    async def scenario():
+        controller = make_controller(max_per_session=1, queue_timeout=0.01)
+        await controller.acquire("a", 10)
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await controller.acquire("a", 10)
+        assert excinfo.value.status_code == 503
+        assert controller.queued == 0
+
+        controller.release("a", 10)
+        assert controller.waiting == {}
+        assert controller.inflight_bytes == 0
+        assert controller.active == {}
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_is_skipped_by_dispatch():
+    async def scenario():
+        controller = make_controller(max_per_session=1)
+        await controller.acquire("a", 10)
+        cancelled = asyncio.create_task(controller.acquire("a", 10))
+        await settle()
+        waiter = asyncio.create_task(controller.acquire("a", 10))
+        await settle()
+
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        assert controller.queued == 1
+
+        controller.release("a", 10)
+        await asyncio.wait_for(waiter, timeout=1)
+        assert controller.active == {"a": 1}
+        assert controller.inflight_bytes == 10
+
+    asyncio.run(scenario())
+
+
+def test_abandoning_a_granted_waiter_hands_the_slot_back():
+    async def scenario():
+        controller = make_controller(max_per_session=1)
+        await controller.acquire("a", 10)
+        granted = asyncio.get_running_loop().create_future()
+        controller.waiting.setdefault("a", deque()).append((10, granted))
+        controller.queued += 1
+        controller.release("a", 10)
+        assert granted.done()
+        assert controller.inflight_bytes == 10
+
+        # The timeout fired in the same tick the slot was granted
+        controller._abandon("a", 10, granted)
+        assert controller.inflight_bytes == 0
+        assert controller.active == {}
+        assert controller.queued == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancel_racing_a_grant_keeps_the_accounting_straight():
+    async def scenario():
+        controller = make_controller(max_per_session=1)
+        await controller.acquire("a", 10)
+        waiter = asyncio.create_task(controller.acquire("a", 10))
+        await settle()
+
+        controller.release("a", 10)
+        waiter.cancel()  # Before the waiter has run to see its grant
+        results = await asyncio.gather(waiter, return_exceptions=True)
+        if isinstance(results[0], asyncio.CancelledError):
+            assert controller.inflight_bytes == 0
+            assert controller.active == {}
+        else:
+            assert controller.active == {"a": 1}
+            controller.release("a", 10)
+        assert controller.inflight_bytes == 0
+        assert controller.queued == 0
+
+    asyncio.run(scenario())
+
+
+def scope(client, *headers):
+    return {"client": (client, 12345), "headers": list(headers)}
+
+
+def test_client_address_uses_proxy_headers_from_trusted_peers_only():
+    address = UploadAdmissionMiddleware.client_address
+
+    real_ip = (b"x-real-ip", b"203.0.113.7")
+    forwarded = (b"x-forwarded-for", b"198.51.100.1, 203.0.113.9")
+    trusted = scope("172.18.0.5", real_ip)
+    assert address(trusted, dict(trusted["headers"])) == "203.0.113.7"
+    via_forwarded = scope("172.18.0.5", forwarded)
+    assert address(via_forwarded, dict(via_forwarded["headers"])) == "203.0.113.9"
+    untrusted = scope("203.0.113.50", real_ip, forwarded)
+    assert address(untrusted, dict(untrusted["headers"])) == "203.0.113.50"
+    assert address({"headers": []}, {}) == "unknown"
+
+
+class RecordingController:
+    def __init__(self):
+        self.acquired = []
+
+    async def acquire(self, session_key, size):
+        self.acquired.append((session_key, size))
+
+    def release(self, session_key, size):
+        pass
+
+
+def send_upload(controller, *headers, method="POST", path="/api/photos"):
+    async def app(scope, receive, send):
+        await JSONResponse({"ok": True})(scope, receive, send)
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "headers": list(headers),
+             "client": ("203.0.113.5", 40000)}
+    asyncio.run(UploadAdmissionMiddleware(app, controller)(scope, receive, send))
+    return sent[0]["status"]
+
+
+@pytest.fixture
+def party(mongo):
+    asyncio.run(mongo.sessions.insert_one({"id": "party", "name": "Party", "is_active": True}))
+    return "party"
+
+
+def test_upload_session_header_must_name_an_active_session(party):
+    controller = RecordingController()
+    length = (b"content-length", b"2048")
+    assert send_upload(controller, (b"x-upload-session", party.encode()), length) == 200
+    assert send_upload(controller, (b"x-upload-session", b"made-up"), length) == 200
+    assert send_upload(controller, length) == 200
+    assert [key for key, _ in controller.acquired] == [party, "client:203.0.113.5", "client:203.0.113.5"]
+
+
+def test_uploads_without_a_length_skip_the_quota_precheck(party):
+    controller = RecordingController()
+    assert send_upload(controller, (b"x-upload-session", party.encode())) == 200
+    assert controller.acquired == [(party, server.UPLOAD_ASSUMED_BYTES)]
+
+
+def test_oversized_uploads_are_refused_before_the_body(party):
+    controller = RecordingController()
+    too_long = str(server.MAX_PHOTO_BYTES * 2).encode()
+    status = send_upload(controller, (b"x-upload-session", party.encode()), (b"content-length", too_long))
+    assert status == 413
+    assert controller.acquired == []
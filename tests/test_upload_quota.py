@@ -0,0 +1,146 @@
+"""
+Session quota reservations and counter reconciliation
+"""
+
+import asyncio
+import base64
+import io
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+
+import server
+
+
+def jpeg():
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 24), (200, 30, 30)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+class Override:
+    """Delegates to a database or collection, with some attributes replaced"""
+
+    def __init__(self, target, **attributes):
+        self._target = target
+        self.__dict__.update(attributes)
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+
+def add_session(mongo, **fields):
+    session = {"id": "party", "name": "Party", "is_active": True, "photo_count": 0, "total_bytes": 0, **fields}
+    asyncio.run(mongo.sessions.insert_one(dict(session)))
+    return session
+
+
+def stored_session(mongo):
+    return asyncio.run(mongo.sessions.find_one({"id": "party"}))
+
+
+def test_concurrent_reservations_stop_at_max_photos(mongo):
+    session = add_session(mongo, max_photos=3)
+
+    async def scenario():
+        return await asyncio.gather(*(server.reserve_quota(session, 100) for _ in range(10)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    refused = [result for result in results if isinstance(result, HTTPException)]
+    assert len(refused) == 7
+    assert all(error.status_code == 429 for error in refused)
+    stored = stored_session(mongo)
+    assert stored["photo_count"] == 3 and stored["total_bytes"] == 300
+    assert stored["reserved_at"] is not None
+
+
+def test_reservation_beyond_max_total_bytes_is_refused(mongo):
+    session = add_session(mongo, max_total_bytes=250)
+
+    async def scenario():
+        await server.reserve_quota(session, 200)
+        await server.reserve_quota(session, 100)
+
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(scenario())
+    assert excinfo.value.status_code == 413
+    assert stored_session(mongo)["total_bytes"] == 200
+
+
+def test_commit_settles_the_processed_size(mongo):
+    session = add_session(mongo)
+    photo = server.Photo(session_id="party", filename="a.jpg", content_type="image/jpeg",
+                         image_data="", file_size=60)
+
+    async def scenario():
+        await server.reserve_quota(session, 100)
+        await server.commit_quota("party", 100, [photo])
+
+    asyncio.run(scenario())
+    stored = stored_session(mongo)
+    assert stored["photo_count"] == 1 and stored["total_bytes"] == 60
+    assert abs(stored["last_upload_at"] - photo.uploaded_at) < timedelta(milliseconds=1)
+
+
+def test_failed_insert_releases_the_reservation(mongo, monkeypatch):
+    session = add_session(mongo)
+    data = jpeg()
+    photo = server.Photo(session_id="party", filename="a.jpg", content_type="image/jpeg",
+                         image_data=base64.b64encode(data).decode(), file_size=len(data))
+
+    async def failing_insert(document):
+        raise RuntimeError("insert failed")
+
+    monkeypatch.setattr(server, "db", Override(mongo, photos=Override(mongo.photos, insert_one=failing_insert)))
+    with pytest.raises(RuntimeError):
+        asyncio.run(server.ingest_photo(photo, session))
+    stored = stored_session(mongo)
+    assert stored["photo_count"] == 0 and stored["total_bytes"] == 0
+
+
+def test_reconcile_skips_sessions_with_recent_reservations(mongo):
+    now = datetime.utcnow()
+
+    async def scenario():
+        await mongo.sessions.insert_many([
+            # An upload in flight: reserved but not stored yet
+            {"id": "busy", "photo_count": 1, "total_bytes": 100, "reserved_at": now},
+            # A reservation nobody committed or released
+            {"id": "stale", "photo_count": 1, "total_bytes": 100,
+             "reserved_at": now - server.QUOTA_RESERVATION_GRACE - timedelta(minutes=1)},
+            {"id": "drifted", "photo_count": 5, "total_bytes": 500},
+        ])
+        await server.reconcile_session_stats()
+        return {session["id"]: session async for session in mongo.sessions.find()}
+
+    sessions = asyncio.run(scenario())
+    assert (sessions["busy"]["photo_count"], sessions["busy"]["total_bytes"]) == (1, 100)
+    assert (sessions["stale"]["photo_count"], sessions["stale"]["total_bytes"]) == (0, 0)
+    assert (sessions["drifted"]["photo_count"], sessions["drifted"]["total_bytes"]) == (0, 0)
+
+
+def test_reconcile_leaves_counters_that_changed_while_counting(mongo, monkeypatch):
+    session = add_session(mongo, photo_count=5, total_bytes=500)
+    class CountedDuringUpload:
+        def __init__(self, cursor):
+            self.cursor = cursor
+
+        async def to_list(self, length):
+            # An upload reserves quota between reading the sessions and counting the photos
+            await server.reserve_quota(session, 100)
+            return await self.cursor.to_list(length)
+
+    def aggregate(pipeline):
+        return CountedDuringUpload(mongo.photos.aggregate(pipeline))
+
+    monkeypatch.setattr(server, "db", Override(mongo, photos=Override(mongo.photos, aggregate=aggregate)))
+
+    async def scenario():
+        await server.reconcile_session_stats()
+
+    asyncio.run(scenario())
+    stored = stored_session(mongo)
+    assert (stored["photo_count"], stored["total_bytes"]) == (6, 600)
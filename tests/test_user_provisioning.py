@@ -0,0 +1,49 @@
+"""
+Bulk user provisioning and session grants
+"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from server import UserProvision
+
+
+def superadmin():
+    return server.User(username="superadmin", password_hash="x", is_superadmin=True)
+
+
+def test_reprovisioning_keeps_hard_deleted_sessions(mongo):
+    async def scenario():
+        await mongo.sessions.insert_one({"id": "s1", "name": "Party"})
+        await mongo.users.insert_one(server.User(
+            username="staff", password_hash="x", allowed_sessions=["deleted", "s1"]
+        ).dict())
+        result = await server.provision_users(
+            [UserProvision(username="staff", allowed_sessions=["deleted", "s1"])], current_user=superadmin()
+        )
+        user = await mongo.users.find_one({"username": "staff"})
+        return result, user
+
+    result, user = asyncio.run(scenario())
+    assert len(result["updated"]) == 1
+    assert user["allowed_sessions"] == ["deleted", "s1"]
+    assert user["version"] == 1
+
+
+def test_provisioning_rejects_newly_granted_missing_sessions(mongo):
+    async def scenario():
+        await mongo.users.insert_one(server.User(
+            username="staff", password_hash="x", allowed_sessions=["deleted"]
+        ).dict())
+        await server.provision_users([
+            UserProvision(username="staff", allowed_sessions=["deleted", "unknown"]),
+            UserProvision(username="new", password="secret123", allowed_sessions=["deleted"]),
+        ], current_user=superadmin())
+
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(scenario())
+    assert excinfo.value.status_code == 400
+    assert excinfo.value.detail == "Sessions unknown, deleted not found"